@@ -7,3 +7,21 @@ def client() -> TestClient:
     from minihai.app import app
 
     return TestClient(app)
+
+
+@pytest.fixture
+def data_path(tmp_path, monkeypatch):
+    from minihai import conf
+    from minihai.lib.sqlite import ConnectionPerThread, connect
+
+    monkeypatch.setattr(conf.settings, "data_path", tmp_path)
+    # Patched in the module's namespace, so the default databases aren't created first.
+    monkeypatch.setitem(
+        vars(conf), "cache_db", ConnectionPerThread(tmp_path / "cache.sqlite3")
+    )
+    monkeypatch.setitem(
+        vars(conf),
+        "index_db",
+        connect(tmp_path / "index.sqlite3", check_same_thread=False),
+    )
+    return tmp_path
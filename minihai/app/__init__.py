@@ -1,9 +1,13 @@
 from fastapi import FastAPI
-from starlette.staticfiles import StaticFiles
 
 from .auth import MinihaiAuth
-from .routers import misc, commits, executions, data, public
-from .. import conf
+from .routers import misc, commits, executions, data, downloads, public
+from ..services.checksums import output_checksummer
+from ..services.io import docker_executor, file_executor
+from ..services.leadership import leader_election
+from ..services.outputs import output_watcher
+from ..services.queue import execution_queue
+from ..services.reconciler import reconciler
 
 app = FastAPI()
 app.include_router(public.router)
@@ -11,5 +15,28 @@ app.include_router(misc.router, dependencies=[MinihaiAuth])
 app.include_router(commits.router, dependencies=[MinihaiAuth])
 app.include_router(executions.router, dependencies=[MinihaiAuth])
 app.include_router(data.router, dependencies=[MinihaiAuth])
-# TODO: add auth to static files
-app.mount("/data", StaticFiles(directory=conf.settings.data_path), name="data")
+# Downloads check authentication themselves, as they may also be signed URLs.
+app.include_router(downloads.router)
+
+
+def start_leader_tasks():
+    output_watcher.start()
+    reconciler.start()
+    execution_queue.start()
+
+
+@app.on_event("startup")
+def start_background_tasks():
+    # With multiple workers, only one of them runs these at a time.
+    leader_election.start(on_elected=start_leader_tasks)
+
+
+@app.on_event("shutdown")
+def stop_background_tasks():
+    execution_queue.stop()
+    reconciler.stop()
+    output_watcher.stop()
+    output_checksummer.stop()
+    leader_election.stop()
+    docker_executor.shutdown()
+    file_executor.shutdown()
@@ -1,5 +1,8 @@
 import datetime
 import hashlib
+import hmac
+import time
+from typing import Optional, Tuple
 
 import jwt
 from fastapi import HTTPException, Depends
@@ -9,9 +12,14 @@ from starlette import status
 from starlette.requests import Request
 
 from minihai import conf
+from minihai.lib.lru import LRUCache
 
 JWT_ALGORITHM = "HS256"
 
+_missing = object()
+_token_cache: Optional[LRUCache] = None
+_token_cache_config = None
+
 
 async def minihai_auth(request: Request):
     if not conf.settings.auth:
@@ -28,6 +36,18 @@ async def check_jwt_auth(request: Request) -> str:
             detail=f"Invalid auth scheme {scheme}",
             headers={"WWW-Authenticate": "Token"},
         )
+    token_cache = get_token_cache()
+    username = token_cache.get(token, _missing)
+    if username is _missing:
+        username, expires = verify_token(token)
+        token_cache.set(token, username, expires=expires)
+    return username
+
+
+def verify_token(token: str) -> Tuple[str, Optional[float]]:
+    """
+    Verify a token, returning the username and expiry time.
+    """
     try:
         payload = jwt.decode(
             token, key=conf.settings.jwt_secret, algorithms=[JWT_ALGORITHM]
@@ -40,7 +60,7 @@ async def check_jwt_auth(request: Request) -> str:
                 detail=f"Invalid user {username}",
                 headers={"WWW-Authenticate": "Token"},
             )
-        return username
+        return (username, payload.get("exp"))
     except PyJWTError as je:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -49,9 +69,27 @@ async def check_jwt_auth(request: Request) -> str:
         )
 
 
+def get_token_cache() -> LRUCache:
+    """
+    Get the cache of verified tokens, invalidating it if the auth configuration has changed.
+    """
+    global _token_cache, _token_cache_config
+    config = (conf.settings.jwt_secret, conf.settings.auth)
+    if _token_cache is None or config != _token_cache_config:
+        _token_cache = LRUCache(maxsize=conf.settings.token_cache_size)
+        _token_cache_config = (conf.settings.jwt_secret, dict(conf.settings.auth))
+    return _token_cache
+
+
 def create_access_token(data: dict):
+    now = time.time()
     return jwt.encode(
-        {**data, "iat": datetime.datetime.now(), "iss": "minihai"},
+        {
+            **data,
+            "iat": datetime.datetime.now(),
+            "exp": int(now + conf.settings.token_ttl),
+            "iss": "minihai",
+        },
         key=conf.settings.jwt_secret,
         algorithm=JWT_ALGORITHM,
     )
@@ -63,7 +101,50 @@ def create_user_access_token(username: str):
 
 
 def generate_pha(password):
+    # `password` is the password as configured (i.e. possibly hashed),
+    # so tokens are invalidated whenever the configured password changes.
     return hashlib.sha1(password.encode()).hexdigest()
 
 
+def sign_path(path: str, expires: int) -> str:
+    message = f"{path}:{expires}".encode()
+    return hmac.new(conf.settings.jwt_secret.encode(), message, "sha256").hexdigest()
+
+
+def get_signed_path_params(path: str) -> dict:
+    """
+    Get query parameters that grant access to `path` for a limited time without a token.
+
+    This is needed for download URLs, which clients fetch without authentication.
+    """
+    expires = int(time.time() + conf.settings.download_url_ttl)
+    return {"expires": expires, "signature": sign_path(path, expires)}
+
+
+def check_path_signature(
+    path: str, expires: Optional[str], signature: Optional[str]
+) -> bool:
+    try:
+        expires = int(expires)
+    except (TypeError, ValueError):
+        return False
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_path(path, expires), signature or "")
+
+
+async def check_download_auth(request: Request, path: str) -> None:
+    if not conf.settings.auth:
+        return
+    params = request.query_params
+    if "signature" in params:
+        if not check_path_signature(path, params.get("expires"), params["signature"]):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid or expired download signature",
+            )
+        return
+    await check_jwt_auth(request)
+
+
 MinihaiAuth = Depends(minihai_auth)
@@ -1,24 +1,51 @@
+import mimetypes
+import posixpath
 from typing import Optional
 from uuid import UUID
 
 from fastapi import Path, HTTPException, UploadFile, File, APIRouter
+from fastapi.responses import StreamingResponse
 
 from minihai import consts as consts
+from minihai.app.utils import make_list_response
 from minihai.models.base import DoesNotExist
+from minihai.lib.tarballs import InvalidTarball
 from minihai.models.commit import Commit
 
 router = APIRouter()
 
 
-@router.get("/api/v0/commits/{id}/")
-def read_commit(id: str = Path(default=None)):
+def load_commit(id: str) -> Commit:
     try:
-        commit = Commit.load(id)
-        return commit.metadata
+        return Commit.load(id)
     except DoesNotExist:
         raise HTTPException(404, "Commit not found")
 
 
+@router.get("/api/v0/commits/{id}/")
+def read_commit(id: str = Path(default=None)):
+    return load_commit(id).metadata
+
+
+@router.get("/api/v0/commits/{id}/files/")
+def list_commit_files(id: str = Path(default=None)):
+    commit = load_commit(id)
+    return make_list_response(list(commit.get_manifest().values()))
+
+
+@router.get("/api/v0/commits/{id}/files/{path:path}")
+def get_commit_file(id: str = Path(default=None), path: str = Path(default=None)):
+    commit = load_commit(id)
+    entry = commit.get_manifest().get(posixpath.normpath(path))
+    if not entry:
+        raise HTTPException(404, "File not found in commit")
+    return StreamingResponse(
+        commit.iterate_file(entry),
+        media_type=(mimetypes.guess_type(path)[0] or "application/octet-stream"),
+        headers={"Content-Length": str(entry["size"]), "ETag": f'"{entry["sha256"]}"'},
+    )
+
+
 @router.post("/api/v0/projects/{project_id}/import-package/")
 def import_package(
     project_id: UUID = Path(default=None),
@@ -26,5 +53,10 @@ def import_package(
     description: Optional[str] = "",
 ):
     assert project_id == consts.PROJECT_ID
-    commit = Commit.create_from_data(data=data, description=description)
+    try:
+        commit = Commit.create_from_data(data=data, description=description)
+    except InvalidTarball as it:
+        raise HTTPException(400, str(it))
+    finally:
+        data.file.close()
     return commit.metadata
@@ -1,39 +1,103 @@
 from pathlib import Path
 
-from fastapi import APIRouter
-from fastapi.responses import JSONResponse
-from starlette.datastructures import URLPath
+import fnmatch
+from typing import List, Optional, Tuple
+
+from fastapi import APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.datastructures import URL, URLPath
 from starlette.requests import Request
 
-from minihai.app.utils import make_list_response
-from minihai.models.execution import Execution
-from minihai.models.output import get_output_cache, Output
+from minihai import conf
+from minihai.app.auth import get_signed_path_params
+from minihai.app.utils import make_paginated_response
+from minihai.lib.archives import ARCHIVE_FORMATS, iterate_archive
+from minihai.models.execution import Execution, OUTPUTS_INDEXED_METADATA_KEY
+from minihai.models.output import Output
+from minihai.services.checksums import output_checksummer
+from minihai.services.io import file_executor
+from minihai.services.outputs import refresh_output_index
 
 router = APIRouter()
 
 
+def list_execution_outputs(
+    execution_id: str, *, limit: int, offset: int
+) -> Tuple[int, List[dict]]:
+    execution = Execution.load(id=execution_id)
+    refresh_output_index(execution)
+    count = Output.count_for_execution(execution.id)
+    outputs = Output.list_for_execution(execution.id, limit=limit, offset=offset)
+    checksums = Output.get_checksums_many(outputs)
+    if execution.metadata.get(OUTPUTS_INDEXED_METADATA_KEY):
+        # Catch up on executions that finished before checksums were computed.
+        output_checksummer.schedule(outputs, known=checksums)
+    return (
+        count,
+        [
+            output.as_api_response(checksums=checksums.get(output.stat_key, {}))
+            for output in outputs
+        ],
+    )
+
+
 @router.get("/api/v0/data/")
-def list_data(output_execution: str = None):
+async def list_data(
+    request: Request,
+    output_execution: str = None,
+    limit: int = Query(default=1000, ge=1, le=10000),
+    offset: int = Query(default=0, ge=0),
+):
     if not output_execution:
         return JSONResponse(
             {"error": "This API requires the output_execution parameter"}, 400
         )
-    execution = Execution.load(id=output_execution)
-    output_datas = []
-
-    output_cache = get_output_cache()
-    for output in execution.iterate_outputs():
-        output.cache(output_cache)
-        output_datas.append(output.as_api_response())
-    return make_list_response(output_datas)
+    count, results = await file_executor.run(
+        list_execution_outputs, output_execution, limit=limit, offset=offset
+    )
+    return make_paginated_response(
+        request, results, count=count, limit=limit, offset=offset
+    )
 
 
 @router.get("/api/v0/data/{id}/download/")
-def get_datum_download_url(request: Request, id: str = Path()):
-    output = Output.from_cache(id)
+async def get_datum_download_url(request: Request, id: str = Path()):
+    output = await file_executor.run(Output.find, id)
     if not output:
-        return JSONResponse({"error": "Output not found in cache"}, 404)
+        return JSONResponse({"error": "Output not found"}, 404)
     url = URLPath(output.download_url).make_absolute_url(base_url=request.base_url)
+    if conf.settings.auth:
+        url = str(URL(url).include_query_params(**get_signed_path_params(output.path)))
     return {
         "url": url,
     }
+
+
+@router.get("/api/v0/data/archive/")
+def download_data_archive(
+    output_execution: str,
+    filter: Optional[str] = None,
+    format: str = Query(default="tar", regex=r"^(tar|tar\.gz|zip)$"),
+):
+    """
+    Download the outputs of an execution (optionally only those matching a glob)
+    as a single archive, generated on the fly.
+    """
+    execution = Execution.load(id=output_execution)
+    refresh_output_index(execution)
+    members = [
+        (output.name, output.disk_path)
+        for output in Output.list_for_execution(execution.id)
+        if not filter or fnmatch.fnmatch(output.name, filter)
+    ]
+    # The (synchronous) generator is run in a worker thread,
+    # so reading and compressing won't block the event loop.
+    return StreamingResponse(
+        iterate_archive(members, format, root=execution.outputs_path),
+        media_type=ARCHIVE_FORMATS[format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{execution.id}-outputs.{format}"'
+            )
+        },
+    )
@@ -0,0 +1,84 @@
+import mimetypes
+import os
+import posixpath
+import stat
+
+from fastapi import APIRouter, HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+
+from minihai import conf
+from minihai.app.auth import check_download_auth
+from minihai.lib.http import (
+    FileRegionResponse,
+    RangeNotSatisfiable,
+    get_etag,
+    get_last_modified,
+    is_not_modified,
+    parse_range,
+)
+from minihai.models.output import get_output_disk_path
+from minihai.services.io import file_executor
+
+router = APIRouter()
+
+
+@router.api_route("/data/{path:path}", methods=["GET", "HEAD"])
+async def download_data(request: Request, path: str):
+    """
+    Download an output file.
+
+    Supports (single) byte ranges for resuming downloads, and conditional requests.
+    If `sendfile_header` is configured, sending the file is left to the frontend server.
+    """
+    path = posixpath.normpath(path)
+    await check_download_auth(request, path)
+    disk_path = await file_executor.run(get_output_disk_path, path)
+    try:
+        file_stat = await file_executor.run(os.stat, disk_path) if disk_path else None
+    except FileNotFoundError:
+        file_stat = None
+    if not (file_stat and stat.S_ISREG(file_stat.st_mode)):
+        raise HTTPException(404, "File not found")
+    headers = {
+        "accept-ranges": "bytes",
+        "etag": get_etag(file_stat),
+        "last-modified": get_last_modified(file_stat),
+    }
+    if is_not_modified(request.headers, file_stat):
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    sendfile_header = conf.settings.sendfile_header
+    if sendfile_header:
+        if sendfile_header.lower() == "x-accel-redirect":
+            real_data_path = os.path.realpath(conf.settings.data_path)
+            location = posixpath.join(
+                conf.settings.sendfile_prefix,
+                os.path.relpath(disk_path, real_data_path).replace(os.sep, "/"),
+            )
+        else:
+            location = str(disk_path.absolute())
+        return Response(
+            headers={**headers, sendfile_header: location}, media_type=media_type
+        )
+    try:
+        byte_range = parse_range(request.headers, file_stat)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=416, headers={"content-range": f"bytes */{file_stat.st_size}"}
+        )
+    status_code = 200
+    start, end = (0, file_stat.st_size)
+    if byte_range:
+        status_code = 206
+        start, end = byte_range
+        headers["content-range"] = f"bytes {start}-{end - 1}/{file_stat.st_size}"
+    return FileRegionResponse(
+        str(disk_path),
+        offset=start,
+        length=(end - start),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+        send_body=(request.method != "HEAD"),
+    )
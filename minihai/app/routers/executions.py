@@ -1,63 +1,139 @@
-import logging
+from typing import Dict, List, Optional
 from uuid import UUID
 
-from fastapi import Path, APIRouter
+from fastapi import Path, APIRouter, Query, HTTPException
+from starlette.requests import Request
 
 from minihai import consts as consts
-from minihai.app.utils import make_list_response
+from minihai.app.utils import make_paginated_response
+from minihai.lib.index import InvalidQuery
 from minihai.models.commit import Commit
-from minihai.models.execution import (
-    Execution,
-    ExecutionCreationData,
-    ERROR_MESSAGE_METADATA_KEY,
+from minihai.models.execution import Execution, ExecutionCreationData
+from minihai.lib.events import EventPage, format_log_event, parse_event_time
+from minihai.services.io import docker_executor, file_executor
+from minihai.services.queue import (
+    execution_queue,
+    get_queue_info,
+    get_queue_positions,
 )
-from minihai.lib.events import format_log_event
-from minihai.services.execution import start_execution
 
 router = APIRouter()
 
-log = logging.getLogger(__name__)
+# Larger page sizes (valohai-cli asks for 9001) are clamped to this.
+MAX_EXECUTIONS_LIMIT = 1000
 
+# Status filter values that stand for several statuses.
+STATUS_ALIASES = {"incomplete": ("queued", "started")}
 
-def convert_execution(execution: Execution) -> dict:
+
+def convert_execution(
+    execution: Execution, queue_positions: Optional[Dict[str, int]] = None
+) -> dict:
     return {
         **execution.metadata,
         "duration": None,
         "events": None,
         "urls": {"display": None},
         "status": execution.status,
+        **get_queue_info(execution, positions=queue_positions),
     }
 
 
 @router.get("/api/v0/executions/")
-def read_executions():
+def read_executions(
+    request: Request,
+    limit: int = Query(default=100, ge=1),
+    offset: int = Query(default=0, ge=0),
+    ordering: str = "-ctime",
+    status: Optional[List[str]] = Query(default=None),
+    step: Optional[str] = None,
+    commit: Optional[str] = None,
+):
+    index = Execution.get_index()
+    limit = min(limit, MAX_EXECUTIONS_LIMIT)
+    if status:
+        status = sorted(
+            {value for alias in status for value in STATUS_ALIASES.get(alias, [alias])}
+        )
+    filters = {"status": status, "step": step, "commit": commit}
+    # Always tie-break on the ID so pagination is stable.
+    order_by = [term.strip() for term in ordering.split(",") if term.strip()] + ["id"]
+    try:
+        count = index.count(**filters)
+        ids = index.query(ordering=order_by, limit=limit, offset=offset, **filters)
+    except InvalidQuery as iq:
+        raise HTTPException(400, str(iq))
+    queue_positions = get_queue_positions()
     execution_datas = [
-        convert_execution(execution) for execution in Execution.iterate_instances()
+        convert_execution(Execution(id=id), queue_positions=queue_positions)
+        for id in ids
     ]
-    execution_datas.sort(key=lambda e: e["ctime"], reverse=True)
-    return make_list_response(execution_datas)
+    return make_paginated_response(
+        request, execution_datas, count=count, limit=limit, offset=offset
+    )
+
+
+def load_execution_data(execution_id: UUID) -> dict:
+    return convert_execution(Execution.load(id=execution_id))
+
+
+# The endpoints polled by clients are async, and do their blocking work in dedicated
+# pools (see `minihai.services.io`) instead of tying up the shared request threadpool.
 
 
 @router.get("/api/v0/executions/{execution_id}/")
-def get_execution_detail(execution_id: UUID = Path(default=None),):
-    execution = Execution.load(id=execution_id)
-    execution.check_container_status()
-    return convert_execution(execution)
+async def get_execution_detail(
+    execution_id: UUID = Path(default=None),
+):
+    return await file_executor.run(load_execution_data, execution_id)
 
 
 @router.get("/api/v0/executions/{execution_id}/events/")
-def get_execution_events(execution_id: UUID = Path(default=None),):
-    execution = Execution.load(id=execution_id)
-    execution.check_container_status()
-    events = execution.get_logs()
-    if not events:
-        events = [
-            format_log_event(stream="status", message="No events available..."),
-        ]
+async def get_execution_events(
+    execution_id: UUID = Path(default=None),
+    limit: int = Query(default=2000, ge=1, le=10000),
+    offset: Optional[int] = Query(default=None, ge=0),
+    since: Optional[str] = None,
+):
+    """
+    Get execution log events.
+
+    Without `offset` or `since`, the last `limit` events are returned.
+    To poll for new events, pass the `next_since` value of the previous response as `since`
+    (if more than `limit` events have appeared since, `truncated` is set, and the rest
+    are fetched by polling again); to page forward, pass `offset`.
+    """
+    if since is not None:
+        try:
+            parse_event_time(since)
+        except ValueError:
+            raise HTTPException(400, f"Invalid since timestamp {since!r}")
+    execution = await file_executor.run(Execution.load, id=execution_id)
+    page = await file_executor.run(
+        execution.get_stored_logs, since=since, offset=offset, limit=limit
+    )
+    if page is None:
+        # Still running, so the logs come from the Docker daemon.
+        page = await docker_executor.run(
+            execution.get_live_logs, since=since, offset=offset, limit=limit
+        )
+    if not page:
+        page = EventPage(events=[], total=0, start=0)
+    events = page.events
+    if offset is None and since is None:
+        truncated = page.start > 0
+        if not events:
+            events = [
+                format_log_event(stream="status", message="No events available..."),
+            ]
+    else:
+        truncated = page.start + len(events) < page.total
     return {
-        "total": len(events),
-        "limit": 2000,
-        "truncated": False,
+        "total": page.total,
+        "limit": limit,
+        "offset": page.start,
+        "truncated": truncated,
+        "next_since": (page.events[-1]["time"] if page.events else since),
         "events": events,
     }
 
@@ -72,12 +148,5 @@ def create_execution(body: ExecutionCreationData):
         raise NotImplementedError("Inputs not supported")
     Commit.load(id=body.commit)  # simply asserts the commit exists
     execution = Execution.create(data=body)
-    try:
-        start_execution(execution)  # TODO: absolutely no queuing here :)
-    except Exception as exc:
-        log.error(f"Could not start execution {execution.id}", exc_info=True)
-        execution.update_metadata(
-            {ERROR_MESSAGE_METADATA_KEY: str(exc),}
-        )
-
-    return execution.metadata
+    execution_queue.notify()
+    return convert_execution(execution)
@@ -1,11 +1,10 @@
-import secrets
-
 from fastapi import APIRouter, Response, HTTPException, Form
 
 import minihai
 from minihai import conf
 from minihai.app.auth import create_access_token, create_user_access_token
 from minihai.art import BANNER
+from minihai.lib.passwords import verify_password
 
 router = APIRouter()
 
@@ -35,7 +34,7 @@ def get_token(username: str = Form(None), password: str = Form(None)):
     correct_password = conf.settings.auth.get(username)
     if not correct_password:
         raise HTTPException(400, {"error": "Invalid Minihai username"})
-    if not secrets.compare_digest(password, correct_password):
+    if not verify_password(password or "", correct_password):
         raise HTTPException(400, {"error": "Invalid Minihai password"})
 
     return {
@@ -1,10 +1,35 @@
-from typing import List
+from typing import List, Optional
 
+from starlette.requests import Request
 
-def make_list_response(results: List[dict]):
+
+def make_list_response(
+    results: List[dict],
+    *,
+    count: Optional[int] = None,
+    next: Optional[str] = None,
+    previous: Optional[str] = None,
+):
     return {
-        "count": len(results),
-        "next": None,
-        "previous": None,
+        "count": (len(results) if count is None else count),
+        "next": next,
+        "previous": previous,
         "results": results,
     }
+
+
+def make_paginated_response(
+    request: Request, results: List[dict], *, count: int, limit: int, offset: int
+):
+    next = previous = None
+    if offset + limit < count:
+        next = str(request.url.include_query_params(limit=limit, offset=offset + limit))
+    if offset > 0:
+        previous_offset = max(0, offset - limit)
+        if previous_offset:
+            previous = str(
+                request.url.include_query_params(limit=limit, offset=previous_offset)
+            )
+        else:
+            previous = str(request.url.remove_query_params("offset"))
+    return make_list_response(results, count=count, next=next, previous=previous)
@@ -1,7 +1,6 @@
 import os
 
 import click
-import uvicorn
 
 import minihai
 from minihai.art import BANNER
@@ -23,8 +22,101 @@ def main(config):
 @click.option("-h", "--host", default="127.0.0.1")
 @click.option("-p", "--port", default=8000, type=int)
 @click.option("--debug/--no-debug", default=False)
-def start(host, port, debug=False):
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of server processes (background tasks run in one of them).",
+)
+def start(host, port, debug=False, workers=1):
+    import uvicorn
+
+    if debug and workers > 1:
+        raise click.UsageError("--debug (auto-reloading) requires a single worker.")
     print(f"{BANNER} :: {minihai.__version__}")
     uvicorn.run(
-        "minihai.app:app", host=host, port=port, debug=debug, reload=debug,
+        "minihai.app:app",
+        host=host,
+        port=port,
+        debug=debug,
+        reload=debug,
+        workers=workers,
     )
+
+
+@main.command(help="Rebuild the metadata index from the data directory.")
+def reindex():
+    from minihai.models.commit import Commit
+    from minihai.models.execution import Execution
+
+    for model in (Commit, Execution):
+        n = model.rebuild_index()
+        print(f"Indexed {n} {model.kind} objects.")
+    n = sum(execution.index_outputs() for execution in Execution.iterate_instances())
+    print(f"Indexed {n} outputs.")
+
+
+@main.command(help="Run one-off data directory migrations.")
+def migrate():
+    from minihai.models.execution import Execution
+
+    counter = Execution.get_sequence("counter").seed(Execution.get_max_counter())
+    print(f"Execution counter sequence seeded at {counter}.")
+    n = sum(execution.migrate_json_log() for execution in Execution.iterate_instances())
+    print(f"Migrated {n} JSON logs to log archives.")
+
+
+@main.command(help="Compress the logs of finished executions.")
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="Number of executions to compress in parallel (default: CPU count).",
+)
+def compact(jobs):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from minihai.lib.host import get_cpu_count
+    from minihai.models.execution import Execution
+
+    # Compression releases the GIL, so threads do run in parallel here.
+    with ThreadPoolExecutor(max_workers=(jobs or get_cpu_count())) as executor:
+        n = sum(
+            executor.map(
+                lambda execution: execution.compact_logs(),
+                Execution.iterate_instances(),
+            )
+        )
+    print(f"Compacted the logs of {n} executions.")
+
+
+@main.command(
+    name="hash-password", help="Hash a password for the `auth` configuration."
+)
+@click.password_option()
+def hash_password(password):
+    from minihai.lib.passwords import hash_password
+
+    print(hash_password(password))
+
+
+@main.command(help="Pull the images of all steps in a commit's valohai.yaml.")
+@click.argument("commit_id")
+def prefetch(commit_id):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from minihai.models.base import DoesNotExist
+    from minihai.models.commit import Commit
+    from minihai.services.docker import resolve_image
+    from minihai.services.execution import qualify_image_name
+
+    try:
+        config = Commit.load(commit_id).load_config()
+    except DoesNotExist as dne:
+        raise click.ClickException(str(dne))
+    images = sorted({qualify_image_name(step.image) for step in config.steps.values()})
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for image, image_id in zip(images, executor.map(resolve_image, images)):
+            print(f"{image}: {image_id}")
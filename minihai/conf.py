@@ -4,13 +4,18 @@ import os
 import secrets
 import sqlite3
 import sys
+import threading
 from pathlib import Path
-from typing import Dict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional
 
-import docker
 import pydantic
 import yaml
 
+from minihai.lib.sqlite import ConnectionPerThread, connect
+
+if TYPE_CHECKING:  # pragma: no cover
+    import docker
+
 BASE_PATH = Path(__file__).parent.parent
 log = logging.getLogger(__name__)
 
@@ -30,17 +35,50 @@ class Settings(pydantic.BaseSettings):
     read_only_mounts: Dict[str, str] = {}
     jwt_secret: str = None
     auth: Dict[str, str] = {}
+    metadata_compact: bool = False
+    metadata_fsync: bool = False
+    max_concurrent_executions: Optional[int] = None  # defaults to the CPU count
+    min_free_memory_mb: int = 512
+    max_load_per_cpu: Optional[float] = 1.5
+    boot_workers: int = 4
+    image_id_cache_ttl: float = 60
+    repository_cache: bool = True
+    repository_cache_max_size_mb: int = 5120
+    config_cache_size: int = 256
+    log_compression: Optional[str] = "zstd"  # or "gzip", or "none"
+    cache_ttl: Optional[float] = 30 * 24 * 60 * 60
+    cache_max_entries: Optional[int] = 1_000_000
+    cache_memory_size: int = 4096
+    checksum_workers: int = 2
+    download_url_ttl: float = 3600
+    sendfile_header: Optional[str] = None  # "X-Accel-Redirect" or "X-Sendfile"
+    sendfile_prefix: str = "/protected-data/"
+    token_ttl: float = 30 * 24 * 60 * 60
+    token_cache_size: int = 1024
+    docker_concurrency: int = 8
+    io_workers: int = 32
 
     def initialize(self):
         os.makedirs(self.data_path, exist_ok=True)
         jwt_secret_path = self.data_path / "jwt_secret.json"
         if jwt_secret_path.exists() or not self.jwt_secret:
             if not jwt_secret_path.exists():
-                jwt_secret_path.write_text(
-                    json.dumps({"secret": secrets.token_hex(64)})
-                )
+                self._create_jwt_secret(jwt_secret_path)
             self.jwt_secret = json.loads(jwt_secret_path.read_text())["secret"]
 
+    def _create_jwt_secret(self, path: Path):
+        # Several server workers may be starting at once, and they must all agree
+        # on the secret, so the file is written aside and linked into place;
+        # whoever gets there first wins, and everyone reads the winner's secret.
+        temp_path = path.with_name(f".{path.name}.{os.getpid()}")
+        temp_path.write_text(json.dumps({"secret": secrets.token_hex(64)}))
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            temp_path.unlink()
+
     class Config:
         env_prefix = "MINIHAI"
 
@@ -59,19 +97,57 @@ class Settings(pydantic.BaseSettings):
             )
 
 
-# TODO: this initialization should probably happen a little more deferredly...
+def load_settings() -> Settings:
+    try:
+        settings = Settings()
+        settings.initialize()
+    except pydantic.ValidationError as ve:
+        print("=================================================", file=sys.stderr)
+        print("Minihai: Failed to load settings!", file=sys.stderr)
+        print(ve, file=sys.stderr)
+        print("=================================================", file=sys.stderr)
+        sys.exit(9)
+    return settings
+
+
+def create_docker_client() -> "docker.DockerClient":
+    import docker
+
+    return docker.from_env()
+
+
+def create_cache_db() -> ConnectionPerThread:
+    return ConnectionPerThread(__getattr__("settings").data_path / "cache.sqlite3")
+
+
+def create_index_db() -> sqlite3.Connection:
+    return connect(
+        __getattr__("settings").data_path / "index.sqlite3", check_same_thread=False
+    )
+
+
+# These are created on first access (see `__getattr__` below), so merely importing
+# Minihai doesn't need a configuration, a data directory, or Docker.
+settings: Settings
+docker_client: "docker.DockerClient"
+cache_db: ConnectionPerThread
+index_db: sqlite3.Connection
+
+_factories: Dict[str, Callable[[], Any]] = {
+    "settings": load_settings,
+    "docker_client": create_docker_client,
+    "cache_db": create_cache_db,
+    "index_db": create_index_db,
+}
+_init_lock = threading.RLock()
 
-try:
-    settings = Settings()
-    settings.initialize()
-except pydantic.ValidationError as ve:
-    print("=================================================", file=sys.stderr)
-    print("Minihai: Failed to load settings!", file=sys.stderr)
-    print(ve, file=sys.stderr)
-    print("=================================================", file=sys.stderr)
-    sys.exit(9)
 
-docker_client = docker.from_env()
-cache_db = sqlite3.connect(
-    str(settings.data_path / "cache.sqlite3"), check_same_thread=False
-)
+def __getattr__(name: str) -> Any:
+    factory = _factories.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _init_lock:
+        # Once set, the module attribute is found directly and we're not called again.
+        if name not in globals():
+            globals()[name] = factory()
+        return globals()[name]
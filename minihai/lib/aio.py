@@ -0,0 +1,45 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """
+    A lazily created thread pool for running blocking calls from async code.
+
+    At most `max_workers` (a callable, so it may come from settings loaded later)
+    calls run at a time; the rest wait their turn in order, without tying up
+    the event loop or any other pool.
+    """
+
+    def __init__(self, max_workers: Callable[[], int], thread_name_prefix: str):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers(),
+                    thread_name_prefix=self.thread_name_prefix,
+                )
+            return self._executor
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False)
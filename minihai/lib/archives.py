@@ -0,0 +1,160 @@
+import io
+import os
+import pathlib
+import stat
+import tarfile
+import zipfile
+import zlib
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Tuple
+
+from minihai.lib.files import resolve_within
+from minihai.lib.tarballs import CHUNK_SIZE
+
+# Archive members as (name in archive, path on disk) pairs.
+Members = Iterable[Tuple[str, pathlib.Path]]
+
+# Small pieces (headers, small files) are sent in batches of at least this size.
+MIN_SEND_SIZE = 64 * 1024
+
+
+class _ChunkCollector(io.RawIOBase):
+    """
+    An unseekable sink that collects whatever is written to it until drained.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        return iter(chunks)
+
+
+def coalesce(chunks: Iterable[bytes], min_size: int = MIN_SEND_SIZE) -> Iterator[bytes]:
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= min_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def open_member(path: pathlib.Path, root: Optional[pathlib.Path]) -> Optional[BinaryIO]:
+    """
+    Open a member file for reading, or return None if it should be skipped:
+    if it has disappeared, isn't a regular file, or (when `root` is given)
+    its real path lies outside `root`.
+    """
+    if root:
+        path = resolve_within(root, path)
+        if not path:
+            return None
+    try:
+        fp = open(path, "rb")
+    except (FileNotFoundError, IsADirectoryError):
+        return None
+    if not stat.S_ISREG(os.fstat(fp.fileno()).st_mode):
+        fp.close()
+        return None
+    return fp
+
+
+def iterate_tar(
+    members: Members, root: Optional[pathlib.Path] = None
+) -> Iterator[bytes]:
+    """
+    Generate an (uncompressed) tar archive of the given files, reading them in chunks.
+
+    Files that disappear before they're read (or lead outside `root`) are skipped.
+    """
+    for name, path in members:
+        fp = open_member(path, root)
+        if not fp:
+            continue
+        with fp:
+            file_stat = os.fstat(fp.fileno())
+            info = tarfile.TarInfo(name)
+            info.size = file_stat.st_size
+            info.mtime = int(file_stat.st_mtime)
+            info.mode = 0o644
+            yield info.tobuf(format=tarfile.PAX_FORMAT)
+            remaining = info.size
+            while remaining > 0:
+                chunk = fp.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+            if remaining:  # The file shrank; the header has already promised more.
+                yield bytes(remaining)
+            padding = -info.size % tarfile.BLOCKSIZE
+            if padding:
+                yield bytes(padding)
+    yield bytes(2 * tarfile.BLOCKSIZE)
+
+
+def iterate_zip(
+    members: Members, root: Optional[pathlib.Path] = None
+) -> Iterator[bytes]:
+    """
+    Generate a (deflated) zip archive of the given files, reading them in chunks.
+
+    Files that disappear before they're read (or lead outside `root`) are skipped.
+    """
+    collector = _ChunkCollector()
+    with zipfile.ZipFile(collector, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, path in members:
+            fp = open_member(path, root)
+            if not fp:
+                continue
+            # (The opened file's name is its real path.)
+            info = zipfile.ZipInfo.from_file(fp.name, arcname=name)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with fp, zf.open(info, mode="w", force_zip64=True) as zfp:
+                while True:
+                    chunk = fp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    zfp.write(chunk)
+                    yield from collector.drain()
+            yield from collector.drain()
+    yield from collector.drain()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+ARCHIVE_FORMATS = {
+    "tar": "application/x-tar",
+    "tar.gz": "application/gzip",
+    "zip": "application/zip",
+}
+
+
+def iterate_archive(
+    members: Members, format: str, root: Optional[pathlib.Path] = None
+) -> Iterator[bytes]:
+    if format == "tar":
+        chunks = iterate_tar(members, root)
+    elif format == "tar.gz":
+        chunks = gzip_chunks(iterate_tar(members, root))
+    elif format == "zip":
+        chunks = iterate_zip(members, root)
+    else:
+        raise ValueError(f"Unknown archive format {format!r}")
+    return coalesce(chunks)
@@ -1,20 +1,63 @@
+import contextlib
 import json
 import sqlite3
+import threading
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
 
 from fastapi.encoders import jsonable_encoder
 
+from minihai.lib.lru import LRUCache
+from minihai.lib.sqlite import ConnectionPerThread
+
 # SQLite has Upsert since version 3.24.0
 has_upsert = (sqlite3.sqlite_version_info >= (3, 24))
 
+# Stay well below SQLite's default limit of 999 host parameters per query.
+MAX_QUERY_PARAMS = 500
+
+_missing = object()
+
+
 class Cache:
-    def __init__(self, db: sqlite3.Connection, name: str):
+    """
+    A persistent key-value cache in an SQLite table, fronted by an in-memory LRU cache.
+
+    Entries older than `ttl` seconds are treated as missing, and `evict()`
+    (run automatically every `eviction_interval` writes) removes expired entries
+    and the oldest entries beyond `max_entries`.
+
+    `db` may be a connection shared between threads (access to it is serialized),
+    or a `ConnectionPerThread` for concurrent access.
+    """
+
+    def __init__(
+        self,
+        db: Union[sqlite3.Connection, ConnectionPerThread],
+        name: str,
+        *,
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        memory_size: int = 1024,
+        eviction_interval: int = 1000,
+    ):
         self.db = db
         self.name = name
-        self.db.execute(
-            f"CREATE TABLE IF NOT EXISTS {self.name} (key TEXT PRIMARY KEY, value TEXT, ts INTEGER)"
-        )
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.eviction_interval = eviction_interval
+        self.memory = LRUCache(maxsize=memory_size)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes_since_eviction = 0
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        with self.transaction() as db:
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} (key TEXT PRIMARY KEY, value TEXT, ts INTEGER)"
+            )
+            db.execute(f"CREATE INDEX IF NOT EXISTS {self.name}_ts ON {self.name} (ts)")
 
     def encode(self, value: Any) -> str:
         return json.dumps(value, default=jsonable_encoder)
@@ -22,6 +65,75 @@ class Cache:
     def decode(self, value: str) -> Any:
         return json.loads(value)
 
+    @contextlib.contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        if isinstance(self.db, ConnectionPerThread):
+            yield self.db.connection
+        else:
+            with self._lock:
+                yield self.db
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a batch of cache operations in a single transaction.
+
+        Nested transactions (in the same thread) are part of the outermost one.
+        """
+        depth = getattr(self._local, "depth", 0)
+        with self._connection() as db:
+            if depth:
+                yield db
+                return
+            self._local.depth = 1
+            try:
+                with db:
+                    yield db
+            except BaseException:
+                # The in-memory tier may have seen writes that were just rolled back.
+                self.memory.clear()
+                raise
+            finally:
+                self._local.depth = 0
+
+    def _is_fresh(self, ts: float, now: float) -> bool:
+        return not self.ttl or ts > now - self.ttl
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Get the values for those of `keys` that are in the cache.
+        """
+        now = time.time()
+        found = {}
+        db_keys = []
+        db_hits = 0
+        for key in (str(key) for key in keys):
+            entry = self.memory.get(key, _missing)
+            if entry is not _missing and self._is_fresh(entry[1], now):
+                found[key] = entry[0]
+            else:
+                db_keys.append(key)
+        for start in range(0, len(db_keys), MAX_QUERY_PARAMS):
+            chunk = db_keys[start : start + MAX_QUERY_PARAMS]
+            query = (
+                f"SELECT key, value, ts FROM {self.name} "
+                f"WHERE key IN ({', '.join('?' for key in chunk)})"
+            )
+            with self._connection() as db:
+                rows = db.execute(query, chunk).fetchall()
+            for key, value, ts in rows:
+                if self._is_fresh(ts, now):
+                    found[key] = self.decode(value)
+                    self.memory.set(key, (found[key], ts))
+                    db_hits += 1
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(db_keys) - db_hits
+        return found
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(str(key), default)
+
     def set_many(self, key_to_value: Dict[str, Any]):
         if has_upsert:
             query = (
@@ -38,23 +150,80 @@ class Cache:
                 f"(key, value, ts) "
                 f"VALUES (?, ?, ?)"
             )
-
-        return self.db.executemany(
-            query,
-            [
-                (str(key), self.encode(value), time.time(),)
-                for (key, value) in key_to_value.items()
-            ],
-        )
+        now = time.time()
+        with self.transaction() as db:
+            db.executemany(
+                query,
+                [
+                    (
+                        str(key),
+                        self.encode(value),
+                        now,
+                    )
+                    for (key, value) in key_to_value.items()
+                ],
+            )
+        for key, value in key_to_value.items():
+            # Store the decoded form, so memory hits look exactly like database hits.
+            self.memory.set(str(key), (self.decode(self.encode(value)), now))
+        with self._lock:
+            self._writes_since_eviction += len(key_to_value)
+            should_evict = self._writes_since_eviction >= self.eviction_interval
+        if should_evict:
+            self.evict()
 
     def set(self, key: str, value: Any):
         return self.set_many({key: value})
 
-    def get(self, key: str, default=None):
-        query = f"SELECT value FROM {self.name} WHERE key = ? LIMIT 1"
-        params = (key,)
-        res = self.db.execute(query, params,)
-        row = res.fetchone()
-        if not row:
-            return default
-        return self.decode(row[0])
+    def delete_many(self, keys: Iterable[str]):
+        keys = [str(key) for key in keys]
+        with self.transaction() as db:
+            db.executemany(
+                f"DELETE FROM {self.name} WHERE key = ?", [(key,) for key in keys]
+            )
+        for key in keys:
+            self.memory.pop(key)
+
+    def delete(self, key: str):
+        return self.delete_many([key])
+
+    def clear(self):
+        with self.transaction() as db:
+            db.execute(f"DELETE FROM {self.name}")
+        self.memory.clear()
+
+    def evict(self) -> int:
+        """
+        Remove expired entries, and the oldest entries in excess of `max_entries`.
+        """
+        n = 0
+        with self.transaction() as db:
+            if self.ttl:
+                n += db.execute(
+                    f"DELETE FROM {self.name} WHERE ts <= ?",
+                    (time.time() - self.ttl,),
+                ).rowcount
+            if self.max_entries is not None:
+                (count,) = db.execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()
+                if count > self.max_entries:
+                    n += db.execute(
+                        f"DELETE FROM {self.name} WHERE key IN "
+                        f"(SELECT key FROM {self.name} ORDER BY ts LIMIT ?)",
+                        (count - self.max_entries,),
+                    ).rowcount
+        with self._lock:
+            self._writes_since_eviction = 0
+            self.evictions += n
+        if n:
+            # Simpler than figuring out which of the entries in memory were evicted.
+            self.memory.clear()
+        return n
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "memory": self.memory.stats,
+        }
@@ -0,0 +1,93 @@
+import functools
+import gzip
+import io
+import logging
+from typing import BinaryIO, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+log = logging.getLogger(__name__)
+
+
+class Codec:
+    """
+    A compression format for files at rest.
+
+    Concatenated compressed blocks (gzip members, zstd frames) decompress
+    into the concatenation of their contents, so files may be written a block at a time
+    and read starting from any block boundary.
+    """
+
+    name: str
+    suffix: str
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def open_reader(self, fp: BinaryIO) -> BinaryIO:
+        """
+        Wrap `fp` (positioned at a block boundary) to read decompressed data from it.
+        """
+        raise NotImplementedError()
+
+    def open_writer(self, fp: BinaryIO) -> BinaryIO:
+        """
+        Wrap `fp` to compress data written into it; the wrapper must be closed.
+        """
+        raise NotImplementedError()
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    suffix = ".gz"
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, compresslevel=6)
+
+    def open_reader(self, fp: BinaryIO) -> BinaryIO:
+        return gzip.GzipFile(fileobj=fp, mode="rb")
+
+    def open_writer(self, fp: BinaryIO) -> BinaryIO:
+        return gzip.GzipFile(fileobj=fp, mode="wb", compresslevel=6)
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    suffix = ".zst"
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor().compress(data)
+
+    def open_reader(self, fp: BinaryIO) -> BinaryIO:
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(
+                fp, read_across_frames=True, closefd=False
+            )
+        )
+
+    def open_writer(self, fp: BinaryIO) -> BinaryIO:
+        return zstandard.ZstdCompressor().stream_writer(fp, closefd=False)
+
+
+CODECS: Dict[str, Codec] = {codec.name: codec for codec in (GzipCodec(), ZstdCodec())}
+
+
+@functools.lru_cache()
+def get_codec(name: Optional[str]) -> Optional[Codec]:
+    """
+    Get a codec by name; `None` or "none" means no compression.
+
+    zstd falls back to gzip if the `zstandard` library isn't installed.
+    """
+    if not name or name == "none":
+        return None
+    if name == "zstd" and not zstandard:
+        log.warning("zstandard is not installed, falling back to gzip compression")
+        name = "gzip"
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown compression format {name!r}")
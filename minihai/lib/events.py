@@ -1,5 +1,7 @@
+import collections
 import datetime
-from typing import Union
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple, Union
 
 
 def format_log_event(
@@ -14,3 +16,59 @@ def format_log_event(
         "message": str(message),
         "time": time,
     }
+
+
+@dataclass
+class EventPage:
+    events: List[dict]
+    total: int  # the number of events available (after the `since` cursor, if any)
+    start: int  # the index of the first event in `events`
+
+
+def get_page_bounds(
+    total: int, *, offset: Optional[int], limit: Optional[int]
+) -> Tuple[int, int]:
+    """
+    Get the slice bounds for a page; if no offset is given, the page is the last `limit` items.
+    """
+    if offset is None:
+        start = max(0, total - limit) if limit else 0
+    else:
+        start = offset
+    end = min(total, start + limit) if limit else total
+    return (start, max(start, end))
+
+
+def paginate_events(
+    events: Iterable[dict], *, offset: Optional[int], limit: Optional[int]
+) -> EventPage:
+    """
+    Get a page (see `get_page_bounds`) of a stream of events.
+
+    Only the page is kept in memory; the rest of the events are just counted.
+    """
+    if offset is None and limit:
+        page = collections.deque(maxlen=limit)
+        total = 0
+        for event in events:
+            page.append(event)
+            total += 1
+        return EventPage(events=list(page), total=total, start=total - len(page))
+    start = offset or 0
+    end = start + limit if limit else None
+    page = []
+    total = 0
+    for event in events:
+        if start <= total and (end is None or total < end):
+            page.append(event)
+        total += 1
+    return EventPage(events=page, total=total, start=start)
+
+
+def parse_event_time(time: str) -> datetime.datetime:
+    """
+    Parse an event timestamp (as Docker formats them, in UTC) to second resolution.
+    """
+    return datetime.datetime.strptime(time[:19], "%Y-%m-%dT%H:%M:%S").replace(
+        tzinfo=datetime.timezone.utc
+    )
@@ -0,0 +1,87 @@
+import contextlib
+import hashlib
+import os
+import pathlib
+import tempfile
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional
+
+
+def fsync_directory(path: pathlib.Path) -> None:
+    if os.name != "posix":  # Directories can't be opened for fsync elsewhere.
+        return
+    fd = os.open(str(path), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def resolve_within(root: pathlib.Path, path: pathlib.Path) -> Optional[pathlib.Path]:
+    """
+    Get the real path of `path` (with all symlinks resolved),
+    or None if that lies outside (the real path of) `root`.
+    """
+    real_root = os.path.realpath(root)
+    real_path = os.path.realpath(path)
+    if os.path.commonpath([real_root, real_path]) != real_root:
+        return None
+    return pathlib.Path(real_path)
+
+
+def atomic_write(path: pathlib.Path, data: bytes, *, fsync: bool = False) -> None:
+    """
+    Write `data` to `path` so readers only ever see either the old or the new content.
+
+    The data is written into a temporary file in the same directory,
+    which is then renamed over the target.
+    """
+    with atomic_writer(path, fsync=fsync) as outf:
+        outf.write(data)
+
+
+@contextlib.contextmanager
+def atomic_writer(path: pathlib.Path, *, fsync: bool = False) -> Iterator[BinaryIO]:
+    """
+    Open a temporary file that is renamed over `path` once the block completes.
+
+    If the block raises, the temporary file is removed and `path` is left untouched.
+    """
+    path = pathlib.Path(path)
+    fd, temp_path = tempfile.mkstemp(
+        dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+    )
+    try:
+        with open(fd, "wb") as outf:
+            yield outf
+            if fsync:
+                outf.flush()
+                os.fsync(outf.fileno())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if fsync:
+        fsync_directory(path.parent)
+
+
+def hash_file(
+    path: pathlib.Path,
+    algorithms: Iterable[str] = ("sha256", "md5"),
+    chunk_size: int = 1024 * 1024,
+) -> Dict[str, str]:
+    """
+    Compute hex digests of the file at `path` with each of `algorithms`, in one read.
+    """
+    hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+    with open(path, "rb") as fp:
+        while True:
+            chunk = fp.read(chunk_size)
+            if not chunk:
+                break
+            for hasher in hashers.values():
+                hasher.update(chunk)
+    return {algorithm: hasher.hexdigest() for (algorithm, hasher) in hashers.items()}
@@ -0,0 +1,33 @@
+import os
+from typing import Optional
+
+
+def get_cpu_count() -> int:
+    return os.cpu_count() or 1
+
+
+def get_available_memory() -> Optional[int]:
+    """
+    Get the amount of memory (in bytes) available for new processes, if it can be figured out.
+    """
+    try:
+        with open("/proc/meminfo") as fp:
+            for line in fp:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def get_load_per_cpu() -> Optional[float]:
+    """
+    Get the 1-minute load average divided by the number of CPUs, if available.
+    """
+    try:
+        return os.getloadavg()[0] / get_cpu_count()
+    except (AttributeError, OSError):
+        return None
@@ -0,0 +1,162 @@
+import email.utils
+import os
+import re
+from typing import Optional, Tuple
+
+import aiofiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 1024 * 1024
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+_range_re = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def get_etag(stat: os.stat_result) -> str:
+    return f'"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def get_last_modified(stat: os.stat_result) -> str:
+    return email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+
+def _parse_http_date(value: str) -> Optional[float]:
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    # Weak comparison, as is appropriate for If-None-Match.
+    tags = [tag.strip() for tag in header.split(",")]
+    tags = [(tag[2:] if tag.startswith("W/") else tag) for tag in tags]
+    return "*" in tags or etag in tags
+
+
+def is_not_modified(headers: Headers, stat: os.stat_result) -> bool:
+    """
+    Figure out whether a conditional GET/HEAD request can be answered with a 304.
+    """
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present.
+        return _etag_matches(if_none_match, get_etag(stat))
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since:
+        since = _parse_http_date(if_modified_since)
+        return since is not None and int(stat.st_mtime) <= since
+    return False
+
+
+def parse_range(headers: Headers, stat: os.stat_result) -> Optional[Tuple[int, int]]:
+    """
+    Get the (start, end) byte range (end exclusive) requested, or None for the whole file.
+
+    Only single ranges are supported; requests for multiple ranges get the whole file.
+
+    :raises RangeNotSatisfiable: if the range lies outside the file.
+    """
+    range_header = headers.get("range")
+    if not range_header:
+        return None
+    if_range = headers.get("if-range")
+    if if_range:
+        # Only resume if the file hasn't changed since the client got the first part.
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            if if_range != get_etag(stat):
+                return None
+        elif _parse_http_date(if_range) != int(stat.st_mtime):
+            return None
+    match = _range_re.match(range_header.strip())
+    if not match:
+        return None
+    size = stat.st_size
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end) + 1, size) if end else size
+    elif end:  # Suffix range: the last `end` bytes.
+        start = max(0, size - int(end))
+        end = size
+    else:
+        return None
+    if start >= end:
+        raise RangeNotSatisfiable(f"Range {range_header} not satisfiable")
+    return (start, end)
+
+
+class FileRegionResponse(Response):
+    """
+    Sends a region of a file, using the ASGI zero-copy send extension if the server has it.
+
+    The file is read (in chunks, off the event loop) otherwise.
+    """
+
+    chunk_size = CHUNK_SIZE
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        offset: int,
+        length: int,
+        status_code: int = 200,
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None,
+        send_body: bool = True,
+    ):
+        self.path = path
+        self.offset = offset
+        self.length = length
+        self.send_body = send_body
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**(headers or {}), "content-length": str(length)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if not (self.send_body and self.length):
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as fp:
+                await send(
+                    {
+                        "type": ZEROCOPY_EXTENSION,
+                        "file": fp,
+                        "offset": self.offset,
+                        "count": self.length,
+                    }
+                )
+            return
+        remaining = self.length
+        async with aiofiles.open(self.path, mode="rb") as fp:
+            await fp.seek(self.offset)
+            while remaining > 0:
+                chunk = await fp.read(min(self.chunk_size, remaining))
+                if not chunk:  # Truncated while we were reading.
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b""})
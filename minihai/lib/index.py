@@ -0,0 +1,207 @@
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+
+class InvalidQuery(ValueError):
+    pass
+
+
+def _quote(name: str) -> str:
+    # Some of our column names (e.g. `commit`) are SQL keywords.
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class Index:
+    """
+    A queryable SQLite table of selected metadata fields, keyed by object ID.
+
+    The on-disk metadata files remain the source of truth;
+    the index only exists so listings don't need to walk the data directory.
+
+    Each of `indexed_columns` (all columns by default) gets an SQL index;
+    a tuple of columns gets a composite index.
+    """
+
+    def __init__(
+        self,
+        db: sqlite3.Connection,
+        name: str,
+        columns: Dict[str, str],
+        lock: Optional[threading.Lock] = None,
+        indexed_columns: Optional[Iterable[Union[str, Tuple[str, ...]]]] = None,
+    ):
+        self.db = db
+        self.name = name
+        self.columns = dict(columns)
+        self.indexed_columns = list(
+            self.columns if indexed_columns is None else indexed_columns
+        )
+        self.lock = lock or threading.Lock()
+        column_defs = ", ".join(
+            f"{_quote(column)} {type}" for (column, type) in self.columns.items()
+        )
+        with self.lock, self.db:
+            # Other processes may be setting up (or upgrading) the same table.
+            self.db.execute("BEGIN IMMEDIATE")
+            res = self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (self.name,),
+            )
+            # Whether the table is new, i.e. still needs to be filled in.
+            self.created = res.fetchone() is None
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {_quote(self.name)} "
+                f"(id TEXT PRIMARY KEY, {column_defs})"
+            )
+            # Add any columns introduced since the table was created.
+            res = self.db.execute(f"PRAGMA table_info({_quote(self.name)})")
+            existing_columns = {row[1] for row in res.fetchall()}
+            for column, type in self.columns.items():
+                if column not in existing_columns:
+                    self.db.execute(
+                        f"ALTER TABLE {_quote(self.name)} "
+                        f"ADD COLUMN {_quote(column)} {type}"
+                    )
+            for columns in self.indexed_columns:
+                if isinstance(columns, str):
+                    columns = (columns,)
+                index_name = "_".join([self.name, *columns])
+                self.db.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(index_name)} "
+                    f"ON {_quote(self.name)} "
+                    f"({', '.join(_quote(column) for column in columns)})"
+                )
+
+    def _get_row(self, id: str, values: Dict[str, Any]) -> Tuple:
+        return (str(id), *(values.get(column) for column in self.columns))
+
+    def update_many(self, id_to_values: Dict[str, Dict[str, Any]]):
+        columns = ["id", *self.columns]
+        query = (
+            f"INSERT OR REPLACE INTO {_quote(self.name)} "
+            f"({', '.join(_quote(column) for column in columns)}) "
+            f"VALUES ({', '.join('?' for column in columns)})"
+        )
+        rows = [self._get_row(id, values) for (id, values) in id_to_values.items()]
+        with self.lock, self.db:
+            self.db.executemany(query, rows)
+
+    def update(self, id: str, values: Dict[str, Any]):
+        return self.update_many({id: values})
+
+    def delete_many(self, ids: Iterable[str]):
+        with self.lock, self.db:
+            self.db.executemany(
+                f"DELETE FROM {_quote(self.name)} WHERE id = ?",
+                [(str(id),) for id in ids],
+            )
+
+    def delete(self, id: str):
+        return self.delete_many([id])
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute(f"DELETE FROM {_quote(self.name)}")
+
+    def _build_where(self, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        clauses = []
+        params = []
+        for column, value in filters.items():
+            if value is None:
+                continue
+            if column not in self.columns:
+                raise InvalidQuery(f"Can not filter by {column!r}")
+            if isinstance(value, (list, tuple, set)):
+                clauses.append(f"{_quote(column)} IN ({', '.join('?' for v in value)})")
+                params.extend(value)
+            else:
+                clauses.append(f"{_quote(column)} = ?")
+                params.append(value)
+        if not clauses:
+            return ("", params)
+        return (" WHERE " + " AND ".join(clauses), params)
+
+    def _build_order_by(self, ordering: Optional[Sequence[str]]) -> str:
+        terms = []
+        for term in ordering or ():
+            column = term.lstrip("-")
+            if column != "id" and column not in self.columns:
+                raise InvalidQuery(f"Can not order by {column!r}")
+            direction = "DESC" if term.startswith("-") else "ASC"
+            terms.append(f"{_quote(column)} {direction}")
+        if not terms:
+            return ""
+        return " ORDER BY " + ", ".join(terms)
+
+    def count(self, **filters) -> int:
+        where, params = self._build_where(filters)
+        with self.lock:
+            res = self.db.execute(
+                f"SELECT COUNT(*) FROM {_quote(self.name)}{where}", params
+            )
+            return res.fetchone()[0]
+
+    def _select(
+        self,
+        fields: str,
+        *,
+        ordering: Optional[Sequence[str]],
+        limit: Optional[int],
+        offset: int,
+        filters: Dict[str, Any],
+    ) -> List[Tuple]:
+        where, params = self._build_where(filters)
+        query = f"SELECT {fields} FROM {_quote(self.name)}{where}"
+        query += self._build_order_by(ordering)
+        if limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
+        with self.lock:
+            res = self.db.execute(query, params)
+            return res.fetchall()
+
+    def query(
+        self,
+        *,
+        ordering: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        **filters,
+    ) -> List[str]:
+        rows = self._select(
+            "id", ordering=ordering, limit=limit, offset=offset, filters=filters
+        )
+        return [row[0] for row in rows]
+
+    def query_values(
+        self,
+        *,
+        ordering: Optional[Sequence[str]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        **filters,
+    ) -> List[Dict[str, Any]]:
+        """
+        Like `query`, but return the IDs and all indexed values.
+        """
+        columns = ["id", *self.columns]
+        rows = self._select(
+            ", ".join(_quote(column) for column in columns),
+            ordering=ordering,
+            limit=limit,
+            offset=offset,
+            filters=filters,
+        )
+        return [dict(zip(columns, row)) for row in rows]
+
+    def distinct(self, column: str, **filters) -> List[Any]:
+        if column not in self.columns:
+            raise InvalidQuery(f"Can not select {column!r}")
+        where, params = self._build_where(filters)
+        with self.lock:
+            res = self.db.execute(
+                f"SELECT DISTINCT {_quote(column)} FROM {_quote(self.name)}{where}",
+                params,
+            )
+            return [row[0] for row in res.fetchall()]
@@ -0,0 +1,72 @@
+import contextlib
+import os
+import pathlib
+from typing import Iterator, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: Union[str, pathlib.Path]) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on the given file or directory for the block.
+
+    A file is created if it doesn't exist.  The lock excludes other processes
+    as well as other threads in this one, since each holder opens the path separately.
+    Where `fcntl` isn't available, this does nothing.
+    """
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+    if os.path.isdir(path):
+        fd = os.open(str(path), os.O_RDONLY)
+    else:
+        fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # also releases the lock
+
+
+class ProcessLock:
+    """
+    A lock file held for as long as the process (or until released), without blocking.
+
+    The operating system releases the lock when the process dies,
+    so a lock held by a crashed process can always be acquired again.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        self.path = pathlib.Path(path)
+        self._fd: Optional[int] = None
+
+    @property
+    def is_held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        if fcntl is None:  # pragma: no cover
+            self._fd = -1
+            return True
+        fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:  # BlockingIOError, usually
+            os.close(fd)
+            return False
+        # Record who the holder is, purely for the benefit of curious humans.
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        fd, self._fd = self._fd, None
+        if fd is not None and fd >= 0:
+            os.close(fd)
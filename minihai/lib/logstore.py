@@ -0,0 +1,166 @@
+import bisect
+import json
+import pathlib
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+from minihai.lib.compression import CODECS, Codec
+from minihai.lib.events import EventPage, get_page_bounds
+from minihai.lib.files import atomic_write, atomic_writer
+
+DEFAULT_INDEX_INTERVAL = 1000
+
+
+class LogArchive:
+    """
+    An archive of log events, stored as JSON lines with a sparse offset index.
+
+    The index records the byte offset and timestamp of every `interval`th event,
+    so readers can seek straight to a line range or time window.
+    The index is written last, so its existence means the archive is complete.
+
+    If a `codec` is given, new archives are written compressed, one block
+    (of `interval` events) at a time, so the indexed offsets point at block boundaries
+    and readers only decompress from the block they need onward.
+    """
+
+    def __init__(self, base_path: pathlib.Path, codec: Optional[Codec] = None):
+        self.base_path = base_path
+        self.index_path = base_path.with_name(base_path.name + ".idx")
+        self.codec = codec
+        self._index = None
+
+    @property
+    def exists(self) -> bool:
+        return self.index_path.exists()
+
+    def get_data_path(self, codec: Optional[Codec]) -> pathlib.Path:
+        suffix = ".jsonl" + (codec.suffix if codec else "")
+        return self.base_path.with_name(self.base_path.name + suffix)
+
+    @property
+    def stored_codec(self) -> Optional[Codec]:
+        """
+        The codec the existing archive was written with.
+        """
+        name = self.index.get("compression")
+        return CODECS[name] if name else None
+
+    @property
+    def data_path(self) -> pathlib.Path:
+        return self.get_data_path(self.stored_codec if self.exists else self.codec)
+
+    @property
+    def index(self) -> dict:
+        if self._index is None:
+            with self.index_path.open("r") as fp:
+                self._index = json.load(fp)
+        return self._index
+
+    @property
+    def count(self) -> int:
+        return self.index["count"]
+
+    def write(self, events: Iterable[dict], interval: int = DEFAULT_INDEX_INTERVAL):
+        entries = []
+        count = 0
+        offset = 0
+        block: List[bytes] = []
+        with atomic_writer(self.get_data_path(self.codec)) as outf:
+            for event in events:
+                if count % interval == 0:
+                    offset += self._write_block(outf, block)
+                    block = []
+                    entries.append([count, offset, event["time"]])
+                block.append(json.dumps(event, separators=(",", ":")).encode() + b"\n")
+                count += 1
+            offset += self._write_block(outf, block)
+        index = {
+            "interval": interval,
+            "count": count,
+            "entries": entries,
+            "compression": (self.codec.name if self.codec else None),
+        }
+        atomic_write(self.index_path, json.dumps(index).encode())
+        self._index = None
+
+    def _write_block(self, outf: BinaryIO, lines: List[bytes]) -> int:
+        if not lines:
+            return 0
+        data = b"".join(lines)
+        if self.codec:
+            data = self.codec.compress(data)
+        outf.write(data)
+        return len(data)
+
+    def iterate(self, start: int = 0, stop: Optional[int] = None) -> Iterator[dict]:
+        """
+        Iterate over the events with indices in [start, stop).
+        """
+        entries = self.index["entries"]
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return
+        # Entries are recorded for every `interval`th event.
+        line_number, offset = entries[start // self.index["interval"]][:2]
+        codec = self.stored_codec
+        with self.data_path.open("rb") as fp:
+            fp.seek(offset)
+            reader = codec.open_reader(fp) if codec else fp
+            for line in reader:
+                if line_number >= stop:
+                    break
+                if line_number >= start:
+                    yield json.loads(line)
+                line_number += 1
+
+    def find_since(self, since: str) -> int:
+        """
+        Find the index of the first event whose timestamp is after `since`.
+        """
+        entries = self.index["entries"]
+        times = [e[2] for e in entries]
+        block = max(0, bisect.bisect_right(times, since) - 1)
+        line_number = entries[block][0] if entries else 0
+        for event in self.iterate(line_number):
+            if event["time"] > since:
+                return line_number
+            line_number += 1
+        return line_number
+
+    def get_page(
+        self,
+        *,
+        since: Optional[str] = None,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> EventPage:
+        base = self.find_since(since) if since else 0
+        if since and offset is None:
+            offset = 0  # Page forward from the cursor, so no events are skipped.
+        total = self.count - base
+        start, end = get_page_bounds(total, offset=offset, limit=limit)
+        events: List[dict] = list(self.iterate(base + start, base + end))
+        return EventPage(events=events, total=total, start=start)
+
+    def import_json(self, json_path: pathlib.Path) -> None:
+        """
+        Convert a legacy JSON array log into this archive, removing the original.
+        """
+        with json_path.open("r") as fp:
+            events = json.load(fp)
+        self.write(events)
+        json_path.unlink()
+
+    def compact(self) -> bool:
+        """
+        Rewrite an existing archive with this archive's codec, if it isn't already.
+        """
+        if not self.exists:
+            return False
+        stored_codec = self.stored_codec
+        if stored_codec is self.codec:
+            return False
+        old_data_path = self.data_path
+        self.write(self.iterate(), interval=self.index["interval"])
+        old_data_path.unlink()
+        return True
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_missing = object()
+
+
+class LRUCache:
+    """
+    A thread-safe, bounded, least-recently-used in-memory cache with hit/miss statistics.
+
+    Entries may also be given an expiry time, after which they're treated as missing.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._expiry: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._data.get(key, _missing)
+            expires = self._expiry.get(key)
+            if expires is not None and expires <= time.time():
+                self._pop(key)
+                value = _missing
+            if value is _missing:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(
+        self, key: Hashable, value: Any, *, expires: Optional[float] = None
+    ) -> None:
+        """
+        Set the value for `key`, optionally expiring at the `time.time()` timestamp `expires`.
+        """
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if expires is None:
+                self._expiry.pop(key, None)
+            else:
+                self._expiry[key] = expires
+            while len(self._data) > self.maxsize:
+                evicted_key, _ = self._data.popitem(last=False)
+                self._expiry.pop(evicted_key, None)
+                self.evictions += 1
+
+    def get_or_set(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        """
+        Get the value for `key`, calling `func` to compute (and cache) it if it's missing.
+        """
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = func()
+            self.set(key, value)
+        return value
+
+    def _pop(self, key: Hashable, default: Any = None) -> Any:
+        self._expiry.pop(key, None)
+        return self._data.pop(key, default)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._pop(key, default)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._expiry.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,62 @@
+import base64
+import hashlib
+import secrets
+
+try:
+    import argon2
+except ImportError:  # pragma: no cover
+    argon2 = None
+
+try:
+    import bcrypt
+except ImportError:  # pragma: no cover
+    bcrypt = None
+
+PBKDF2_ALGORITHM = "pbkdf2_sha256"
+PBKDF2_ITERATIONS = 600_000
+
+
+def hash_password(password: str) -> str:
+    """
+    Hash a password for storing in the configuration.
+
+    Argon2 is used if `argon2-cffi` is installed; otherwise PBKDF2-SHA256.
+    """
+    if argon2:
+        return argon2.PasswordHasher().hash(password)
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac(
+        "sha256", password.encode(), salt.encode(), PBKDF2_ITERATIONS
+    )
+    encoded_digest = base64.b64encode(digest).decode()
+    return f"{PBKDF2_ALGORITHM}${PBKDF2_ITERATIONS}${salt}${encoded_digest}"
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """
+    Check `password` against a stored password, which may be hashed or plain text.
+
+    Supported hash formats are PBKDF2-SHA256 (as generated by `hash_password`),
+    and Argon2 and bcrypt (if the respective libraries are installed).
+    """
+    if stored.startswith(f"{PBKDF2_ALGORITHM}$"):
+        try:
+            _, iterations, salt, encoded_digest = stored.split("$", 3)
+            digest = hashlib.pbkdf2_hmac(
+                "sha256", password.encode(), salt.encode(), int(iterations)
+            )
+        except ValueError:
+            return False
+        return secrets.compare_digest(base64.b64encode(digest).decode(), encoded_digest)
+    if stored.startswith("$argon2"):
+        if not argon2:
+            raise RuntimeError("argon2-cffi is required for Argon2 password hashes")
+        try:
+            return argon2.PasswordHasher().verify(stored, password)
+        except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHash):
+            return False
+    if stored.startswith(("$2a$", "$2b$", "$2y$")):
+        if not bcrypt:
+            raise RuntimeError("bcrypt is required for bcrypt password hashes")
+        return bcrypt.checkpw(password.encode(), stored.encode())
+    return secrets.compare_digest(password.encode(), stored.encode())
@@ -0,0 +1,74 @@
+import sqlite3
+import threading
+from typing import Callable, Optional
+
+
+class Sequence:
+    """
+    A monotonically increasing counter stored in SQLite.
+
+    Allocation happens in an immediate (write-locked) transaction,
+    so numbers are never handed out twice, even across processes sharing the database.
+    """
+
+    table_name = "sequences"
+
+    def __init__(
+        self,
+        db: sqlite3.Connection,
+        name: str,
+        lock: Optional[threading.Lock] = None,
+    ):
+        self.db = db
+        self.name = name
+        self.lock = lock or threading.Lock()
+        with self.lock, self.db:
+            self.db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table_name} "
+                f"(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+
+    def _get_value(self) -> Optional[int]:
+        res = self.db.execute(
+            f"SELECT value FROM {self.table_name} WHERE name = ? LIMIT 1",
+            (self.name,),
+        )
+        row = res.fetchone()
+        return row[0] if row else None
+
+    def _set_value(self, value: int):
+        self.db.execute(
+            f"INSERT OR REPLACE INTO {self.table_name} (name, value) VALUES (?, ?)",
+            (self.name, value),
+        )
+
+    def next(self, seed: Optional[Callable[[], int]] = None) -> int:
+        """
+        Allocate the next value.
+
+        If the sequence has never been used, `seed` (if given) is called
+        to figure out the last value already in use.
+        """
+        with self.lock, self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            value = self._get_value()
+            if value is None:
+                value = seed() if seed else 0
+            value += 1
+            self._set_value(value)
+            return value
+
+    def seed(self, value: int) -> int:
+        """
+        Ensure the next allocated value will be greater than `value`.
+        """
+        with self.lock, self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            value = max(value, self._get_value() or 0)
+            self._set_value(value)
+            return value
+
+    @property
+    def current(self) -> Optional[int]:
+        with self.lock:
+            return self._get_value()
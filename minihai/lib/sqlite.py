@@ -0,0 +1,34 @@
+import pathlib
+import sqlite3
+import threading
+from typing import Union
+
+BUSY_TIMEOUT = 30
+
+
+def connect(path: Union[str, pathlib.Path], **kwargs) -> sqlite3.Connection:
+    """
+    Open an SQLite database in WAL mode, so readers don't block the writer (or vice versa).
+    """
+    db = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT, **kwargs)
+    db.execute("PRAGMA journal_mode=WAL")
+    # With WAL, this is still safe against corruption; only durability on power loss suffers.
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class ConnectionPerThread:
+    """
+    Lazily opens a separate connection to the database for each thread using it.
+    """
+
+    def __init__(self, path: Union[str, pathlib.Path]):
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = connect(self.path)
+        return db
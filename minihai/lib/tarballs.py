@@ -0,0 +1,137 @@
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import os
+import tarfile
+import zlib
+from typing import BinaryIO, Dict, Iterable, List, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class InvalidTarball(ValueError):
+    pass
+
+
+class HashingReader(io.RawIOBase):
+    """
+    Wraps a file object, hashing everything read through it.
+    """
+
+    def __init__(self, fp: BinaryIO):
+        self.fp = fp
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.fp.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        self.hasher.update(data)
+        self.size += n
+        return n
+
+    def hexdigest(self) -> str:
+        return self.hasher.hexdigest()
+
+
+class TeeReader:
+    """
+    Wraps a file object, copying everything read through it into `outf`.
+    """
+
+    def __init__(self, fp: BinaryIO, outf: BinaryIO):
+        self.fp = fp
+        self.outf = outf
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fp.read(size)
+        self.outf.write(data)
+        return data
+
+
+def drain(fp: BinaryIO) -> None:
+    while fp.read(CHUNK_SIZE):
+        pass
+
+
+def open_decompressed(fp: io.BufferedReader) -> BinaryIO:
+    """
+    Wrap `fp` in a decompressor, if its content looks compressed.
+    """
+    magic = fp.peek(6)[:6]
+    if magic.startswith(b"\x1f\x8b"):
+        return gzip.GzipFile(fileobj=fp, mode="rb")
+    if magic.startswith(b"BZh"):
+        return bz2.BZ2File(fp)
+    if magic.startswith(b"\xfd7zXZ\x00"):
+        return lzma.LZMAFile(fp)
+    return fp
+
+
+def import_tarball(
+    fp: io.BufferedReader, outf: BinaryIO, capture: Iterable[str] = ()
+) -> Tuple[List[dict], Dict[str, bytes]]:
+    """
+    Read a (possibly compressed) tarball from `fp`, writing it uncompressed into `outf`.
+
+    Returns a manifest of the regular files in the tarball (names, sizes,
+    offsets of their data in the uncompressed tarball, SHA-256 hashes),
+    and the contents of the files named in `capture`.
+    """
+    capture = set(capture)
+    manifest = []
+    captured = {}
+    reader = TeeReader(open_decompressed(fp), outf)
+    try:
+        with tarfile.open(fileobj=reader, mode="r|", bufsize=CHUNK_SIZE) as tf:
+            for member in tf:
+                if not member.isfile() or member.issparse():
+                    continue
+                name = os.path.normpath(member.name)
+                hasher = hashlib.sha256()
+                chunks = []
+                member_fp = tf.extractfile(member)
+                while True:
+                    chunk = member_fp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    if name in capture:
+                        chunks.append(chunk)
+                if name in capture:
+                    captured[name] = b"".join(chunks)
+                manifest.append(
+                    {
+                        "name": name,
+                        "size": member.size,
+                        "offset": member.offset_data,
+                        "sha256": hasher.hexdigest(),
+                    }
+                )
+        drain(reader)  # Copy any end-of-archive padding too.
+    except (tarfile.TarError, EOFError, OSError, zlib.error, lzma.LZMAError) as exc:
+        raise InvalidTarball(f"Invalid tarball: {exc}") from exc
+    return (manifest, captured)
+
+
+def iterate_member_data(
+    path: str, offset: int, size: int, chunk_size: int = CHUNK_SIZE
+) -> Iterable[bytes]:
+    """
+    Read `size` bytes at `offset` from the (uncompressed) tarball at `path`.
+    """
+    with open(path, "rb") as fp:
+        fp.seek(offset)
+        remaining = size
+        while remaining > 0:
+            chunk = fp.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
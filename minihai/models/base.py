@@ -1,12 +1,68 @@
+import contextlib
 import datetime
 import json
+import logging
 import os
 import pathlib
-from typing import Iterable, Any
+import threading
+from typing import Iterable, Any, Dict, Optional, Tuple, Union
 
 from fastapi.encoders import jsonable_encoder
 
-from minihai.conf import settings
+from minihai import conf
+from minihai.lib.cache import Cache
+from minihai.lib.files import atomic_write
+from minihai.lib.index import Index
+from minihai.lib.locks import file_lock
+from minihai.lib.sequence import Sequence
+
+log = logging.getLogger(__name__)
+
+_index_lock = threading.Lock()
+_indexes: Dict[Tuple[int, str], Index] = {}
+_sequences: Dict[Tuple[int, str], Sequence] = {}
+_caches: Dict[Tuple[int, str], Cache] = {}
+
+
+def get_shared_index(
+    name: str,
+    columns: Dict[str, str],
+    indexed_columns: Optional[Iterable[Union[str, Tuple[str, ...]]]] = None,
+) -> Index:
+    """
+    Get the index table `name` in the index database, creating it if needed.
+    """
+    key = (id(conf.index_db), name)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = Index(
+            db=conf.index_db,
+            name=name,
+            columns=columns,
+            lock=_index_lock,
+            indexed_columns=indexed_columns,
+        )
+    return index
+
+
+def get_shared_cache(name: str, **kwargs) -> Cache:
+    """
+    Get the cache `name` in the cache database, creating it if needed.
+
+    Keyword arguments override the configured cache settings.
+    """
+    key = (id(conf.cache_db), name)
+    with _index_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            kwargs = {
+                "ttl": conf.settings.cache_ttl,
+                "max_entries": conf.settings.cache_max_entries,
+                "memory_size": conf.settings.cache_memory_size,
+                **kwargs,
+            }
+            cache = _caches[key] = Cache(db=conf.cache_db, name=name, **kwargs)
+    return cache
 
 
 class DoesNotExist(Exception):
@@ -20,18 +76,51 @@ def sanitize_id(id: Any) -> str:
 class BaseModel:
     kind = None
     path_group_len = 4
+    index_columns = {"ctime": "TEXT"}
+
+    @classmethod
+    def get_index(cls) -> Index:
+        assert cls.kind
+        index = get_shared_index(cls.kind, cls.index_columns)
+        if index.created:
+            # Much like sequences seed themselves, a new index (e.g. for a data directory
+            # from before the index existed) is filled in from the metadata files.
+            n = cls.rebuild_index()
+            log.info(f"Indexed {n} existing {cls.kind} objects")
+        return index
+
+    @classmethod
+    def get_sequence(cls, name: str) -> Sequence:
+        assert cls.kind
+        key = (id(conf.index_db), f"{cls.kind}_{name}")
+        sequence = _sequences.get(key)
+        if sequence is None:
+            sequence = _sequences[key] = Sequence(
+                db=conf.index_db,
+                name=key[1],
+                lock=_index_lock,
+            )
+        return sequence
+
+    def get_index_values(self) -> dict:
+        metadata = self.metadata
+        return {column: metadata.get(column) for column in self.index_columns}
 
     @classmethod
     def get_base_path(cls, id: str) -> pathlib.Path:
         assert cls.kind
         id = sanitize_id(id)
-        return settings.data_path / cls.kind / id.strip("~")[: cls.path_group_len] / id
+        group = id.strip("~")[: cls.path_group_len]
+        return conf.settings.data_path / cls.kind / group / id
 
     def __init__(self, *, id: str):
         self.id = sanitize_id(id)
         self.path = self.get_base_path(id)
         self.metadata_path = self.path / "metadata.json"
         self._cached_metadata = None
+        self._batch_depth = 0
+        self._batch_dirty = False
+        self._batch_updates: Optional[dict] = {}
 
     @property
     def exists(self) -> bool:
@@ -44,21 +133,65 @@ class BaseModel:
                 self._cached_metadata = json.load(fp)
         return self._cached_metadata.copy()
 
+    def encode_metadata(self, metadata: dict) -> bytes:
+        if conf.settings.metadata_compact:
+            return json.dumps(
+                metadata, default=jsonable_encoder, separators=(",", ":")
+            ).encode()
+        return json.dumps(
+            metadata, default=jsonable_encoder, indent=2, sort_keys=True
+        ).encode()
+
     def write_metadata(self, new_metadata: dict):
-        # TODO: This isn't atomic, it should maybe be
-        with open(self.metadata_path, "w") as outf:
-            json.dump(
-                {"id": self.id, **new_metadata},
-                outf,
-                default=jsonable_encoder,
-                indent=2,
-                sort_keys=True,
-            )
-            self._cached_metadata = None
+        new_metadata = {"id": self.id, **new_metadata}
+        if self._batch_depth:
+            # Defer the write until the outermost batch is done.
+            self._cached_metadata = new_metadata
+            self._batch_dirty = True
+            self._batch_updates = None  # A full rewrite; there's nothing to merge.
+            return
+        atomic_write(
+            self.metadata_path,
+            self.encode_metadata(new_metadata),
+            fsync=conf.settings.metadata_fsync,
+        )
+        self._cached_metadata = None
+        self.get_index().update(self.id, self.get_index_values())
+
+    @contextlib.contextmanager
+    def batch_metadata(self):
+        """
+        Coalesce all metadata writes within the block into a single write at the end.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._batch_dirty:
+                self._batch_dirty = False
+                updates, self._batch_updates = self._batch_updates, {}
+                if updates is None:
+                    self.write_metadata(self.metadata)
+                else:
+                    self.update_metadata(updates)
 
     def update_metadata(self, updates: dict):
-        new_metadata = {**self.metadata, **updates}
-        return self.write_metadata(new_metadata)
+        """
+        Merge `updates` into the metadata.
+
+        The read-modify-write happens under a lock on the object's directory,
+        so concurrent updates from other processes (or threads) aren't lost.
+        """
+        if self._batch_depth:
+            self._cached_metadata = {**self.metadata, **updates}
+            self._batch_dirty = True
+            if self._batch_updates is not None:
+                self._batch_updates.update(updates)
+            return
+        with file_lock(self.path):
+            self._cached_metadata = None  # Someone else may have written since.
+            return self.write_metadata({**self.metadata, **updates})
 
     @classmethod
     def load(cls, id):
@@ -69,7 +202,8 @@ class BaseModel:
 
     @classmethod
     def iterate_ids(cls) -> Iterable[str]:
-        for dirpath, dirnames, filenames in os.walk(settings.data_path / cls.kind):
+        root = conf.settings.data_path / cls.kind
+        for dirpath, dirnames, filenames in os.walk(root):
             for filename in filenames:
                 if filename == "metadata.json":
                     yield os.path.basename(dirpath)
@@ -86,11 +220,30 @@ class BaseModel:
         for id in cls.iterate_ids():
             yield cls(id=id)
 
+    @classmethod
+    def rebuild_index(cls, batch_size: int = 500) -> int:
+        """
+        Rebuild the metadata index for this kind of object from the data directory.
+        """
+        index = get_shared_index(cls.kind, cls.index_columns)
+        index.created = False  # It's being filled in right here.
+        index.clear()
+        n = 0
+        batch = {}
+        for obj in cls.iterate_instances():
+            batch[obj.id] = obj.get_index_values()
+            if len(batch) >= batch_size:
+                index.update_many(batch)
+                n += len(batch)
+                batch.clear()
+        index.update_many(batch)
+        return n + len(batch)
+
     @classmethod
     def create_with_metadata(cls, id: str, data: dict):
         obj = cls(id=id)
         assert not obj.exists
-        obj.path.mkdir(parents=True)
+        obj.path.mkdir(parents=True, exist_ok=True)
         obj.write_metadata(
             {"id": id, "ctime": datetime.datetime.now().isoformat(), **data}
         )
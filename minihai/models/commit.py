@@ -1,16 +1,43 @@
+import io
+import json
+import logging
 import os
-import shutil
-import tarfile
 import tempfile
+from typing import Dict, Iterable, Optional
 
 import valohai_yaml
 from fastapi import UploadFile
-from valohai_cli.utils.hashing import get_fp_sha256
 from valohai_yaml.objs import Config
 
-from minihai.conf import settings
+from minihai import conf
+from minihai.lib.files import atomic_write
+from minihai.lib.locks import file_lock
+from minihai.lib.lru import LRUCache
+from minihai.lib.singleflight import SingleFlight
+from minihai.lib.tarballs import (
+    CHUNK_SIZE,
+    HashingReader,
+    InvalidTarball,
+    drain,
+    import_tarball,
+    iterate_member_data,
+)
 from minihai.models.base import BaseModel
 
+log = logging.getLogger(__name__)
+
+_commit_creations = SingleFlight()
+_manifest_builds = SingleFlight()
+_config_cache: Optional[LRUCache] = None
+_manifest_cache = LRUCache(maxsize=32)
+
+
+def get_config_cache() -> LRUCache:
+    global _config_cache
+    if _config_cache is None:
+        _config_cache = LRUCache(maxsize=conf.settings.config_cache_size)
+    return _config_cache
+
 
 class Commit(BaseModel):
     kind = "commit"
@@ -23,7 +50,58 @@ class Commit(BaseModel):
     def valohai_yaml_path(self):
         return self.path / "valohai.yaml"
 
+    @property
+    def manifest_path(self):
+        return self.path / "manifest.json"
+
+    def get_manifest(self) -> Dict[str, dict]:
+        """
+        Get the manifest of regular files in the commit tarball, keyed by name.
+        """
+        return _manifest_cache.get_or_set(self.id, self._load_manifest)
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        if not self.manifest_path.exists():
+            _manifest_builds.do(self.id, self._build_manifest)
+        with open(self.manifest_path) as fp:
+            return {entry["name"]: entry for entry in json.load(fp)}
+
+    def _build_manifest(self) -> None:
+        # Commits imported before manifests existed may have compressed tarballs,
+        # so this also converts the tarball into the (seekable) uncompressed form.
+        if self.manifest_path.exists():
+            return
+        fd, tarball_temp_path = tempfile.mkstemp(dir=self.path, prefix=".tarball-")
+        try:
+            with open(fd, "wb") as outf, open(
+                self.tarball_path, "rb", buffering=CHUNK_SIZE
+            ) as infp:
+                manifest, captured = import_tarball(infp, outf)
+            os.replace(tarball_temp_path, self.tarball_path)
+        finally:
+            if os.path.exists(tarball_temp_path):
+                os.unlink(tarball_temp_path)
+        atomic_write(self.manifest_path, json.dumps(manifest).encode())
+        log.info(f"Built manifest for commit {self.id} ({len(manifest)} files)")
+
+    def iterate_file(self, entry: dict) -> Iterable[bytes]:
+        """
+        Read the content of a file (as described by a manifest entry) from the tarball.
+        """
+        return iterate_member_data(
+            str(self.tarball_path), offset=entry["offset"], size=entry["size"]
+        )
+
     def load_config(self) -> Config:
+        """
+        Get the parsed `valohai.yaml` of this commit.
+
+        Commits are immutable, so the parsed configuration is cached;
+        the returned object is shared and must not be modified.
+        """
+        return get_config_cache().get_or_set(self.id, self._parse_config)
+
+    def _parse_config(self) -> Config:
         with open(self.valohai_yaml_path, "r") as fp:
             return valohai_yaml.parse(fp)
 
@@ -33,28 +111,72 @@ class Commit(BaseModel):
 
     @classmethod
     def create_from_data(cls, data: UploadFile, description: str = "") -> "Commit":
-        file = data.file
-        commit_identifier = "~{hash}".format(hash=get_fp_sha256(file))
+        """
+        Create a commit from an uploaded tarball, or return the existing identical commit.
+
+        The upload is read exactly once: it's hashed, decompressed and written to disk
+        as it's being read, and the manifest and `valohai.yaml` are picked out along the way.
+        The commit is identified by the hash of the upload as-is.
+        """
         fd, tarball_temp_path = tempfile.mkstemp(
-            dir=settings.data_path, prefix="upload-"
-        )
-        # TODO: validate tarball?
-        with open(fd, "wb") as outf:
-            data.file.seek(0)
-            shutil.copyfileobj(data.file, outf)
-            size = outf.tell()
-
-        commit = cls.create_with_metadata(
-            id=commit_identifier,
-            data={
-                "size": size,
-                "identifier": commit_identifier,
-                "description": description,
-            },
+            dir=conf.settings.data_path, prefix="upload-"
         )
-        os.rename(tarball_temp_path, commit.tarball_path)
-        with tarfile.open(commit.tarball_path) as tf:
-            vio = tf.extractfile("valohai.yaml")
-            with open(commit.valohai_yaml_path, "wb") as outf:
-                shutil.copyfileobj(vio, outf)
-        return commit
+        try:
+            with open(fd, "wb") as outf:
+                reader = HashingReader(data.file)
+                buffered_reader = io.BufferedReader(reader, CHUNK_SIZE)
+                manifest, captured = import_tarball(
+                    buffered_reader, outf, capture=["valohai.yaml"]
+                )
+                drain(buffered_reader)  # Make sure we've hashed everything.
+            if "valohai.yaml" not in captured:
+                raise InvalidTarball("The tarball does not contain a valohai.yaml")
+            commit_identifier = "~{hash}".format(hash=reader.hexdigest())
+            return _commit_creations.do(
+                commit_identifier,
+                cls._create_from_upload,
+                commit_identifier=commit_identifier,
+                tarball_temp_path=tarball_temp_path,
+                manifest=manifest,
+                valohai_yaml=captured["valohai.yaml"],
+                size=reader.size,
+                description=description,
+            )
+        finally:
+            if os.path.exists(tarball_temp_path):
+                os.unlink(tarball_temp_path)
+
+    @classmethod
+    def _create_from_upload(
+        cls,
+        *,
+        commit_identifier: str,
+        tarball_temp_path: str,
+        manifest: list,
+        valohai_yaml: bytes,
+        size: int,
+        description: str,
+    ) -> "Commit":
+        commit = cls(id=commit_identifier)
+        if commit.exists:
+            log.info(f"Commit {commit_identifier} already exists")
+            return commit
+        commit.path.mkdir(parents=True, exist_ok=True)
+        # `_commit_creations` only deduplicates within this process;
+        # the lock keeps other worker processes from creating the same commit at once.
+        with file_lock(commit.path):
+            if commit.exists:
+                log.info(f"Commit {commit_identifier} was created concurrently")
+                return commit
+            os.replace(tarball_temp_path, commit.tarball_path)
+            atomic_write(commit.valohai_yaml_path, valohai_yaml)
+            atomic_write(commit.manifest_path, json.dumps(manifest).encode())
+            # The metadata file is written last, as its existence means the commit exists.
+            return cls.create_with_metadata(
+                id=commit_identifier,
+                data={
+                    "size": size,
+                    "identifier": commit_identifier,
+                    "description": description,
+                },
+            )
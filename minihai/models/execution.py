@@ -1,25 +1,36 @@
-import json
+import contextlib
 import logging
 import pathlib
-from typing import Optional, Iterable
+import shutil
+from typing import TYPE_CHECKING, Optional, Iterable
 from uuid import UUID
 
 import pydantic
 import ulid2
-from docker.models.containers import Container
 
 import minihai.conf as conf
-from minihai.lib.events import format_log_event
+from minihai.lib.compression import Codec, get_codec
+from minihai.lib.events import EventPage, format_log_event, paginate_events
+from minihai.lib.files import atomic_writer
+from minihai.lib.logstore import LogArchive
+from minihai.lib.singleflight import SingleFlight
+from minihai.lib.tarballs import CHUNK_SIZE
 from minihai.models.base import BaseModel
-from minihai.models.output import Output
-from minihai.services.docker import get_container_logs
+from minihai.models.output import Output, iterate_output_files
+from minihai.services.docker import iterate_container_events
+
+if TYPE_CHECKING:  # pragma: no cover
+    from docker.models.containers import Container
 
 CONTAINER_EXIT_CODE_METADATA_KEY = "container_exit_code"
 CONTAINER_FINAL_STATE_METADATA_KEY = "container_final_state"
 ERROR_MESSAGE_METADATA_KEY = "error_message"
+OUTPUTS_INDEXED_METADATA_KEY = "outputs_indexed"
 
 log = logging.getLogger(__name__)
 
+_log_migrations = SingleFlight()
+
 
 def _existing_subpath(root: pathlib.Path, next: str) -> pathlib.Path:
     path = root / next
@@ -42,6 +53,16 @@ class ExecutionCreationData(pydantic.BaseModel):
 class Execution(BaseModel):
     kind = "execution"
     path_group_len = 8
+    index_columns = {
+        "ctime": "TEXT",
+        "counter": "INTEGER",
+        "step": "TEXT",
+        "commit": "TEXT",
+        "status": "TEXT",
+    }
+
+    def get_index_values(self) -> dict:
+        return {**super().get_index_values(), "status": self.status}
 
     @property
     def outputs_path(self) -> pathlib.Path:
@@ -55,13 +76,56 @@ class Execution(BaseModel):
     def inputs_path(self) -> pathlib.Path:
         return _existing_subpath(self.path, "inputs")
 
-    def get_log_path(self, name) -> pathlib.Path:
-        return self.path / f"{name}.log"
+    @property
+    def log_codec(self) -> Optional[Codec]:
+        return get_codec(conf.settings.log_compression)
+
+    def get_log_path(self, name, codec: Optional[Codec] = None) -> pathlib.Path:
+        suffix = codec.suffix if codec else ""
+        return self.path / f"{name}.log{suffix}"
 
     @property
     def all_json_log_path(self):
+        # Legacy; superseded by `log_archive`.
         return self.path / f"log.json"
 
+    @property
+    def log_archive(self) -> LogArchive:
+        return LogArchive(self.path / "log", codec=self.log_codec)
+
+    def migrate_json_log(self) -> bool:
+        """
+        Convert a legacy `log.json` into the log archive format, if needed.
+        """
+        if self.log_archive.exists or not self.all_json_log_path.exists():
+            return False
+        self.log_archive.import_json(self.all_json_log_path)
+        log.info(f"{self.id}: Migrated {self.all_json_log_path} to log archive")
+        return True
+
+    def compact_logs(self) -> bool:
+        """
+        Compress the archived logs with the configured codec, if they aren't already.
+        """
+        changed = self.migrate_json_log()
+        changed |= self.log_archive.compact()
+        codec = self.log_codec
+        if not codec:
+            return changed
+        for stream in ("stdout", "stderr"):
+            log_path = self.get_log_path(stream)
+            if not log_path.exists():
+                continue
+            with log_path.open("rb") as infp, atomic_writer(
+                self.get_log_path(stream, codec)
+            ) as outf, codec.open_writer(outf) as writer:
+                shutil.copyfileobj(infp, writer, CHUNK_SIZE)
+            log_path.unlink()
+            changed = True
+        if changed:
+            log.info(f"{self.id}: Compacted logs")
+        return changed
+
     @property
     def status(self) -> str:
         error_message = self.metadata.get(ERROR_MESSAGE_METADATA_KEY)
@@ -81,31 +145,60 @@ class Execution(BaseModel):
         return "queued"
 
     @property
-    def container(self) -> Optional[Container]:
+    def container(self) -> Optional["Container"]:
         container_id = self.metadata.get("container_id")
         if not container_id:
             return None
         return conf.docker_client.containers.get(container_id=container_id)
 
+    @classmethod
+    def get_max_counter(cls) -> int:
+        """
+        Find the greatest counter in use by walking the data directory.
+
+        This is slow, and only used to seed the counter sequence.
+        """
+        return max(
+            (
+                execution.metadata.get("counter") or 0
+                for execution in cls.iterate_instances()
+            ),
+            default=0,
+        )
+
     @classmethod
     def create(cls, data: ExecutionCreationData):
         id = str(ulid2.generate_ulid_as_uuid())
-        counter = (
-            cls.count() + 1
-        )  # Not necessarily safe in highly concurrent situations.
+        counter = cls.get_sequence("counter").next(seed=cls.get_max_counter)
         execution = cls.create_with_metadata(
             id=id, data={"counter": counter, **data.dict(),}
         )
         return execution
 
     def check_container_status(self: "Execution"):
-        container = self.container
+        from docker.errors import NotFound
+
+        try:
+            container = self.container
+        except NotFound:
+            # e.g. removed by hand, or lost with the Docker daemon's state;
+            # there's nothing left to wait for (or to archive).
+            log.warning(f"{self.id}: container {self.metadata['container_id']} is gone")
+            self.update_metadata(
+                {ERROR_MESSAGE_METADATA_KEY: "The execution's container disappeared."}
+            )
+            return
         if not container:
             return
 
         state = container.attrs["State"]
         status = state.get("Status")
         if status in ("exited", "dead"):
+            self.archive_container(container)
+
+    def archive_container(self, container: "Container"):
+        state = container.attrs["State"]
+        with self.batch_metadata():
             if self.metadata.get("container_final_state") is None:
                 self.update_metadata(
                     {
@@ -113,42 +206,106 @@ class Execution(BaseModel):
                         "container_final_state": state,
                     }
                 )
-            stdout_log_path = self.get_log_path("stdout")
-            if not stdout_log_path.exists():
-                stdout_log_path.write_bytes(
-                    container.logs(stdout=True, stderr=False, timestamps=True)
-                )
-                log.info(f"{self.id}: Wrote stdout to {stdout_log_path}")
-            stderr_log_path = self.get_log_path("stderr")
-            if not stderr_log_path.exists():
-                stderr_log_path.write_bytes(
-                    container.logs(stdout=False, stderr=True, timestamps=True)
-                )
-                log.info(f"{self.id}: Wrote stderr to {stderr_log_path}")
-            all_json_log_path = self.all_json_log_path
-            if not all_json_log_path.exists():
-                with all_json_log_path.open("w") as outf:
-                    json.dump(get_container_logs(container), outf, indent=2)
-                log.info(f"{self.id}: Wrote JSON log to {all_json_log_path}")
-
-    def get_logs(self) -> Optional[list]:
+            log_archive = self.log_archive
+            if not log_archive.exists:
+                # Stream the logs once, writing the raw per-stream logs
+                # and the merged event archive as we go.
+                codec = log_archive.codec
+                with contextlib.ExitStack() as stack:
+                    raw_outputs = {}
+                    for stream in ("stdout", "stderr"):
+                        fp = stack.enter_context(
+                            atomic_writer(self.get_log_path(stream, codec))
+                        )
+                        if codec:
+                            fp = stack.enter_context(codec.open_writer(fp))
+                        raw_outputs[stream] = fp
+                    log_archive.write(
+                        iterate_container_events(container, raw_outputs=raw_outputs)
+                    )
+                log.info(f"{self.id}: Wrote logs to {log_archive.data_path}")
+            if not self.metadata.get(OUTPUTS_INDEXED_METADATA_KEY):
+                n = self.index_outputs()
+                log.info(f"{self.id}: Indexed {n} outputs")
+
+    def get_logs(
+        self,
+        *,
+        since: Optional[str] = None,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[EventPage]:
+        """
+        Get a page of log events, optionally only those after the `since` timestamp.
+
+        If no `offset` is given, the last `limit` events are returned,
+        or with `since`, the first `limit` events after it.
+        """
+        page = self.get_stored_logs(since=since, offset=offset, limit=limit)
+        if page is None:
+            page = self.get_live_logs(since=since, offset=offset, limit=limit)
+        return page
+
+    def get_stored_logs(
+        self,
+        *,
+        since: Optional[str] = None,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[EventPage]:
+        """
+        Like `get_logs`, but only from disk; None if the logs are still in the container.
+        """
         error_message = self.metadata.get(ERROR_MESSAGE_METADATA_KEY)
         if error_message:
-            return [
+            events = [
                 format_log_event(stream="stderr", message=error_message),
             ]
-        if self.all_json_log_path.exists():
-            with self.all_json_log_path.open("r") as fp:
-                return json.load(fp)
+            return paginate_events(events, offset=offset, limit=limit)
+        if self.log_archive.exists or self.all_json_log_path.exists():
+            if not self.log_archive.exists:
+                _log_migrations.do(self.id, self.migrate_json_log)
+            return self.log_archive.get_page(since=since, offset=offset, limit=limit)
+        return None
+
+    def get_live_logs(
+        self,
+        *,
+        since: Optional[str] = None,
+        offset: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> Optional[EventPage]:
+        """
+        Like `get_logs`, but only from the (running) container.
+        """
         container = self.container
         if not container:
             return None
-        return get_container_logs(container)
+        if since and offset is None:
+            offset = 0  # Page forward from the cursor (see `get_logs`).
+        # Streamed, so only the page is held in memory however long the logs are.
+        events = iterate_container_events(container, since=since)
+        return paginate_events(events, offset=offset, limit=limit)
 
     def iterate_outputs(self) -> Iterable[Output]:
-        for disk_path in self.outputs_path.rglob("*"):
-            yield Output(
-                name=disk_path.relative_to(self.outputs_path),
-                path=str(disk_path.relative_to(conf.settings.data_path)),
-                execution_id=self.id,
-            )
+        return iterate_output_files(self.id, self.outputs_path)
+
+    def index_outputs(self) -> int:
+        """
+        Sweep the outputs directory into the output index, dropping vanished outputs.
+
+        Once the execution has finished its outputs won't change any more,
+        so that's recorded in the metadata and the index is used as-is from then on.
+        """
+        outputs = list(self.iterate_outputs())
+        names = {output.name for output in outputs}
+        stale_names = [
+            values["name"]
+            for values in Output.get_index().query_values(execution_id=self.id)
+            if values["name"] not in names
+        ]
+        Output.index_many(outputs)
+        Output.unindex_many(self.id, stale_names)
+        if self.status not in ("queued", "started"):
+            self.update_metadata({OUTPUTS_INDEXED_METADATA_KEY: True})
+        return len(outputs)
@@ -2,17 +2,47 @@ import datetime
 import hashlib
 import os
 import posixpath
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional
 from uuid import UUID
 
 from minihai import conf
 from minihai.lib.cache import Cache
+from minihai.lib.files import hash_file, resolve_within
+from minihai.lib.index import Index
+from minihai.models.base import get_shared_cache, get_shared_index
 
 
-def get_output_cache():
-    return Cache(db=conf.cache_db, name="outputs")
+def get_output_key(execution_id: str, name: str) -> str:
+    return f"{execution_id}/{name}"
+
+
+def get_stat_key(inode: int, size: int, mtime: datetime.datetime) -> str:
+    return f"{inode}:{size}:{mtime.isoformat()}"
+
+
+def get_output_disk_path(path: str) -> Optional[Path]:
+    """
+    Get the real disk path for a (normalized) output path relative to the data directory,
+    or None if the path isn't within an execution's outputs.
+
+    Executions may leave symlinks in their outputs, so they're resolved,
+    and anything leading outside the execution's outputs directory is refused.
+    """
+    parts = path.split("/")
+    # i.e. execution/<id prefix>/<id>/outputs/<name...>
+    if len(parts) < 5 or parts[0] != "execution" or parts[3] != "outputs":
+        return None
+    if any(part in ("", ".", "..") for part in parts):
+        return None
+    data_path = Path(conf.settings.data_path)
+    return resolve_within(data_path.joinpath(*parts[:4]), data_path.joinpath(*parts))
+
+
+def get_checksum_cache() -> Cache:
+    # Checksums stay valid for as long as the file is unchanged, so they never expire.
+    return get_shared_cache("output_checksums", ttl=None)
 
 
 @dataclass
@@ -20,25 +50,68 @@ class Output:
     execution_id: str
     name: str
     path: str  # relative to data_path
-    _stat: Optional[os.stat_result] = None
+    size: int
+    ctime: datetime.datetime
+    mtime: datetime.datetime
+    inode: Optional[int] = None
 
-    @property
-    def disk_path(self):
-        return Path(conf.settings.data_path) / self.path
+    # Outputs are only ever looked up by execution or ID, and listed by name.
+    index_columns = {
+        "output_id": "TEXT",
+        "execution_id": "TEXT",
+        "name": "TEXT",
+        "path": "TEXT",
+        "size": "INTEGER",
+        "ctime": "REAL",
+        "mtime": "REAL",
+        "inode": "INTEGER",
+    }
+    # Listing an execution's outputs by name is served straight from the composite index.
+    indexed_columns = ["output_id", ("execution_id", "name")]
 
-    @property
-    def stat(self) -> os.stat_result:
-        if self._stat is None:
-            self._stat = os.stat(self.disk_path)
-        return self._stat
+    @classmethod
+    def get_index(cls) -> Index:
+        return get_shared_index(
+            "output", cls.index_columns, indexed_columns=cls.indexed_columns
+        )
+
+    @classmethod
+    def from_stat(
+        cls,
+        execution_id: str,
+        outputs_path: Path,
+        disk_path: Path,
+        stat: os.stat_result,
+    ) -> "Output":
+        return cls(
+            execution_id=execution_id,
+            name=disk_path.relative_to(outputs_path).as_posix(),
+            path=str(disk_path.relative_to(conf.settings.data_path)),
+            size=stat.st_size,
+            ctime=datetime.datetime.fromtimestamp(stat.st_ctime),
+            mtime=datetime.datetime.fromtimestamp(stat.st_mtime),
+            inode=stat.st_ino,
+        )
+
+    @classmethod
+    def from_index_values(cls, values: dict) -> "Output":
+        return cls(
+            execution_id=values["execution_id"],
+            name=values["name"],
+            path=values["path"],
+            size=values["size"],
+            ctime=datetime.datetime.fromtimestamp(values["ctime"]),
+            mtime=datetime.datetime.fromtimestamp(values["mtime"]),
+            inode=values["inode"],
+        )
 
     @property
-    def size(self) -> int:
-        return self.stat.st_size
+    def key(self) -> str:
+        return get_output_key(self.execution_id, self.name)
 
     @property
-    def ctime(self) -> datetime.datetime:
-        return datetime.datetime.fromtimestamp(self.stat.st_ctime)
+    def disk_path(self):
+        return Path(conf.settings.data_path) / self.path
 
     @property
     def id(self) -> UUID:
@@ -49,26 +122,120 @@ class Output:
     def download_url(self):
         return posixpath.join("/data/", self.path)
 
-    def as_api_response(self) -> dict:
+    def get_index_values(self) -> dict:
+        return {
+            "output_id": str(self.id),
+            "execution_id": self.execution_id,
+            "name": self.name,
+            "path": self.path,
+            "size": self.size,
+            "ctime": self.ctime.timestamp(),
+            "mtime": self.mtime.timestamp(),
+            "inode": self.inode,
+        }
+
+    @property
+    def stat_key(self) -> str:
+        return get_stat_key(self.inode, self.size, self.mtime)
+
+    @classmethod
+    def get_checksums_many(cls, outputs: Iterable["Output"]) -> Dict[str, dict]:
+        """
+        Get the known checksums of `outputs`, keyed by their stat keys.
+        """
+        return get_checksum_cache().get_many(output.stat_key for output in outputs)
+
+    def compute_checksums(self) -> Optional[dict]:
+        """
+        Hash the output file and memoize the checksums.
+
+        Nothing is stored (and None is returned) if the file has changed since it was indexed.
+        """
+        checksums = hash_file(self.disk_path)
+        stat = self.disk_path.stat()
+        mtime = datetime.datetime.fromtimestamp(stat.st_mtime)
+        if get_stat_key(stat.st_ino, stat.st_size, mtime) != self.stat_key:
+            return None
+        get_checksum_cache().set(self.stat_key, checksums)
+        return checksums
+
+    def as_api_response(self, checksums: Optional[dict] = None) -> dict:
+        """
+        Get the API representation of the output.
+
+        Known checksums may be passed in to avoid looking them up one output at a time.
+        """
+        if checksums is None:
+            checksums = get_checksum_cache().get(self.stat_key)
         return {
             "id": self.id,
             "size": self.size,
             "ctime": self.ctime,
             "file_ctime": self.ctime,
-            "file_mtime": self.ctime,
+            "file_mtime": self.mtime,
             "name": self.name,
             "purged": False,
+            "checksums": checksums or {},
             "output_execution": {"id": self.execution_id,},
         }
 
     @classmethod
-    def from_cache(cls, id: str) -> Optional["Output"]:
-        data = get_output_cache().get(id)
-        if not data:
+    def find(cls, id: str) -> Optional["Output"]:
+        values = cls.get_index().query_values(output_id=str(id), limit=1)
+        if not values:
             return None
-        return cls(**data)
+        return cls.from_index_values(values[0])
+
+    @classmethod
+    def count_for_execution(cls, execution_id: str) -> int:
+        return cls.get_index().count(execution_id=execution_id)
+
+    @classmethod
+    def list_for_execution(
+        cls, execution_id: str, *, limit: Optional[int] = None, offset: int = 0
+    ) -> List["Output"]:
+        values = cls.get_index().query_values(
+            execution_id=execution_id, ordering=["name"], limit=limit, offset=offset
+        )
+        return [cls.from_index_values(v) for v in values]
+
+    @classmethod
+    def index_many(cls, outputs: Iterable["Output"]) -> None:
+        cls.get_index().update_many(
+            {output.key: output.get_index_values() for output in outputs}
+        )
+
+    @classmethod
+    def unindex_many(cls, execution_id: str, names: Iterable[str]) -> None:
+        cls.get_index().delete_many(
+            get_output_key(execution_id, name) for name in names
+        )
+
+
+def iterate_output_files(
+    execution_id: str, outputs_path: Path, directory: Optional[Path] = None
+) -> Iterator[Output]:
+    """
+    Walk (a directory within) an outputs directory, yielding the regular files in it.
+    Symlinks aren't followed (nor indexed), lest they lead outside the directory.
 
-    def cache(self, cache: Cache):
-        data = asdict(self)
-        data.pop("_self", None)
-        cache.set(self.id, data)
+    Directory entries carry their stat results, so this is much cheaper than
+    globbing and stat'ing each file separately.
+    """
+    stack = [directory or outputs_path]
+    while stack:
+        try:
+            scanner = os.scandir(stack.pop())
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with scanner:
+            for entry in scanner:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        yield Output.from_stat(
+                            execution_id, outputs_path, Path(entry.path), entry.stat()
+                        )
+                except FileNotFoundError:  # Removed while we were looking.
+                    continue
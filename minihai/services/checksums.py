@@ -0,0 +1,82 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, Optional
+
+from minihai import conf
+from minihai.models.output import Output
+
+log = logging.getLogger(__name__)
+
+
+class OutputChecksummer:
+    """
+    Computes the checksums of finished executions' outputs in a background thread pool.
+
+    Checksums are memoized by the files' inode, size and modification time,
+    so each file is only hashed once, however many times it's scheduled.
+    (Hashing releases the GIL, so threads suffice.)
+    """
+
+    def __init__(self):
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=conf.settings.checksum_workers,
+                    thread_name_prefix="minihai-checksum",
+                )
+            return self._executor
+
+    def schedule(
+        self, outputs: Iterable[Output], known: Optional[Dict[str, dict]] = None
+    ) -> int:
+        """
+        Schedule checksumming the outputs whose checksums aren't known yet.
+
+        `known` may be passed in if the known checksums have already been looked up.
+        """
+        outputs = list(outputs)
+        if known is None:
+            known = Output.get_checksums_many(outputs)
+        n = 0
+        for output in outputs:
+            key = output.stat_key
+            if key in known:
+                continue
+            with self._lock:
+                if key in self._pending:
+                    continue
+                self._pending[key] = future = Future()
+            self.executor.submit(self._checksum, output, future)
+            n += 1
+        return n
+
+    def _checksum(self, output: Output, future: Future) -> None:
+        try:
+            future.set_result(output.compute_checksums())
+        except Exception as exc:
+            log.warning(f"Could not checksum {output.path}: {exc}")
+            future.set_exception(exc)
+        finally:
+            with self._lock:
+                self._pending.pop(output.stat_key, None)
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            futures = list(self._pending.values())
+        wait(futures, timeout=timeout)
+
+    def stop(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=False)
+
+
+output_checksummer = OutputChecksummer()
@@ -1,14 +1,26 @@
+import heapq
 import logging
 import shlex
+import time
 from operator import itemgetter
-from typing import Dict, List, Optional
-
-from docker.errors import ImageNotFound, APIError
-from docker.models.containers import Container
-from docker.types import Mount
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
 
 import minihai.conf as conf
-from minihai.lib.events import format_log_event
+from minihai.lib.events import format_log_event, parse_event_time
+from minihai.lib.singleflight import SingleFlight
+
+if TYPE_CHECKING:  # pragma: no cover
+    from docker.models.containers import Container
 
 log = logging.getLogger(__name__)
 
@@ -17,6 +29,60 @@ class BootError(RuntimeError):
     pass
 
 
+_image_pulls = SingleFlight()
+_image_ids: Dict[str, Tuple[float, str]] = {}  # image name -> (expiry, image ID)
+
+
+def _get_or_pull_image(image: str) -> str:
+    from docker.errors import ImageNotFound, APIError
+
+    try:
+        docker_image = conf.docker_client.images.get(image)
+    except ImageNotFound:
+        log.info(f"Image {image} not found locally, pulling it.")
+        try:
+            docker_image = conf.docker_client.images.pull(image)
+        except APIError as ae:
+            raise BootError(f"Could not pull image {image}.\n{ae}") from ae
+    return docker_image.id
+
+
+def resolve_image(image: str) -> str:
+    """
+    Ensure the image is available locally, pulling it if necessary, and return its ID.
+
+    Concurrent calls for the same image share a single pull,
+    and the image ID is remembered for `image_id_cache_ttl` seconds.
+    """
+    now = time.monotonic()
+    cached = _image_ids.get(image)
+    if cached and cached[0] > now:
+        return cached[1]
+    image_id = _image_pulls.do(image, _get_or_pull_image, image)
+    _image_ids[image] = (now + conf.settings.image_id_cache_ttl, image_id)
+    return image_id
+
+
+def remove_stale_container(container_name: str) -> None:
+    """
+    Remove a container of the given name left behind by an interrupted boot, if any.
+
+    Only containers that were never started are removed;
+    anything else is not ours to throw away.
+    """
+    from docker.errors import NotFound
+
+    try:
+        container = conf.docker_client.containers.get(container_name)
+    except NotFound:
+        return
+    status = container.attrs["State"].get("Status")
+    if status != "created":
+        raise BootError(f"Container {container_name} already exists ({status})")
+    log.info(f"Removing stale container {container.id} ({container_name})...")
+    container.remove(force=True)
+
+
 # Borrowed from VHNB :)
 def boot_container(
     *,
@@ -29,21 +95,22 @@ def boot_container(
     tarball_root: Optional[str] = None,
     tarball_chown_stanza: Optional[str] = None,
     mounts: list,
+    on_created: Optional[Callable[["Container"], None]] = None,
 ):
+    """
+    Create, provision and start a container.
+
+    `on_created` is called as soon as the container exists (before it's started),
+    so it can be recorded even if the rest of the boot fails or takes a while.
+    """
     mounts = list(mounts) + get_container_mounts(container_name, tarball_root)
 
-    try:
-        docker_image = conf.docker_client.images.get(image)
-    except ImageNotFound:
-        log.info(f"Image {image} not found locally, pulling it.")
-        try:
-            docker_image = conf.docker_client.images.pull(image)
-        except APIError as ae:
-            raise BootError(f"Could not pull image {image}.\n{ae}") from ae
-    log.info(f"Image {image}: {docker_image.id}")
+    image_id = resolve_image(image)
+    log.info(f"Image {image}: {image_id}")
+    remove_stale_container(container_name)
 
     log.info(f"Creating container {container_name}...")
-    container: Container = conf.docker_client.containers.create(
+    container: "Container" = conf.docker_client.containers.create(
         command=command,
         environment=environment_variables,
         image=image,
@@ -52,6 +119,8 @@ def boot_container(
         name=container_name,
         network_mode="bridge",
     )
+    if on_created:
+        on_created(container)
 
     did_inject = inject_tarballs(
         container=container,
@@ -75,15 +144,24 @@ def boot_container(
     return container
 
 
-def get_container_mounts(container_name: str, tarball_root: str):
+def get_container_mounts(container_name: str, tarball_root: Optional[str]):
+    from docker.types import Mount
+
     mounts = []
-    # Ensure the tarball extraction root exists in the image by mounting it as a volume.
-    # We can't run a mkdir before the container runs and we also don't want to race against
-    # the injection of those files.
-    volume_name = container_name + "-root"
-    log.info(f"Creating volume {volume_name}...")
-    in_volume = conf.docker_client.volumes.create(name=volume_name)
-    mounts.append(Mount(target=tarball_root, source=in_volume.name, type="volume",))
+    if tarball_root:
+        # Ensure the tarball extraction root exists in the image by mounting it as a volume.
+        # We can't run a mkdir before the container runs and we also don't want to race against
+        # the injection of those files.
+        volume_name = container_name + "-root"
+        log.info(f"Creating volume {volume_name}...")
+        in_volume = conf.docker_client.volumes.create(name=volume_name)
+        mounts.append(
+            Mount(
+                target=tarball_root,
+                source=in_volume.name,
+                type="volume",
+            )
+        )
     # Then add in any configured RW/RO mounts.
     for read_only, map in [
         (False, conf.settings.mounts),
@@ -99,7 +177,7 @@ def get_container_mounts(container_name: str, tarball_root: str):
 
 
 def inject_tarballs(
-    *, container: Container, tarball_root: str, tarball_filenames: List[str]
+    *, container: "Container", tarball_root: str, tarball_filenames: List[str]
 ) -> bool:
     if not tarball_filenames:
         return False
@@ -110,20 +188,90 @@ def inject_tarballs(
     return True
 
 
-def get_container_logs(container: Container) -> List[dict]:
-    events = []
-    for stream in ("stdout", "stderr"):
-        for line in container.logs(
-            stdout=(stream == "stdout"), stderr=(stream == "stderr"), timestamps=True
-        ).split(b"\n"):
-            line = line.decode("utf-8", errors="replace")
-            if not line:
-                continue
-            timestamp, content = line.split(" ", 1)
-            events.append(
-                format_log_event(
-                    stream=stream, message=content, time=timestamp.strip("Z")
-                )
+def iterate_lines(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Split a stream of byte chunks into lines (without the line terminators).
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer += chunk
+        if b"\n" not in chunk:
+            continue
+        *lines, rest = buffer.split(b"\n")
+        yield from lines
+        buffer = bytearray(rest)
+    if buffer:
+        yield bytes(buffer)
+
+
+def iterate_stream_events(
+    container: "Container",
+    stream: str,
+    *,
+    since: Optional[str] = None,
+    raw_output: Optional[BinaryIO] = None,
+) -> Iterator[dict]:
+    """
+    Stream one of the container's output streams as events.
+
+    If `raw_output` is given, the raw timestamped lines are also copied into it.
+    """
+    log_kwargs = {}
+    if since:
+        # Docker only supports second resolution here, so filter more precisely below.
+        log_kwargs["since"] = int(parse_event_time(since).timestamp()) or None
+    chunks = container.logs(
+        stdout=(stream == "stdout"),
+        stderr=(stream == "stderr"),
+        timestamps=True,
+        stream=True,
+        **log_kwargs,
+    )
+    for line in iterate_lines(chunks):
+        if raw_output:
+            raw_output.write(line + b"\n")
+        line = line.decode("utf-8", errors="replace")
+        if not line:
+            continue
+        timestamp, _, content = line.partition(" ")
+        event = format_log_event(
+            stream=stream, message=content, time=timestamp.strip("Z")
+        )
+        if since and event["time"] <= since:
+            continue
+        yield event
+
+
+def iterate_container_events(
+    container: "Container",
+    *,
+    since: Optional[str] = None,
+    raw_outputs: Optional[Dict[str, BinaryIO]] = None,
+) -> Iterator[dict]:
+    """
+    Stream the container's stdout and stderr events, merged in time order.
+
+    Each stream is already in time order, so they're merged lazily,
+    keeping memory use constant regardless of the size of the logs.
+    """
+    return heapq.merge(
+        *(
+            iterate_stream_events(
+                container,
+                stream,
+                since=since,
+                raw_output=(raw_outputs or {}).get(stream),
             )
-    events.sort(key=itemgetter("time"))
-    return events
+            for stream in ("stdout", "stderr")
+        ),
+        key=itemgetter("time"),
+    )
+
+
+def get_container_logs(
+    container: "Container", since: Optional[str] = None
+) -> List[dict]:
+    """
+    Get the container's stdout and stderr as events, optionally only those after `since`.
+    """
+    return list(iterate_container_events(container, since=since))
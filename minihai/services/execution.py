@@ -1,12 +1,19 @@
 import logging
 import shlex
+import tarfile
+from typing import TYPE_CHECKING
 
-from docker.models.containers import Container
-from docker.types import Mount
-
+from minihai import conf
 from minihai.models.commit import Commit
 from minihai.models.execution import Execution, ExecutionCreationData
 from minihai.services.docker import boot_container
+from minihai.services.repository import create_repository_volume
+
+if TYPE_CHECKING:  # pragma: no cover
+    from docker.models.containers import Container
+
+CONTAINER_NAME_PREFIX = "minihai-"
+REPOSITORY_ROOT = "/valohai/repository/"
 
 log = logging.getLogger(__name__)
 
@@ -19,9 +26,12 @@ def write_config_files(execution: Execution) -> None:
         (config_path / f"{name}.json").write_text("{}")
 
 
-def start_execution(execution: Execution) -> Container:
+def start_execution(execution: Execution) -> "Container":
+    from docker.errors import APIError
+    from docker.types import Mount
+
     metadata = execution.metadata
-    if "container_id" in metadata:
+    if metadata.get("container_id"):
         raise NotImplementedError("Already have a container ID")
     execution_info: ExecutionCreationData = ExecutionCreationData.parse_obj(metadata)
     commit = Commit.load(id=execution_info.commit)
@@ -37,42 +47,67 @@ def start_execution(execution: Execution) -> Container:
     )
     command = f"sh -c {shlex.quote(command)}"
     write_config_files(execution)
+    mounts = [
+        Mount(
+            target="/valohai/outputs",
+            source=str(execution.outputs_path.absolute()),
+            read_only=False,
+            type="bind",
+        ),
+        Mount(
+            target="/valohai/config",
+            source=str(execution.config_path.absolute()),
+            read_only=True,
+            type="bind",
+        ),
+        Mount(
+            target="/valohai/inputs",
+            source=str(execution.inputs_path.absolute()),
+            read_only=True,
+            type="bind",
+        ),
+    ]
+    container_name = f"{CONTAINER_NAME_PREFIX}{execution.id}"
+    tarball_filenames = [commit.tarball_path]
+    tarball_root = REPOSITORY_ROOT
+    if conf.settings.repository_cache:
+        # Mount a writable overlay of the once-extracted repository
+        # instead of injecting the tarball; the latter remains the fallback.
+        try:
+            volume_name = create_repository_volume(
+                execution, commit, name=f"{container_name}-repository"
+            )
+        except (OSError, tarfile.TarError, APIError):
+            log.warning(
+                f"{execution.id}: could not use the repository cache, copying instead",
+                exc_info=True,
+            )
+        else:
+            mounts.append(
+                Mount(target=REPOSITORY_ROOT, source=volume_name, type="volume")
+            )
+            tarball_filenames = []
+            tarball_root = None
     container = boot_container(
         command=command,
-        container_name=f"minihai-{execution.id}",
+        container_name=container_name,
         environment_variables=environment_variables,
-        image=qualify_image_name(execution_info),
+        image=qualify_image_name(execution_info.image),
         labels={},
-        tarball_filenames=[commit.tarball_path],
-        tarball_root="/valohai/repository/",
+        tarball_filenames=tarball_filenames,
+        tarball_root=tarball_root,
         tarball_chown_stanza=None,
-        mounts=[
-            Mount(
-                target="/valohai/outputs",
-                source=str(execution.outputs_path.absolute()),
-                read_only=False,
-                type="bind",
-            ),
-            Mount(
-                target="/valohai/config",
-                source=str(execution.config_path.absolute()),
-                read_only=True,
-                type="bind",
-            ),
-            Mount(
-                target="/valohai/inputs",
-                source=str(execution.inputs_path.absolute()),
-                read_only=True,
-                type="bind",
-            ),
-        ],
+        mounts=mounts,
+        # Recorded before the container starts, so a container that exits right away
+        # (before the boot finishes) is still reconciled.
+        on_created=(
+            lambda container: execution.update_metadata({"container_id": container.id})
+        ),
     )
-    execution.update_metadata({"container_id": container.id})
     return container
 
 
-def qualify_image_name(execution_info):
-    image = execution_info.image
+def qualify_image_name(image: str) -> str:
     # TODO: should this be more robust?
     if ":" not in image:
         image = f"{image}:latest"
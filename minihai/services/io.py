@@ -0,0 +1,10 @@
+from minihai import conf
+from minihai.lib.aio import BoundedExecutor
+
+# Calls to the Docker daemon, bounded so a crowd of pollers can't swamp it.
+docker_executor = BoundedExecutor(
+    lambda: conf.settings.docker_concurrency, "minihai-docker"
+)
+
+# Blocking file and SQLite access on behalf of async request handlers.
+file_executor = BoundedExecutor(lambda: conf.settings.io_workers, "minihai-io")
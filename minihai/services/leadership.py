@@ -0,0 +1,85 @@
+import logging
+import threading
+from typing import Callable, Optional
+
+from minihai import conf
+from minihai.lib.locks import ProcessLock
+
+LEADER_LOCK_FILENAME = "leader.lock"
+
+log = logging.getLogger(__name__)
+
+
+class LeaderElection:
+    """
+    Makes sure only one of the server's worker processes runs the background tasks.
+
+    Whichever process holds the leader lock file runs them (the reconciler, the queue,
+    the output watcher); the others keep trying to take the lock every `retry_interval`
+    seconds, so one of them takes over should the leader die.
+    """
+
+    def __init__(self, retry_interval: float = 5):
+        self.retry_interval = retry_interval
+        self._lock: Optional[ProcessLock] = None
+        self._on_elected: Optional[Callable[[], None]] = None
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return bool(self._lock and self._lock.is_held)
+
+    @property
+    def is_follower(self) -> bool:
+        """
+        Whether another process is (as far as we know) running the background tasks.
+        """
+        return bool(self._lock and not self._lock.is_held)
+
+    def start(self, on_elected: Callable[[], None]) -> None:
+        if self._lock:
+            return
+        self._lock = ProcessLock(conf.settings.data_path / LEADER_LOCK_FILENAME)
+        self._on_elected = on_elected
+        self._stop_event.clear()
+        if self.try_lead():
+            return
+        log.info("Another worker runs the background tasks; standing by")
+        self._thread = threading.Thread(
+            target=self.run, name="minihai-leadership", daemon=True
+        )
+        self._thread.start()
+
+    def try_lead(self) -> bool:
+        if not self._lock.try_acquire():
+            return False
+        log.info("This worker runs the background tasks")
+        self._on_elected()
+        return True
+
+    def stop(self) -> None:
+        """
+        Stop trying to become the leader, and step down if we are.
+
+        The background tasks should have been stopped already,
+        lest they overlap with the next leader's.
+        """
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.retry_interval)
+            self._thread = None
+        if self._lock:
+            self._lock.release()
+            self._lock = None
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.retry_interval):
+            try:
+                if self.try_lead():
+                    return
+            except Exception:
+                log.warning("Failed to take over the background tasks", exc_info=True)
+
+
+leader_election = LeaderElection()
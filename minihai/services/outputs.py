@@ -0,0 +1,233 @@
+import logging
+import os
+import pathlib
+import stat
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from minihai.models.base import DoesNotExist
+from minihai.models.execution import Execution, OUTPUTS_INDEXED_METADATA_KEY
+from minihai.models.output import Output, iterate_output_files
+from minihai.services.leadership import leader_election
+
+try:
+    from inotify_simple import INotify, flags
+except ImportError:  # pragma: no cover
+    INotify = flags = None
+
+log = logging.getLogger(__name__)
+
+if flags:
+    WATCH_FLAGS = (
+        flags.CREATE
+        | flags.CLOSE_WRITE
+        | flags.MOVED_TO
+        | flags.MOVED_FROM
+        | flags.DELETE
+        | flags.ONLYDIR
+    )
+
+
+# (execution ID, outputs root, watched directory), by watch descriptor
+Watch = Tuple[str, pathlib.Path, pathlib.Path]
+
+
+class OutputWatcher:
+    """
+    Keeps the output index of running executions up to date as files are written.
+
+    Output directories are watched with inotify (if `inotify_simple` is installed);
+    changes are picked up in batches, and only the files that changed are stat'ed.
+    When an execution finishes, `Execution.index_outputs` does a final sweep anyway,
+    so nothing is lost if events are dropped or inotify isn't available.
+    """
+
+    def __init__(self, read_timeout: float = 1):
+        self.read_timeout = read_timeout
+        self._inotify: Optional["INotify"] = None
+        self._watches: Dict[int, Watch] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def available(self) -> bool:
+        return INotify is not None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        if not self.available:
+            log.info("inotify_simple not installed; outputs are indexed on demand")
+            return
+        self._inotify = INotify()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="minihai-outputs", daemon=True
+        )
+        self._thread.start()
+        for execution_id in Execution.get_index().query(status="started"):
+            try:
+                self.watch(Execution.load(id=execution_id))
+            except DoesNotExist:
+                continue
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.read_timeout * 2)
+            self._thread = None
+        with self._lock:
+            self._watches.clear()
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+    def is_watching(self, execution_id: str) -> bool:
+        with self._lock:
+            return any(w[0] == execution_id for w in self._watches.values())
+
+    def watch(self, execution: Execution) -> None:
+        if not self._inotify:
+            return
+        outputs_path = execution.outputs_path
+        self._add_watches(execution.id, outputs_path, outputs_path)
+        # Catch up with anything written before the watches were in place.
+        execution.index_outputs()
+
+    def unwatch(self, execution_id: str) -> None:
+        self._remove_watches(lambda watch: watch[0] == execution_id)
+
+    def _remove_watches(self, predicate: Callable[[Watch], bool]) -> None:
+        with self._lock:
+            wds = [wd for (wd, w) in self._watches.items() if predicate(w)]
+            for wd in wds:
+                del self._watches[wd]
+        for wd in wds:
+            try:
+                self._inotify.rm_watch(wd)
+            except OSError:  # Already gone along with the directory.
+                pass
+
+    def _add_watches(
+        self, execution_id: str, outputs_path: pathlib.Path, directory: pathlib.Path
+    ) -> None:
+        stack = [directory]
+        while stack:
+            directory = stack.pop()
+            try:
+                wd = self._inotify.add_watch(directory, WATCH_FLAGS)
+            except OSError:
+                continue
+            with self._lock:
+                self._watches[wd] = (execution_id, outputs_path, directory)
+            try:
+                with os.scandir(directory) as scanner:
+                    stack.extend(
+                        pathlib.Path(entry.path)
+                        for entry in scanner
+                        if entry.is_dir(follow_symlinks=False)
+                    )
+            except FileNotFoundError:
+                continue
+
+    def handle_events(self, events: list) -> None:
+        # (execution ID, name) -> the output's current state, or None if it's gone
+        updates: Dict[Tuple[str, str], Optional[Output]] = {}
+        for event in events:
+            if event.mask & flags.Q_OVERFLOW:
+                log.warning("inotify queue overflowed, rescanning outputs")
+                self.rescan()
+                continue
+            with self._lock:
+                watch = self._watches.get(event.wd)
+            if not watch or not event.name:
+                continue
+            execution_id, outputs_path, directory = watch
+            path = directory / event.name
+            if event.mask & flags.ISDIR:
+                if event.mask & (flags.CREATE | flags.MOVED_TO):
+                    self._add_watches(execution_id, outputs_path, path)
+                    for output in iterate_output_files(
+                        execution_id, outputs_path, path
+                    ):
+                        updates[(execution_id, output.name)] = output
+                elif event.mask & (flags.DELETE | flags.MOVED_FROM):
+                    # Everything that was in the directory is gone (or elsewhere now).
+                    self._remove_watches(
+                        lambda watch: watch[2] == path or path in watch[2].parents
+                    )
+                    prefix = path.relative_to(outputs_path).as_posix() + "/"
+                    names = {
+                        output.name
+                        for output in Output.list_for_execution(execution_id)
+                    }
+                    names.update(name for (eid, name) in updates if eid == execution_id)
+                    for name in names:
+                        if name.startswith(prefix):
+                            updates[(execution_id, name)] = None
+                continue
+            name = path.relative_to(outputs_path).as_posix()
+            if event.mask & (flags.CLOSE_WRITE | flags.MOVED_TO):
+                try:
+                    file_stat = path.lstat()
+                except FileNotFoundError:
+                    file_stat = None
+                # Symlinks aren't indexed (see `iterate_output_files`).
+                if file_stat and stat.S_ISREG(file_stat.st_mode):
+                    updates[(execution_id, name)] = Output.from_stat(
+                        execution_id, outputs_path, path, file_stat
+                    )
+                else:
+                    updates[(execution_id, name)] = None
+            elif event.mask & (flags.DELETE | flags.MOVED_FROM):
+                updates[(execution_id, name)] = None
+        Output.index_many(output for output in updates.values() if output)
+        for (execution_id, name), output in updates.items():
+            if not output:
+                Output.unindex_many(execution_id, [name])
+
+    def rescan(self) -> None:
+        with self._lock:
+            execution_ids = {w[0] for w in self._watches.values()}
+        for execution_id in execution_ids:
+            try:
+                Execution.load(id=execution_id).index_outputs()
+            except DoesNotExist:
+                self.unwatch(execution_id)
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                events = self._inotify.read(timeout=int(self.read_timeout * 1000))
+                if events:
+                    self.handle_events(events)
+            except Exception:
+                if self._stop_event.is_set():
+                    break
+                log.warning("Failed to index outputs", exc_info=True)
+
+
+def refresh_output_index(execution: Execution) -> None:
+    """
+    Make sure the output index is current for `execution` before it's read.
+
+    Finished executions have been swept already, and running ones are watched
+    (by this process, or by the leader worker if we're not it);
+    anything else (e.g. executions finished before outputs were indexed,
+    or running ones when inotify isn't available) is swept now.
+    """
+    if execution.metadata.get(OUTPUTS_INDEXED_METADATA_KEY):
+        return
+    if output_watcher.is_watching(execution.id):
+        return
+    if (
+        leader_election.is_follower
+        and output_watcher.available
+        and execution.status == "started"
+    ):
+        return
+    execution.index_outputs()
+
+
+output_watcher = OutputWatcher()
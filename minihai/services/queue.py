@@ -0,0 +1,247 @@
+import datetime
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from minihai import conf
+from minihai.lib.host import get_available_memory, get_cpu_count, get_load_per_cpu
+from minihai.models.base import DoesNotExist
+from minihai.models.execution import Execution, ERROR_MESSAGE_METADATA_KEY
+from minihai.services.execution import start_execution
+from minihai.services.outputs import output_watcher
+
+DEQUEUED_AT_METADATA_KEY = "dequeued_at"
+
+log = logging.getLogger(__name__)
+
+
+def get_max_concurrent_executions() -> int:
+    return conf.settings.max_concurrent_executions or get_cpu_count()
+
+
+def get_queued_execution_ids() -> List[str]:
+    return Execution.get_index().query(status="queued", ordering=["counter", "id"])
+
+
+def get_running_execution_count() -> int:
+    return Execution.get_index().count(status="started")
+
+
+def has_host_headroom() -> bool:
+    min_free_memory = conf.settings.min_free_memory_mb * 1024 * 1024
+    available_memory = get_available_memory()
+    if available_memory is not None and available_memory < min_free_memory:
+        log.info(f"Not enough free memory to start executions ({available_memory})")
+        return False
+    load_per_cpu = get_load_per_cpu()
+    max_load_per_cpu = conf.settings.max_load_per_cpu
+    if (
+        max_load_per_cpu
+        and load_per_cpu is not None
+        and load_per_cpu > max_load_per_cpu
+    ):
+        log.info(f"Host too loaded to start executions ({load_per_cpu:.2f} per CPU)")
+        return False
+    return True
+
+
+def boot_execution(execution: Execution) -> None:
+    # Booting may take minutes, so progress is written as it happens (not batched),
+    # letting the API and the reconciler see the execution's actual state meanwhile.
+    execution.update_metadata(
+        {DEQUEUED_AT_METADATA_KEY: datetime.datetime.now().isoformat()}
+    )
+    try:
+        start_execution(execution)
+        output_watcher.watch(execution)
+    except Exception as exc:
+        log.error(f"Could not start execution {execution.id}", exc_info=True)
+        execution.update_metadata(
+            {
+                ERROR_MESSAGE_METADATA_KEY: str(exc),
+            }
+        )
+        remove_failed_container(execution)
+
+
+def remove_failed_container(execution: Execution) -> None:
+    """
+    Remove the container of an execution that failed to boot, if one was created,
+    as nothing else would ever clean it up.
+    """
+    try:
+        container = execution.container
+        if container:
+            container.remove(force=True)
+    except Exception:
+        log.warning(f"{execution.id}: could not remove container", exc_info=True)
+
+
+def recover_interrupted_boots() -> int:
+    """
+    Put executions whose boot was interrupted (e.g. by a restart) back in the queue.
+
+    Those are the started executions whose containers were created but never started;
+    the containers are removed, and the executions will be booted again from scratch.
+    """
+    n = 0
+    for execution_id in Execution.get_index().query(status="started"):
+        try:
+            execution = Execution.load(id=execution_id)
+            container = execution.container
+        except DoesNotExist:
+            continue
+        except Exception:
+            log.warning(f"{execution_id}: could not check container", exc_info=True)
+            continue
+        if not container or container.attrs["State"].get("Status") != "created":
+            continue
+        log.info(f"Requeuing execution {execution_id} (its boot was interrupted)")
+        container.remove(force=True)
+        execution.update_metadata(
+            {"container_id": None, DEQUEUED_AT_METADATA_KEY: None}
+        )
+        n += 1
+    return n
+
+
+def get_queue_positions() -> Dict[str, int]:
+    return {
+        execution_id: position
+        for (position, execution_id) in enumerate(get_queued_execution_ids(), 1)
+    }
+
+
+def get_queue_info(
+    execution: Execution, positions: Optional[Dict[str, int]] = None
+) -> dict:
+    """
+    Get the queue position (for queued executions) and time spent in the queue.
+
+    `positions` may be passed in to avoid recomputing queue positions for each execution.
+    """
+    metadata = execution.metadata
+    ctime = datetime.datetime.fromisoformat(metadata["ctime"])
+    dequeued_at = metadata.get(DEQUEUED_AT_METADATA_KEY)
+    if dequeued_at:
+        dequeued_at = datetime.datetime.fromisoformat(dequeued_at)
+        return {
+            "queue_position": None,
+            "queue_wait_seconds": (dequeued_at - ctime).total_seconds(),
+        }
+    if execution.status != "queued":
+        # e.g. executions from before the queue existed; their wait is unknown.
+        return {"queue_position": None, "queue_wait_seconds": None}
+    if positions is None:
+        positions = get_queue_positions()
+    return {
+        "queue_position": positions.get(execution.id),
+        "queue_wait_seconds": (datetime.datetime.now() - ctime).total_seconds(),
+    }
+
+
+class ExecutionQueue:
+    """
+    Starts queued executions in order, as long as there is capacity for them.
+
+    The queue itself is just the set of executions in the "queued" state in the index,
+    so it survives restarts; the dispatcher is woken up whenever something changes,
+    and also polls every `poll_interval` seconds.
+    """
+
+    def __init__(self, poll_interval: float = 5):
+        self.poll_interval = poll_interval
+        self._wakeup_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._boot_executor: Optional[ThreadPoolExecutor] = None
+        self._booting: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def boot_executor(self) -> ThreadPoolExecutor:
+        # Booting (pulling images, injecting the repository, etc.) may take minutes,
+        # so it happens in a dedicated pool instead of the dispatcher or request threads.
+        if self._boot_executor is None:
+            self._boot_executor = ThreadPoolExecutor(
+                max_workers=conf.settings.boot_workers,
+                thread_name_prefix="minihai-boot",
+            )
+        return self._boot_executor
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="minihai-queue", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self._wakeup_event.set()
+        if self._thread:
+            self._thread.join(timeout=self.poll_interval)
+            self._thread = None
+        if self._boot_executor:
+            self._boot_executor.shutdown(wait=False)
+            self._boot_executor = None
+
+    def notify(self) -> None:
+        self._wakeup_event.set()
+
+    def wait_for_boots(self, timeout: Optional[float] = None) -> None:
+        wait(list(self._booting.values()), timeout=timeout)
+
+    def can_admit(self) -> bool:
+        running = get_running_execution_count() + len(self._booting)
+        if running >= get_max_concurrent_executions():
+            return False
+        # Always allow at least one execution to run, lest we starve.
+        return running == 0 or has_host_headroom()
+
+    def _boot(self, execution: Execution) -> None:
+        try:
+            boot_execution(execution)
+        finally:
+            with self._lock:
+                self._booting.pop(execution.id, None)
+            self.notify()
+
+    def dispatch(self) -> int:
+        n = 0
+        for execution_id in get_queued_execution_ids():
+            if execution_id in self._booting:
+                continue
+            if self._stop_event.is_set() or not self.can_admit():
+                break
+            try:
+                execution = Execution.load(id=execution_id)
+            except DoesNotExist:
+                continue
+            log.info(f"Dequeuing execution {execution_id}")
+            with self._lock:
+                self._booting[execution_id] = self.boot_executor.submit(
+                    self._boot, execution
+                )
+            n += 1
+        return n
+
+    def run(self) -> None:
+        # Nothing is booting yet, so any unstarted containers are leftovers.
+        try:
+            recover_interrupted_boots()
+        except Exception:
+            log.warning("Failed to recover interrupted boots", exc_info=True)
+        while not self._stop_event.is_set():
+            self._wakeup_event.clear()
+            try:
+                self.dispatch()
+            except Exception:
+                log.warning("Failed to dispatch queued executions", exc_info=True)
+            self._wakeup_event.wait(self.poll_interval)
+
+
+execution_queue = ExecutionQueue()
@@ -0,0 +1,114 @@
+import logging
+import threading
+from typing import Optional
+
+import minihai.conf as conf
+from minihai.models.base import DoesNotExist
+from minihai.models.execution import Execution
+from minihai.models.output import Output
+from minihai.services.checksums import output_checksummer
+from minihai.services.execution import CONTAINER_NAME_PREFIX
+from minihai.services.outputs import output_watcher
+from minihai.services.queue import execution_queue
+
+log = logging.getLogger(__name__)
+
+
+def get_execution_id_for_event(event: dict) -> Optional[str]:
+    attributes = (event.get("Actor") or {}).get("Attributes") or {}
+    name = attributes.get("name") or ""
+    if not name.startswith(CONTAINER_NAME_PREFIX):
+        return None
+    return name[len(CONTAINER_NAME_PREFIX) :]
+
+
+def reconcile_execution(execution_id: str) -> None:
+    try:
+        execution = Execution.load(id=execution_id)
+    except DoesNotExist:
+        return
+    try:
+        execution.check_container_status()
+    except Exception:
+        log.warning(f"{execution_id}: could not check container status", exc_info=True)
+        return
+    if execution.status != "started":
+        # The final sweep of the outputs happened when the container was archived.
+        output_watcher.unwatch(execution_id)
+        output_checksummer.schedule(Output.list_for_execution(execution_id))
+
+
+def rescan_executions() -> int:
+    """
+    Check the container status of every execution the index considers started.
+    """
+    execution_ids = Execution.get_index().query(status="started")
+    for execution_id in execution_ids:
+        reconcile_execution(execution_id)
+    return len(execution_ids)
+
+
+class ExecutionReconciler:
+    """
+    Updates executions as soon as their containers die, based on the Docker events stream.
+
+    Whenever the stream is (re)connected, all started executions are rescanned
+    to catch up with anything that happened while we weren't listening.
+    """
+
+    def __init__(self, retry_interval: float = 5):
+        self.retry_interval = retry_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._events = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="minihai-reconciler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        events = self._events
+        if events:
+            events.close()
+        if self._thread:
+            self._thread.join(timeout=self.retry_interval)
+            self._thread = None
+
+    def handle_event(self, event: dict) -> None:
+        execution_id = get_execution_id_for_event(event)
+        if execution_id:
+            log.info(f"{execution_id}: container {event.get('Action')}")
+            reconcile_execution(execution_id)
+            # A container finishing may have freed up room for queued executions.
+            execution_queue.notify()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                # Subscribe before rescanning so nothing falls between the two.
+                self._events = conf.docker_client.events(
+                    decode=True,
+                    filters={"type": "container", "event": "die"},
+                )
+                n = rescan_executions()
+                log.info(f"Reconciler rescanned {n} started executions")
+                for event in self._events:
+                    self.handle_event(event)
+            except Exception:
+                if self._stop_event.is_set():
+                    break
+                log.warning("Docker event stream failed", exc_info=True)
+            finally:
+                if self._events:
+                    self._events.close()
+                    self._events = None
+            self._stop_event.wait(self.retry_interval)
+
+
+reconciler = ExecutionReconciler()
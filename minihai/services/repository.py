@@ -0,0 +1,150 @@
+import logging
+import os
+import pathlib
+import shutil
+import tarfile
+import tempfile
+from typing import Iterable, Set
+
+from minihai import conf
+from minihai.lib.singleflight import SingleFlight
+from minihai.models.commit import Commit
+from minihai.models.execution import Execution
+
+SIZE_FILENAME = "size"
+TREE_DIRNAME = "tree"
+OVERLAY_DIRNAME = "repository-overlay"
+
+# Use the stricter extraction filter on Pythons that have it (3.12+, some backports).
+EXTRACT_KWARGS = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
+log = logging.getLogger(__name__)
+
+_extractions = SingleFlight()
+
+
+def get_repository_cache_root() -> pathlib.Path:
+    return conf.settings.data_path / "repository-cache"
+
+
+def _get_safe_members(tf: tarfile.TarFile) -> Iterable[tarfile.TarInfo]:
+    for member in tf:
+        name = os.path.normpath(member.name)
+        if name.startswith(("/", "..")) or member.isdev():
+            log.warning(f"Skipping unsafe tarball member {member.name!r}")
+            continue
+        if (member.issym() or member.islnk()) and (
+            os.path.isabs(member.linkname) or ".." in member.linkname.split("/")
+        ):
+            log.warning(f"Skipping unsafe tarball link {member.name!r}")
+            continue
+        yield member
+
+
+def _extract_repository(commit: Commit, path: pathlib.Path) -> pathlib.Path:
+    if path.is_dir():
+        return path
+    root = get_repository_cache_root()
+    root.mkdir(parents=True, exist_ok=True)
+    temp_path = pathlib.Path(tempfile.mkdtemp(dir=root, prefix=f".{commit.id}-"))
+    try:
+        size = 0
+        (temp_path / TREE_DIRNAME).mkdir()
+        with tarfile.open(commit.tarball_path) as tf:
+            for member in _get_safe_members(tf):
+                tf.extract(member, path=str(temp_path / TREE_DIRNAME), **EXTRACT_KWARGS)
+                size += member.size
+        (temp_path / SIZE_FILENAME).write_text(str(size))
+        os.rename(temp_path, path)
+    except BaseException:
+        shutil.rmtree(temp_path, ignore_errors=True)
+        raise
+    log.info(f"Extracted commit {commit.id} into repository cache ({size} bytes)")
+    return path
+
+
+def get_cached_repository(commit: Commit) -> pathlib.Path:
+    """
+    Get a directory containing the extracted repository of the given commit.
+
+    Each commit is extracted only once (concurrent requests share the extraction),
+    after which the least recently used commits are evicted to keep the cache
+    under `repository_cache_max_size_mb`.
+    """
+    path = get_repository_cache_root() / commit.id
+    if not path.is_dir():
+        _extractions.do(commit.id, _extract_repository, commit, path)
+        evict_repositories(keep={commit.id})
+    os.utime(path)  # mark as recently used
+    return path / TREE_DIRNAME
+
+
+def create_repository_volume(execution: Execution, commit: Commit, name: str) -> str:
+    """
+    Create a Docker volume holding a writable copy of the commit's repository
+    for the execution, and return its name.
+
+    Nothing is copied: the volume is an overlay on top of the cached repository tree,
+    with whatever the execution writes ending up in the execution's directory.
+    """
+    lower_path = get_cached_repository(commit).absolute()
+    overlay_path = execution.path.absolute() / OVERLAY_DIRNAME
+    # Start afresh, should an interrupted boot have left something behind.
+    shutil.rmtree(overlay_path, ignore_errors=True)
+    upper_path = overlay_path / "upper"
+    work_path = overlay_path / "work"
+    upper_path.mkdir(parents=True)
+    work_path.mkdir()
+    volume = conf.docker_client.volumes.create(
+        name=name,
+        driver="local",
+        driver_opts={
+            "type": "overlay",
+            "device": "overlay",
+            "o": f"lowerdir={lower_path},upperdir={upper_path},workdir={work_path}",
+        },
+    )
+    return volume.name
+
+
+def get_in_use_commit_ids() -> Set[str]:
+    return set(Execution.get_index().distinct("commit", status=["queued", "started"]))
+
+
+def _get_cached_size(path: pathlib.Path) -> int:
+    try:
+        return int((path / SIZE_FILENAME).read_text())
+    except (OSError, ValueError):
+        return 0
+
+
+def evict_repositories(keep: Set[str] = frozenset()) -> int:
+    """
+    Remove least recently used extracted repositories until the cache is small enough.
+
+    Repositories of queued or running executions are never evicted.
+    """
+    root = get_repository_cache_root()
+    if not root.is_dir():
+        return 0
+    max_size = conf.settings.repository_cache_max_size_mb * 1024 * 1024
+    entries = [
+        (entry.stat().st_mtime, entry.name, _get_cached_size(pathlib.Path(entry.path)))
+        for entry in os.scandir(root)
+        if entry.is_dir() and not entry.name.startswith(".")
+    ]
+    total_size = sum(size for (mtime, name, size) in entries)
+    if total_size <= max_size:
+        return 0
+    keep = set(keep) | get_in_use_commit_ids()
+    n = 0
+    for mtime, name, size in sorted(entries):
+        if total_size <= max_size:
+            break
+        if name in keep:
+            continue
+        log.info(f"Evicting commit {name} from repository cache ({size} bytes)")
+        shutil.rmtree(root / name, ignore_errors=True)
+        total_size -= size
+        n += 1
+    return n
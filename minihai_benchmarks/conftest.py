@@ -0,0 +1,63 @@
+import pytest
+
+from minihai import conf
+from minihai_benchmarks.data import (
+    DataSpec,
+    GeneratedData,
+    generate_data,
+    make_log_line,
+    use_data_dir,
+)
+from minihai_tests.utils import FakeContainer, FakeDockerClient
+
+SCALES = [1_000, 10_000, pytest.param(100_000, marks=pytest.mark.slow)]
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_configure(config):
+    # Keep the results of every run (in `.benchmarks/`) unless told otherwise,
+    # so they can be compared between versions with `--benchmark-compare`.
+    option = config.option
+    if getattr(option, "benchmark_autosave", False) is None:
+        if not option.benchmark_save:
+            from pytest_benchmark.utils import get_tag
+
+            option.benchmark_autosave = get_tag()
+
+
+@pytest.fixture(scope="session", params=SCALES)
+def scale(request) -> int:
+    return request.param
+
+
+@pytest.fixture(scope="session")
+def generated(scale, tmp_path_factory) -> GeneratedData:
+    """
+    A data directory with `scale` executions, outputs (in one execution) and log lines.
+    """
+    path = tmp_path_factory.mktemp(f"data-{scale}")
+    with use_data_dir(path):
+        yield generate_data(
+            path,
+            DataSpec(
+                executions=scale,
+                commits=max(scale // 100, 1),
+                outputs=scale,
+                log_lines=scale,
+            ),
+        )
+
+
+@pytest.fixture
+def docker_client(generated, monkeypatch) -> FakeDockerClient:
+    client = FakeDockerClient()
+    stdout = b"".join(
+        make_log_line(n).encode() + b"\n" for n in range(generated.spec.log_lines)
+    )
+    client.containers.add(
+        FakeContainer(
+            generated.running_container_id, output={"stdout": stdout}, chunk_size=4096
+        )
+    )
+    monkeypatch.setitem(vars(conf), "docker_client", client)
+    return client
@@ -0,0 +1,212 @@
+"""
+Generate synthetic data directories for benchmarking (or load testing) Minihai.
+
+Run `python -m minihai_benchmarks.data PATH --executions 10000` to generate one by hand.
+"""
+import contextlib
+import dataclasses
+import datetime
+import io
+import pathlib
+import tarfile
+from typing import Iterator, Optional
+
+import click
+
+from minihai import conf, consts
+from minihai.lib.events import format_log_event
+from minihai.lib.files import atomic_write
+from minihai.lib.sqlite import ConnectionPerThread, connect
+from minihai.models.commit import Commit
+from minihai.models.execution import Execution
+from minihai.models.output import Output
+from minihai.services.checksums import output_checksummer
+
+EPOCH = datetime.datetime(2020, 1, 1)
+STEPS = ("train", "evaluate", "preprocess", "deploy")
+
+
+@dataclasses.dataclass
+class DataSpec:
+    executions: int = 1000
+    commits: int = 10
+    # Outputs and log lines are only generated for the sample execution.
+    outputs: int = 1000
+    output_size: int = 64
+    log_lines: int = 1000
+
+
+@dataclasses.dataclass
+class GeneratedData:
+    path: pathlib.Path
+    spec: DataSpec
+    commit_ids: list
+    # A finished execution with `spec.outputs` outputs and `spec.log_lines` log lines.
+    sample_execution_id: str
+    # A running execution (its container is up to a `minihai_tests.utils.FakeDockerClient`).
+    running_execution_id: str
+    running_container_id: str
+
+
+@contextlib.contextmanager
+def use_data_dir(path: pathlib.Path) -> Iterator[pathlib.Path]:
+    """
+    Point Minihai at the given data directory for the duration of the block.
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    settings = conf.settings
+    original_data_path = settings.data_path
+    # The databases are swapped through `vars()`, so lazily created ones
+    # (see `minihai.conf`) aren't created just to be replaced.
+    namespace = vars(conf)
+    saved = {name: namespace.get(name) for name in ("cache_db", "index_db")}
+    index_db = connect(path / "index.sqlite3", check_same_thread=False)
+    settings.data_path = path
+    namespace["cache_db"] = ConnectionPerThread(path / "cache.sqlite3")
+    namespace["index_db"] = index_db
+    try:
+        yield path
+    finally:
+        index_db.close()
+        settings.data_path = original_data_path
+        for name, value in saved.items():
+            if value is None:
+                namespace.pop(name, None)
+            else:
+                namespace[name] = value
+
+
+def make_log_line(n: int) -> str:
+    """
+    Make the `n`th log line, as Docker would output it with timestamps.
+    """
+    time = (EPOCH + datetime.timedelta(milliseconds=n)).isoformat(
+        timespec="microseconds"
+    )
+    return f"{time}000Z step {n}: loss={1 / (n + 1):.6f} accuracy={n % 100}%"
+
+
+def make_log_event(n: int) -> dict:
+    timestamp, _, message = make_log_line(n).partition(" ")
+    return format_log_event(stream="stdout", message=message, time=timestamp.strip("Z"))
+
+
+def make_package(files: int, *, file_size: int = 64, salt: str = "") -> bytes:
+    """
+    Make a gzipped tarball with a valohai.yaml and `files` other files.
+
+    Different `salt`s produce different (but equally large) packages.
+    """
+    bio = io.BytesIO()
+    with tarfile.open(fileobj=bio, mode="w:gz") as tf:
+
+        def add(name: str, content: bytes):
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+
+        add("valohai.yaml", b"- step: {name: train, image: busybox, command: 'true'}")
+        add("salt.txt", salt.encode())
+        for n in range(files):
+            add(f"src/{n // 1000}/file{n}.py", (b"%d" % n).ljust(file_size, b"#"))
+    return bio.getvalue()
+
+
+def _write_metadata(obj, metadata: dict) -> None:
+    obj.path.mkdir(parents=True, exist_ok=True)
+    atomic_write(obj.metadata_path, obj.encode_metadata({"id": obj.id, **metadata}))
+
+
+def generate_data(path: pathlib.Path, spec: Optional[DataSpec] = None) -> GeneratedData:
+    """
+    Fill `path` (which should be in use, see `use_data_dir`) with synthetic data.
+
+    Metadata files are written directly and indexed in bulk afterwards,
+    which is a lot faster than creating each object through the models.
+    """
+    spec = spec or DataSpec()
+    commit_ids = []
+    for n in range(max(spec.commits, 1)):
+        commit = Commit(id=f"~{n:064x}")
+        _write_metadata(
+            commit,
+            {
+                "ctime": (EPOCH + datetime.timedelta(hours=n)).isoformat(),
+                "size": 0,
+                "identifier": commit.id,
+                "description": f"Commit {n}",
+            },
+        )
+        commit.valohai_yaml_path.write_bytes(
+            b"- step: {name: train, image: busybox, command: 'true'}"
+        )
+        commit_ids.append(commit.id)
+
+    execution_ids = []
+    n_executions = max(spec.executions, 2)
+    for n in range(n_executions):
+        execution = Execution(id=f"{n:08x}-0000-4000-8000-{n:012x}")
+        metadata = {
+            "ctime": (EPOCH + datetime.timedelta(minutes=n)).isoformat(),
+            "counter": n + 1,
+            "commit": commit_ids[n % len(commit_ids)],
+            "project": str(consts.PROJECT_ID),
+            "environment": str(consts.ENVIRONMENT_ID),
+            "inputs": {},
+            "parameters": {},
+            "environment_variables": {},
+            "step": STEPS[n % len(STEPS)],
+            "image": "busybox",
+            "title": "",
+            "container_id": f"container-{n}",
+            "container_exit_code": (0 if n % 10 else 1),
+        }
+        if n == n_executions - 2:
+            del metadata["container_exit_code"]  # Still running.
+        _write_metadata(execution, metadata)
+        execution_ids.append(execution.id)
+
+    Commit.rebuild_index()
+    Execution.rebuild_index()
+    Execution.get_sequence("counter").seed(len(execution_ids))
+
+    sample = Execution.load(execution_ids[-1])
+    sample.update_metadata({"container_exit_code": 0})
+    outputs_path = sample.outputs_path
+    content = b"x" * spec.output_size
+    for n in range(spec.outputs):
+        directory = outputs_path / f"part-{n // 1000:03d}"
+        directory.mkdir(exist_ok=True)
+        (directory / f"output-{n:06d}.txt").write_bytes(content)
+    sample.index_outputs()
+    output_checksummer.schedule(Output.list_for_execution(sample.id))
+    output_checksummer.wait()
+    sample.log_archive.write(make_log_event(n) for n in range(spec.log_lines))
+    running = Execution.load(execution_ids[-2])
+    return GeneratedData(
+        path=path,
+        spec=spec,
+        commit_ids=commit_ids,
+        sample_execution_id=sample.id,
+        running_execution_id=running.id,
+        running_container_id=running.metadata["container_id"],
+    )
+
+
+@click.command(help="Generate a synthetic Minihai data directory.")
+@click.argument("path", type=click.Path(file_okay=False))
+@click.option("--executions", type=int, default=DataSpec.executions)
+@click.option("--commits", type=int, default=DataSpec.commits)
+@click.option("--outputs", type=int, default=DataSpec.outputs)
+@click.option("--output-size", type=int, default=DataSpec.output_size)
+@click.option("--log-lines", type=int, default=DataSpec.log_lines)
+def main(path, **kwargs):
+    path = pathlib.Path(path).absolute()
+    with use_data_dir(path):
+        data = generate_data(path, DataSpec(**kwargs))
+    print(f"Generated {data.spec} in {path}")
+    print(f"Sample execution: {data.sample_execution_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import itertools
+
+from minihai import consts
+from minihai_benchmarks.data import make_package
+
+IMPORT_URL = f"/api/v0/projects/{consts.PROJECT_ID}/import-package/"
+
+
+def test_read_executions(benchmark, generated, client):
+    resp = benchmark(client.get, "/api/v0/executions/", params={"limit": 100})
+    assert resp.status_code == 200
+    assert resp.json()["count"] == generated.spec.executions
+
+
+def test_read_executions_filtered(benchmark, generated, client):
+    params = {"limit": 100, "status": "error", "ordering": "-counter"}
+    resp = benchmark(client.get, "/api/v0/executions/", params=params)
+    assert resp.status_code == 200
+    assert resp.json()["count"] == generated.spec.executions // 10
+
+
+def test_get_execution_detail(benchmark, generated, client):
+    url = f"/api/v0/executions/{generated.sample_execution_id}/"
+    resp = benchmark(client.get, url)
+    assert resp.json()["status"] == "complete"
+
+
+def test_get_execution_events(benchmark, generated, client):
+    url = f"/api/v0/executions/{generated.sample_execution_id}/events/"
+    resp = benchmark(client.get, url)
+    assert resp.json()["total"] == generated.spec.log_lines
+
+
+def test_poll_execution_events(benchmark, generated, client):
+    # What notebooks do while waiting: ask for anything after the last event seen.
+    url = f"/api/v0/executions/{generated.sample_execution_id}/events/"
+    since = client.get(url, params={"limit": 1}).json()["next_since"]
+    resp = benchmark(client.get, url, params={"since": since})
+    assert resp.json()["events"] == []
+
+
+def test_get_running_execution_events(benchmark, generated, client, docker_client):
+    url = f"/api/v0/executions/{generated.running_execution_id}/events/"
+    resp = benchmark(client.get, url)
+    assert resp.json()["total"] == generated.spec.log_lines
+
+
+def test_list_data(benchmark, generated, client):
+    params = {"output_execution": generated.sample_execution_id}
+    resp = benchmark(client.get, "/api/v0/data/", params=params)
+    data = resp.json()
+    assert data["count"] == generated.spec.outputs
+    assert all(result["checksums"] for result in data["results"])
+
+
+def test_import_package(benchmark, generated, client, scale):
+    # Each round uploads a different package, lest it be deduplicated.
+    salts = itertools.count()
+
+    def setup():
+        return (make_package(scale, salt=str(next(salts))),), {}
+
+    def upload(package: bytes):
+        return client.post(IMPORT_URL, files={"data": ("package.tgz", package)})
+
+    resp = benchmark.pedantic(upload, setup=setup, rounds=5)
+    assert resp.status_code == 200
@@ -0,0 +1,42 @@
+import random
+
+import pytest
+
+from minihai.lib.cache import Cache
+from minihai.lib.sqlite import ConnectionPerThread
+
+BATCH_SIZE = 1000
+
+
+@pytest.fixture
+def cache(tmp_path, scale) -> Cache:
+    cache = Cache(
+        ConnectionPerThread(tmp_path / "cache.sqlite3"),
+        "benchmark",
+        memory_size=4096,
+        eviction_interval=scale * 10,
+    )
+    cache.set_many({f"key-{n}": {"sha256": f"{n:064x}"} for n in range(scale)})
+    return cache
+
+
+def test_cache_set_many(benchmark, cache, scale):
+    entries = {f"key-{n}": {"sha256": f"{n + 1:064x}"} for n in range(scale)}
+    benchmark(cache.set_many, entries)
+
+
+def test_cache_get_many_from_database(benchmark, cache, scale):
+    keys = [f"key-{n}" for n in random.Random(42).sample(range(scale), BATCH_SIZE)]
+
+    def setup():
+        cache.memory.clear()
+
+    benchmark.pedantic(cache.get_many, args=(keys,), setup=setup, rounds=20)
+    assert cache.get_many(keys).keys() == set(keys)
+
+
+def test_cache_get_many_from_memory(benchmark, cache):
+    keys = [f"key-{n}" for n in range(BATCH_SIZE)]
+    cache.get_many(keys)
+    found = benchmark(cache.get_many, keys)
+    assert len(found) == BATCH_SIZE
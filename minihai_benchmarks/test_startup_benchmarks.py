@@ -0,0 +1,22 @@
+from minihai_tests.utils import measure_startup
+
+
+def test_cli_startup(benchmark):
+    code = """
+    from minihai.cli import main
+    try:
+        main(["--help"])
+    except SystemExit:
+        pass
+    """
+    duration, modules, resources = benchmark.pedantic(
+        measure_startup, args=(code,), rounds=5
+    )
+    benchmark.extra_info["import_duration"] = duration
+
+
+def test_app_import(benchmark):
+    duration, modules, resources = benchmark.pedantic(
+        measure_startup, args=("import minihai.app",), rounds=5
+    )
+    benchmark.extra_info["import_duration"] = duration
@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+from minihai import conf
+from minihai.lib.aio import BoundedExecutor
+from minihai.services.io import docker_executor
+from minihai_tests.utils import FakeContainer, FakeDockerClient, create_execution
+
+
+def test_bounded_executor_limits_concurrency():
+    executor = BoundedExecutor(lambda: 2, "test")
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def work(n):
+        with lock:
+            running.append(n)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(n)
+        return n
+
+    async def main():
+        return await asyncio.gather(*(executor.run(work, n) for n in range(10)))
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(main()) == list(range(10))
+    finally:
+        loop.close()
+        executor.shutdown()
+    assert max(peak) == 2
+
+
+def test_live_events_go_through_docker_executor(data_path, client, monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setitem(vars(conf), "docker_client", docker_client)
+    threads = []
+    original_logs = FakeContainer.logs
+
+    def logs(self, **kwargs):
+        threads.append(threading.current_thread().name)
+        return original_logs(self, **kwargs)
+
+    monkeypatch.setattr(FakeContainer, "logs", logs)
+    execution = create_execution()
+    docker_client.containers.add(FakeContainer(id="c0", state={"Status": "running"}))
+    execution.update_metadata({"container_id": "c0"})
+    resp = client.get(f"/api/v0/executions/{execution.id}/events/").json()
+    assert [e["message"] for e in resp["events"]] == ["hello"]
+    assert threads and all(
+        name.startswith(docker_executor.thread_name_prefix) for name in threads
+    )
+    detail = client.get(f"/api/v0/executions/{execution.id}/").json()
+    assert detail["status"] == "started"
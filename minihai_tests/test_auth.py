@@ -0,0 +1,66 @@
+import time
+
+import jwt
+import pytest
+
+from minihai import conf
+from minihai.app import auth
+from minihai.lib import passwords
+from minihai.lib.lru import LRUCache
+from minihai.lib.passwords import hash_password, verify_password
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing(monkeypatch):
+    monkeypatch.setattr(passwords, "PBKDF2_ITERATIONS", 1000)
+
+
+def test_passwords():
+    hashed = hash_password("teatime")
+    assert hashed != "teatime"
+    assert verify_password("teatime", hashed)
+    assert not verify_password("coffee", hashed)
+    assert verify_password("teatime", "teatime")  # Plain text is still accepted.
+    assert not verify_password("teatime", "pbkdf2_sha256$garbage")
+
+
+def test_token_auth(data_path, client, monkeypatch):
+    monkeypatch.setattr(conf.settings, "auth", {"arthur": hash_password("teatime")})
+    resp = client.post(
+        "/api/v0/get-token/", data={"username": "arthur", "password": "coffee"}
+    )
+    assert resp.status_code == 400
+    resp = client.post(
+        "/api/v0/get-token/", data={"username": "arthur", "password": "teatime"}
+    )
+    token = resp.json()["token"]
+    payload = jwt.decode(token, key=conf.settings.jwt_secret, algorithms=["HS256"])
+    assert payload["exp"] > time.time()
+
+    headers = {"Authorization": f"Token {token}"}
+    assert client.get("/api/v0/executions/", headers=headers).status_code == 200
+    assert client.get("/api/v0/executions/", headers=headers).status_code == 200
+    assert auth.get_token_cache().hits == 1
+
+    # Changing the password invalidates both the cache and the token.
+    monkeypatch.setattr(conf.settings, "auth", {"arthur": hash_password("towel")})
+    assert client.get("/api/v0/executions/", headers=headers).status_code == 401
+
+    monkeypatch.setattr(conf.settings, "token_ttl", -10)
+    monkeypatch.setattr(conf.settings, "auth", {"arthur": "towel"})
+    expired_token = auth.create_user_access_token("arthur")
+    headers = {"Authorization": f"Token {expired_token}"}
+    assert client.get("/api/v0/executions/", headers=headers).status_code == 401
+
+
+def test_lru_expiry(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "time", lambda: now)
+    cache = LRUCache(maxsize=10)
+    cache.set("a", 1, expires=1010)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    now = 1010.0
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert len(cache) == 1
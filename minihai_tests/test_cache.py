@@ -1,6 +1,9 @@
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from minihai.lib.cache import Cache
+from minihai.lib.sqlite import ConnectionPerThread
 
 
 def test_cache(tmpdir):
@@ -16,3 +19,62 @@ def test_cache(tmpdir):
     c1.set_many({"yay": "hernekeitto", "foop": "teline"})
     assert c1.get("yay") == "hernekeitto"
     assert c1.get("foop") == "teline"
+
+
+def test_cache_get_many_and_stats(tmpdir):
+    conn = sqlite3.connect(str(tmpdir.join("cache.sqlite3")))
+    cache = Cache(db=conn, name="many", memory_size=2)
+    cache.set_many({f"k{i}": i for i in range(5)})
+    assert cache.get_many(["k0", "k3", "nope"]) == {"k0": 0, "k3": 3}
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cache.stats["memory"]["size"] == 2
+    # Another connection sees the committed entries.
+    other = Cache(db=sqlite3.connect(str(tmpdir.join("cache.sqlite3"))), name="many")
+    assert other.get("k4") == 4
+
+
+def test_cache_eviction(tmpdir, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(time, "time", lambda: now)
+    db = ConnectionPerThread(tmpdir.join("cache.sqlite3"))
+    cache = Cache(db=db, name="evict", ttl=60, max_entries=3, eviction_interval=100)
+    cache.set_many({"a": 1, "b": 2})
+    now += 30
+    cache.set_many({"c": 3, "d": 4})
+    assert cache.get("a") == 1
+    now += 40
+    assert cache.get("a") is None  # Expired, even though it's still stored.
+    assert cache.get("c") == 3
+    cache.set("e", 5)
+    assert cache.evict() == 2
+    assert cache.evictions == 2
+    assert cache.get_many(["a", "b", "c", "d", "e"]) == {"c": 3, "d": 4, "e": 5}
+    cache.set("f", 6)
+    assert cache.evict() == 1
+    assert sorted(cache.get_many(["c", "d", "e", "f"])) == ["d", "e", "f"]
+
+
+def test_cache_transaction(tmpdir):
+    cache = Cache(db=ConnectionPerThread(tmpdir.join("cache.sqlite3")), name="tx")
+    with cache.transaction():
+        cache.set("a", 1)
+        cache.set("b", 2)
+    try:
+        with cache.transaction():
+            cache.set("c", 3)
+            raise RuntimeError("nope")
+    except RuntimeError:
+        pass
+    assert cache.get_many(["a", "b", "c"]) == {"a": 1, "b": 2}
+
+
+def test_cache_threads(tmpdir):
+    cache = Cache(db=ConnectionPerThread(tmpdir.join("cache.sqlite3")), name="threads")
+
+    def work(n):
+        cache.set_many({f"{n}-{i}": i for i in range(50)})
+        return cache.get_many(f"{n}-{i}" for i in range(50))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(work, range(16)))
+    assert all(len(result) == 50 for result in results)
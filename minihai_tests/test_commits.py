@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+
+from minihai import consts
+from minihai.lib.lru import LRUCache
+from minihai.models import commit as commit_module
+from minihai.models.commit import Commit
+from minihai_tests.utils import create_commit, make_tarball
+
+IMPORT_URL = f"/api/v0/projects/{consts.PROJECT_ID}/import-package/"
+
+
+def upload(client, tarball: bytes):
+    return client.post(IMPORT_URL, files={"data": ("commit.tgz", tarball)})
+
+
+def test_import_package(data_path, client):
+    files = {"valohai.yaml": b"- step: {name: x, image: y, command: z}"}
+    tarball = make_tarball(files, mode="w:gz")
+    resp = upload(client, tarball)
+    assert resp.status_code == 200
+    commit_id = resp.json()["identifier"]
+    assert commit_id == f"~{hashlib.sha256(tarball).hexdigest()}"
+    assert resp.json()["size"] == len(tarball)
+    commit = Commit.load(commit_id)
+    # Stored uncompressed, so it can be seeked into.
+    assert commit.tarball_path.read_bytes() == gzip.decompress(tarball)
+    assert commit.valohai_yaml_path.read_bytes() == files["valohai.yaml"]
+    assert commit.load_config().steps["x"].image == "y"
+
+    # Re-uploading the same tarball just returns the existing commit.
+    resp2 = upload(client, tarball)
+    assert resp2.status_code == 200
+    assert resp2.json() == resp.json()
+    assert [p.name for p in data_path.iterdir() if p.name.startswith("upload-")] == []
+
+
+def test_import_package_without_valohai_yaml(data_path, client):
+    resp = upload(client, make_tarball({"foo.py": b""}))
+    assert resp.status_code == 400
+    assert upload(client, b"not a tarball").status_code == 400
+
+
+def test_config_cache(data_path, monkeypatch):
+    monkeypatch.setattr(commit_module, "_config_cache", LRUCache(maxsize=1))
+    cache = commit_module.get_config_cache()
+    commits = [
+        create_commit(
+            {"valohai.yaml": f"- step: {{name: s{n}, image: y, command: z}}".encode()},
+            id=f"~c{n}",
+        )
+        for n in range(2)
+    ]
+    assert commits[0].load_config() is commits[0].load_config()
+    assert cache.stats["hits"] == 1
+    assert cache.stats["misses"] == 1
+    assert "s1" in commits[1].load_config().steps
+    assert cache.stats["evictions"] == 1
+    assert "s0" in commits[0].load_config().steps
+    assert cache.stats["misses"] == 3
+
+
+def test_commit_files(data_path, client):
+    files = {
+        "valohai.yaml": b"---",
+        "./src/train.py": b"print('hello')",
+        "data/big.bin": bytes(range(256)) * 1000,
+    }
+    commit_id = upload(client, make_tarball(files, mode="w:bz2")).json()["identifier"]
+    resp = client.get(f"/api/v0/commits/{commit_id}/files/").json()
+    assert {entry["name"]: entry["size"] for entry in resp["results"]} == {
+        "valohai.yaml": 3,
+        "src/train.py": 14,
+        "data/big.bin": 256000,
+    }
+    for name in ("src/train.py", "data/big.bin"):
+        resp = client.get(f"/api/v0/commits/{commit_id}/files/{name}")
+        content = files.get(name, files.get(f"./{name}"))
+        assert resp.content == content
+        assert resp.headers["etag"] == f'"{hashlib.sha256(content).hexdigest()}"'
+    assert client.get(f"/api/v0/commits/{commit_id}/files/nope").status_code == 404
+
+
+def test_legacy_commit_manifest(data_path, client):
+    tarball = make_tarball({"valohai.yaml": b"---", "a.txt": b"aaa"}, mode="w:gz")
+    commit = Commit.create_with_metadata(id="~legacy", data={})
+    commit.tarball_path.write_bytes(tarball)
+    resp = client.get(f"/api/v0/commits/~legacy/files/a.txt")
+    assert resp.content == b"aaa"
+    assert commit.manifest_path.exists()
+    assert commit.tarball_path.read_bytes() == gzip.decompress(tarball)
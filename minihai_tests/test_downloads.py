@@ -0,0 +1,91 @@
+from urllib.parse import urlsplit
+
+from minihai import conf
+from minihai.app.auth import create_user_access_token
+from minihai_tests.utils import create_execution
+
+CONTENT = bytes(range(256)) * 40
+
+
+def create_output(name: str = "model.bin"):
+    execution = create_execution()
+    (execution.outputs_path / name).write_bytes(CONTENT)
+    execution.update_metadata({"container_exit_code": 0})
+    return (
+        execution,
+        f"/data/execution/{execution.id[:8]}/{execution.id}/outputs/{name}",
+    )
+
+
+def test_download(data_path, client):
+    execution, url = create_output()
+    resp = client.get(url)
+    assert resp.status_code == 200
+    assert resp.content == CONTENT
+    assert resp.headers["accept-ranges"] == "bytes"
+    etag = resp.headers["etag"]
+
+    resp = client.head(url)
+    assert resp.status_code == 200
+    assert resp.headers["content-length"] == str(len(CONTENT))
+    assert not resp.content
+
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    last_modified = resp.headers["last-modified"]
+    assert (
+        client.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    )
+    assert client.get(url, headers={"If-None-Match": '"nope"'}).status_code == 200
+
+
+def test_download_range(data_path, client):
+    execution, url = create_output()
+    resp = client.get(url, headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.content == CONTENT[100:200]
+    assert resp.headers["content-range"] == f"bytes 100-199/{len(CONTENT)}"
+
+    resp = client.get(url, headers={"Range": "bytes=10000-"})
+    assert resp.content == CONTENT[10000:]
+    resp = client.get(url, headers={"Range": "bytes=-5"})
+    assert resp.content == CONTENT[-5:]
+    resp = client.get(url, headers={"Range": "bytes=100-", "If-Range": '"stale"'})
+    assert resp.status_code == 200
+    assert resp.content == CONTENT
+    resp = client.get(url, headers={"Range": "bytes=99999-"})
+    assert resp.status_code == 416
+
+
+def test_download_symlinks(data_path, client):
+    execution, url = create_output()
+    (data_path / "jwt_secret.json").write_text('{"secret": "hunter2"}')
+    # Symlinks leading outside the outputs directory aren't followed...
+    (execution.outputs_path / "leak.txt").symlink_to("../../../../jwt_secret.json")
+    assert client.get(url.replace("model.bin", "leak.txt")).status_code == 404
+    (execution.outputs_path / "abs.txt").symlink_to(data_path / "jwt_secret.json")
+    assert client.get(url.replace("model.bin", "abs.txt")).status_code == 404
+    # ...but those within it are.
+    (execution.outputs_path / "link.bin").symlink_to("model.bin")
+    assert client.get(url.replace("model.bin", "link.bin")).content == CONTENT
+
+
+def test_download_access(data_path, client, monkeypatch):
+    execution, url = create_output()
+    assert client.get(url.replace("model.bin", "../metadata.json")).status_code == 404
+    assert client.get("/data/jwt_secret.json").status_code == 404
+
+    monkeypatch.setattr(conf.settings, "auth", {"arthur": "teatime"})
+    assert client.get(url).status_code == 401
+    token = create_user_access_token("arthur")
+    headers = {"Authorization": f"Token {token}"}
+    assert client.get(url, headers=headers).status_code == 200
+
+    resp = client.get(f"/api/v0/data/?output_execution={execution.id}", headers=headers)
+    output_id = resp.json()["results"][0]["id"]
+    resp = client.get(f"/api/v0/data/{output_id}/download/", headers=headers)
+    download_url = urlsplit(resp.json()["url"])
+    signed_url = f"{download_url.path}?{download_url.query}"
+    assert client.get(signed_url).content == CONTENT
+    assert (
+        client.get(signed_url.replace("signature=", "signature=0")).status_code == 403
+    )
@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from minihai import conf
+from minihai.lib.compression import get_codec
+from minihai.lib.events import paginate_events
+from minihai.lib.logstore import LogArchive
+from minihai_tests.utils import create_execution, find_log_path, open_decompressed
+
+
+def make_events(n: int) -> list:
+    return [
+        {
+            "stream": "stdout",
+            "message": f"line {i}",
+            "time": f"2020-01-01T00:00:{i:02d}.000000000",
+        }
+        for i in range(n)
+    ]
+
+
+def test_archived_log_pagination(data_path, client):
+    execution = create_execution()
+    execution.all_json_log_path.write_text(json.dumps(make_events(5)))
+    url = f"/api/v0/executions/{execution.id}/events/"
+
+    resp = client.get(url, params={"limit": 2}).json()
+    assert [e["message"] for e in resp["events"]] == ["line 3", "line 4"]
+    assert resp["truncated"]
+    assert resp["total"] == 5
+    assert resp["next_since"] == "2020-01-01T00:00:04.000000000"
+
+    resp = client.get(url, params={"limit": 2, "offset": 2}).json()
+    assert [e["message"] for e in resp["events"]] == ["line 2", "line 3"]
+    assert resp["truncated"]
+
+    resp = client.get(url, params={"since": "2020-01-01T00:00:02.000000000"}).json()
+    assert [e["message"] for e in resp["events"]] == ["line 3", "line 4"]
+    assert not resp["truncated"]
+
+    resp = client.get(url, params={"since": resp["next_since"]}).json()
+    assert resp["events"] == []
+    assert client.get(url, params={"since": "yesterday"}).status_code == 400
+    assert resp["next_since"] == "2020-01-01T00:00:04.000000000"
+
+    # Polling with a smaller `limit` than the new events picks up where it left off.
+    since = "2020-01-01T00:00:00.000000000"
+    resp = client.get(url, params={"since": since, "limit": 2}).json()
+    assert [e["message"] for e in resp["events"]] == ["line 1", "line 2"]
+    assert resp["truncated"]
+    resp = client.get(url, params={"since": resp["next_since"], "limit": 2}).json()
+    assert [e["message"] for e in resp["events"]] == ["line 3", "line 4"]
+    assert not resp["truncated"]
+
+
+def test_no_events(data_path, client):
+    execution = create_execution()
+    resp = client.get(f"/api/v0/executions/{execution.id}/events/").json()
+    assert resp["events"][0]["stream"] == "status"
+    assert not resp["truncated"]
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_log_archive(tmp_path, compression):
+    archive = LogArchive(tmp_path / "log", codec=get_codec(compression))
+    assert not archive.exists
+    events = make_events(50)
+    archive.write(events, interval=7)
+    assert archive.count == 50
+    assert list(archive.iterate()) == events
+    assert list(archive.iterate(13, 22)) == events[13:22]
+    assert list(archive.iterate(48, 100)) == events[48:]
+    assert archive.find_since(events[20]["time"]) == 21
+    assert archive.find_since("1999") == 0
+    assert archive.find_since("2099") == 50
+    page = archive.get_page(since=events[40]["time"], limit=3)
+    assert page.events == events[41:44]
+    assert (page.total, page.start) == (9, 0)
+    page = archive.get_page(since=events[40]["time"], offset=0, limit=3)
+    assert page.events == events[41:44]
+
+
+def test_log_json_migration(data_path):
+    execution = create_execution()
+    execution.all_json_log_path.write_text(json.dumps(make_events(3)))
+    assert execution.get_logs().total == 3
+    assert not execution.all_json_log_path.exists()
+    assert execution.log_archive.exists
+    assert not execution.migrate_json_log()
+
+
+def test_compact_logs(data_path, monkeypatch):
+    monkeypatch.setattr(conf.settings, "log_compression", "none")
+    execution = create_execution()
+    execution.all_json_log_path.write_text(json.dumps(make_events(3)))
+    execution.get_log_path("stdout").write_bytes(b"hello\n")
+    assert execution.migrate_json_log()
+    assert execution.log_archive.data_path.name == "log.jsonl"
+
+    monkeypatch.setattr(conf.settings, "log_compression", "gzip")
+    assert execution.compact_logs()
+    assert not execution.compact_logs()
+    assert execution.log_archive.data_path.name == "log.jsonl.gz"
+    assert not (execution.path / "log.jsonl").exists()
+    assert [e["message"] for e in execution.get_logs().events] == [
+        "line 0",
+        "line 1",
+        "line 2",
+    ]
+    stdout_path = find_log_path(execution, "stdout")
+    assert stdout_path.name == "stdout.log.gz"
+    with open_decompressed(stdout_path) as fp:
+        assert fp.read() == b"hello\n"
+
+
+def test_paginate_event_stream():
+    events = make_events(10)
+    page = paginate_events(iter(events), offset=None, limit=3)
+    assert (page.events, page.total, page.start) == (events[7:], 10, 7)
+    page = paginate_events(iter(events), offset=2, limit=3)
+    assert (page.events, page.total, page.start) == (events[2:5], 10, 2)
+    page = paginate_events(iter(events), offset=None, limit=None)
+    assert (page.events, page.total, page.start) == (events, 10, 0)
@@ -0,0 +1,20 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from minihai import conf
+from minihai.services import docker as docker_service
+from minihai_tests.utils import FakeDockerClient
+
+
+def test_concurrent_image_pulls_are_deduplicated(monkeypatch):
+    client = FakeDockerClient()
+    client.images.pull_delay = 0.1
+    monkeypatch.setitem(vars(conf), "docker_client", client)
+    monkeypatch.setattr(docker_service, "_image_ids", {})
+    images = ["busybox:latest"] * 8 + ["python:3.9"] * 2
+    with ThreadPoolExecutor(max_workers=10) as executor:
+        image_ids = list(executor.map(docker_service.resolve_image, images))
+    assert image_ids == [f"sha256:{image}" for image in images]
+    assert sorted(client.images.pulls) == ["busybox:latest", "python:3.9"]
+    # Memoized, so no further pulls.
+    assert docker_service.resolve_image("busybox:latest") == "sha256:busybox:latest"
+    assert len(client.images.pulls) == 2
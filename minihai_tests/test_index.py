@@ -0,0 +1,114 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from minihai import conf
+from minihai.lib.index import Index, InvalidQuery
+from minihai.lib.sequence import Sequence
+from minihai.lib.sqlite import connect
+from minihai.models.execution import Execution
+from minihai_tests.utils import create_execution
+
+
+def test_index(tmpdir):
+    conn = sqlite3.connect(str(tmpdir.join("index.sqlite3")))
+    index = Index(db=conn, name="things", columns={"size": "INTEGER", "commit": "TEXT"})
+    index.update_many({f"t{n}": {"size": n, "commit": f"c{n % 2}"} for n in range(10)})
+    assert index.count() == 10
+    assert index.count(commit="c1") == 5
+    assert index.query(ordering=["-size"], limit=3) == ["t9", "t8", "t7"]
+    assert index.query(ordering=["size"], limit=2, offset=2, commit="c0") == [
+        "t4",
+        "t6",
+    ]
+    index.update("t9", {"size": -1, "commit": "c1"})
+    assert index.query(ordering=["size"], limit=1) == ["t9"]
+    with pytest.raises(InvalidQuery):
+        index.query(ordering=["nope"])
+
+
+def test_index_upgrade_by_concurrent_processes(tmpdir):
+    path = str(tmpdir.join("index.sqlite3"))
+    Index(db=connect(path), name="things", columns={"size": "INTEGER"})
+    barrier = threading.Barrier(8)
+
+    def upgrade(n):
+        # Separate connections, like separate worker processes would have.
+        columns = {"size": "INTEGER", "commit": "TEXT", "step": "TEXT"}
+        db = connect(path, check_same_thread=False)
+        barrier.wait()
+        return Index(db=db, name="things", columns=columns)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        indexes = list(executor.map(upgrade, range(8)))
+    indexes[0].update("t0", {"size": 1, "commit": "c0", "step": "train"})
+    assert indexes[-1].query(commit="c0", step="train") == ["t0"]
+
+
+def test_list_executions(data_path, client):
+    for n in range(5):
+        create_execution(step=("train" if n % 2 else "evaluate"))
+    resp = client.get("/api/v0/executions/?limit=2").json()
+    assert resp["count"] == 5
+    assert [e["counter"] for e in resp["results"]] == [5, 4]
+    assert resp["previous"] is None
+    resp = client.get(resp["next"]).json()
+    assert [e["counter"] for e in resp["results"]] == [3, 2]
+    assert "offset" not in resp["previous"]
+    resp = client.get("/api/v0/executions/?step=train&ordering=counter").json()
+    assert [e["counter"] for e in resp["results"]] == [2, 4]
+    assert all(e["status"] == "queued" for e in resp["results"])
+    assert client.get("/api/v0/executions/?ordering=foo").status_code == 400
+
+    # Like valohai-cli would ask.
+    Execution.load(
+        client.get("/api/v0/executions/?limit=1").json()["results"][0]["id"]
+    ).update_metadata({"container_id": "c0"})
+    resp = client.get("/api/v0/executions/?limit=9001&status=incomplete").json()
+    assert resp["count"] == 5
+    assert {e["status"] for e in resp["results"]} == {"queued", "started"}
+    resp = client.get("/api/v0/executions/?status=started&status=complete").json()
+    assert [e["counter"] for e in resp["results"]] == [5]
+
+
+def test_rebuild_index(data_path):
+    for n in range(3):
+        create_execution(step="train")
+    Execution.get_index().clear()
+    assert Execution.get_index().count() == 0
+    assert Execution.rebuild_index() == 3
+    assert Execution.get_index().count(status="queued") == 3
+
+
+def test_new_index_is_filled_in(data_path, monkeypatch):
+    for n in range(3):
+        create_execution(step="train")
+    # e.g. a data directory from before the index existed
+    db = connect(data_path / "new-index.sqlite3", check_same_thread=False)
+    monkeypatch.setitem(vars(conf), "index_db", db)
+    assert Execution.get_index().count(status="queued") == 3
+    db.close()
+
+
+def test_sequence(tmpdir):
+    db = sqlite3.connect(str(tmpdir.join("index.sqlite3")), check_same_thread=False)
+    sequence = Sequence(db=db, name="things")
+    assert sequence.current is None
+    assert sequence.next(seed=lambda: 41) == 42
+    with ThreadPoolExecutor(8) as executor:
+        values = list(executor.map(lambda n: sequence.next(), range(200)))
+    assert sorted(values) == list(range(43, 243))
+    assert sequence.seed(100) == 242
+    assert sequence.seed(1000) == 1000
+    assert sequence.next() == 1001
+
+
+def test_counter_seeded_from_existing_executions(data_path):
+    for n in range(3):
+        create_execution(step="train")
+    db = Execution.get_sequence("counter").db
+    with db:
+        db.execute("DELETE FROM sequences")
+    assert create_execution(step="train").metadata["counter"] == 4
@@ -0,0 +1,70 @@
+import json
+import threading
+
+from minihai import conf
+from minihai.models import base
+from minihai.models.commit import Commit
+
+
+def test_batched_metadata_writes(data_path, monkeypatch):
+    commit = Commit.create_with_metadata(id="~abc", data={"size": 1})
+    writes = []
+    original_atomic_write = base.atomic_write
+    monkeypatch.setattr(
+        base,
+        "atomic_write",
+        lambda *args, **kwargs: (
+            writes.append(args[0]),
+            original_atomic_write(*args, **kwargs),
+        ),
+    )
+    with commit.batch_metadata():
+        commit.update_metadata({"a": 1})
+        with commit.batch_metadata():
+            commit.update_metadata({"b": 2})
+        commit.update_metadata({"a": 3})
+        assert commit.metadata["b"] == 2
+        assert not writes
+    assert len(writes) == 1
+    assert Commit(id="~abc").metadata == {
+        "id": "~abc",
+        "ctime": commit.metadata["ctime"],
+        "size": 1,
+        "a": 3,
+        "b": 2,
+    }
+    assert [p.name for p in commit.path.iterdir()] == ["metadata.json"]
+
+
+def test_compact_metadata(data_path, monkeypatch):
+    monkeypatch.setattr(conf.settings, "metadata_compact", True)
+    commit = Commit.create_with_metadata(id="~abc", data={"size": 1})
+    assert b"\n" not in commit.metadata_path.read_bytes()
+    assert Commit(id="~abc").metadata["size"] == 1
+
+
+def test_concurrent_readers_see_complete_metadata(data_path):
+    commit = Commit.create_with_metadata(id="~abc", data={"n": 0})
+    payload = "x" * 100_000
+    stop = threading.Event()
+    errors = []
+
+    def read():
+        while not stop.is_set():
+            try:
+                json.loads(commit.metadata_path.read_text())
+            except Exception as exc:  # pragma: no cover
+                errors.append(exc)
+
+    readers = [threading.Thread(target=read) for x in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for n in range(50):
+            commit.update_metadata({"n": n, "payload": payload})
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert not errors
+    assert Commit(id="~abc").metadata["n"] == 49
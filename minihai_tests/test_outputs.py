@@ -0,0 +1,189 @@
+import hashlib
+import io
+import shutil
+import tarfile
+import time
+import zipfile
+
+import pytest
+
+from minihai.lib.archives import iterate_archive
+from minihai.models.execution import Execution
+from minihai.models.output import Output
+from minihai.services.checksums import output_checksummer
+from minihai.services.outputs import OutputWatcher
+from minihai_tests.utils import create_execution
+
+
+def write_outputs(execution, names):
+    for name in names:
+        path = execution.outputs_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(name)
+
+
+def test_list_data(data_path, client):
+    execution = create_execution()
+    write_outputs(execution, ["b.txt", "a/c.txt", "a/b/d.txt"])
+    (execution.outputs_path / "empty").mkdir()
+    execution.update_metadata({"container_exit_code": 0})
+
+    url = "/api/v0/data/"
+    resp = client.get(url, params={"output_execution": execution.id}).json()
+    assert resp["count"] == 3
+    assert [o["name"] for o in resp["results"]] == ["a/b/d.txt", "a/c.txt", "b.txt"]
+    assert Execution.load(execution.id).metadata["outputs_indexed"]
+
+    resp = client.get(
+        url, params={"output_execution": execution.id, "limit": 2, "offset": 2}
+    ).json()
+    assert [o["name"] for o in resp["results"]] == ["b.txt"]
+    assert resp["previous"]
+
+    output_id = resp["results"][0]["id"]
+    resp = client.get(f"/api/v0/data/{output_id}/download/").json()
+    assert resp["url"].endswith(f"/{execution.id}/outputs/b.txt")
+
+
+def test_index_outputs(data_path):
+    execution = create_execution()
+    write_outputs(execution, ["a.txt", "b.txt"])
+    (execution.outputs_path / "link.txt").symlink_to("a.txt")
+    (execution.outputs_path / "secret.txt").symlink_to(data_path / "jwt_secret.json")
+    assert execution.index_outputs() == 2
+    (execution.outputs_path / "a.txt").unlink()
+    assert execution.index_outputs() == 1
+    outputs = Output.list_for_execution(execution.id)
+    assert [output.name for output in outputs] == ["b.txt"]
+    assert Output.find(outputs[0].id) == outputs[0]
+    # Listed by name straight from the index, without sorting.
+    index = Output.get_index()
+    plan = index.db.execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM output WHERE execution_id = ? ORDER BY name",
+        [execution.id],
+    ).fetchall()
+    assert not any("TEMP B-TREE" in row[-1] for row in plan)
+
+
+def test_output_watcher(data_path):
+    pytest.importorskip("inotify_simple")
+    execution = create_execution()
+    write_outputs(execution, ["early.txt"])
+    watcher = OutputWatcher(read_timeout=0.05)
+    watcher.start()
+    try:
+        watcher.watch(execution)
+        assert watcher.is_watching(execution.id)
+        write_outputs(execution, ["late.txt", "sub/dir/deep.txt"])
+        (execution.outputs_path / "early.txt").unlink()
+        link_path = execution.path / "link.txt"
+        link_path.symlink_to("late.txt")
+        link_path.rename(execution.outputs_path / "link.txt")
+        expected = ["late.txt", "sub/dir/deep.txt"]
+        for x in range(100):
+            names = [o.name for o in Output.list_for_execution(execution.id)]
+            if names == expected:
+                break
+            time.sleep(0.05)
+        assert names == expected
+        watcher.unwatch(execution.id)
+        assert not watcher.is_watching(execution.id)
+    finally:
+        watcher.stop()
+
+
+def test_output_watcher_directory_moves(data_path):
+    pytest.importorskip("inotify_simple")
+    execution = create_execution()
+    watcher = OutputWatcher(read_timeout=0.05)
+    watcher.start()
+
+    def wait_for(expected):
+        for x in range(100):
+            names = [o.name for o in Output.list_for_execution(execution.id)]
+            if names == expected:
+                break
+            time.sleep(0.05)
+        assert names == expected
+
+    try:
+        watcher.watch(execution)
+        write_outputs(execution, ["ckpt.tmp/w.bin", "old/a.txt", "old/sub/b.txt"])
+        wait_for(["ckpt.tmp/w.bin", "old/a.txt", "old/sub/b.txt"])
+        outputs_path = execution.outputs_path
+        (outputs_path / "ckpt.tmp").rename(outputs_path / "ckpt")
+        shutil.rmtree(outputs_path / "old")
+        wait_for(["ckpt/w.bin"])
+        # The moved directory is still watched at its new location.
+        write_outputs(execution, ["ckpt/x.bin"])
+        wait_for(["ckpt/w.bin", "ckpt/x.bin"])
+    finally:
+        watcher.stop()
+
+
+def test_output_checksums(data_path, client):
+    execution = create_execution()
+    write_outputs(execution, ["a.txt"])
+    execution.update_metadata({"container_exit_code": 0})
+    url = "/api/v0/data/"
+    resp = client.get(url, params={"output_execution": execution.id}).json()
+    assert resp["results"][0]["checksums"] == {}
+    output_checksummer.wait()
+
+    resp = client.get(url, params={"output_execution": execution.id}).json()
+    assert resp["results"][0]["checksums"] == {
+        "sha256": hashlib.sha256(b"a.txt").hexdigest(),
+        "md5": hashlib.md5(b"a.txt").hexdigest(),
+    }
+    outputs = Output.list_for_execution(execution.id)
+    assert output_checksummer.schedule(outputs) == 0
+
+    # Changing the file invalidates the memoized checksums.
+    (execution.outputs_path / "a.txt").write_text("changed!")
+    execution.index_outputs()
+    assert output_checksummer.schedule(Output.list_for_execution(execution.id)) == 1
+    output_checksummer.wait()
+
+
+@pytest.mark.parametrize("format", ["tar", "tar.gz", "zip"])
+def test_output_archive(data_path, client, format):
+    execution = create_execution()
+    write_outputs(execution, ["a.csv", "sub/b.csv", "c.txt"])
+    (execution.outputs_path / "big.csv").write_bytes(bytes(range(256)) * 10000)
+    execution.update_metadata({"container_exit_code": 0})
+    resp = client.get(
+        "/api/v0/data/archive/",
+        params={"output_execution": execution.id, "filter": "*.csv", "format": format},
+    )
+    assert resp.status_code == 200
+    if format == "zip":
+        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+            files = {name: zf.read(name) for name in zf.namelist()}
+    else:
+        with tarfile.open(fileobj=io.BytesIO(resp.content)) as tf:
+            files = {m.name: tf.extractfile(m).read() for m in tf.getmembers()}
+    assert sorted(files) == ["a.csv", "big.csv", "sub/b.csv"]
+    assert files["sub/b.csv"] == b"sub/b.csv"
+    assert files["big.csv"] == bytes(range(256)) * 10000
+
+
+@pytest.mark.parametrize("format", ["tar", "zip"])
+def test_output_archive_symlinks(data_path, format):
+    execution = create_execution()
+    write_outputs(execution, ["a.txt", "b.txt"])
+    (data_path / "secret.txt").write_text("secret")
+    # e.g. replaced by symlinks after being indexed
+    (execution.outputs_path / "a.txt").unlink()
+    (execution.outputs_path / "a.txt").symlink_to("../../../../secret.txt")
+    (execution.outputs_path / "c.txt").symlink_to("b.txt")
+    members = [
+        (name, execution.outputs_path / name) for name in ("a.txt", "b.txt", "c.txt")
+    ]
+    content = b"".join(iterate_archive(members, format, root=execution.outputs_path))
+    if format == "zip":
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            files = {name: zf.read(name) for name in zf.namelist()}
+    else:
+        with tarfile.open(fileobj=io.BytesIO(content)) as tf:
+            files = {m.name: tf.extractfile(m).read() for m in tf.getmembers()}
+    assert files == {"b.txt": b"b.txt", "c.txt": b"b.txt"}
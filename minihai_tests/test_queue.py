@@ -0,0 +1,182 @@
+import threading
+
+from minihai import conf, consts
+from minihai.models.execution import Execution
+from minihai.services import queue
+from minihai.services.reconciler import rescan_executions
+from minihai_tests.utils import (
+    FakeContainer,
+    FakeDockerClient,
+    create_commit,
+    create_execution,
+)
+
+
+def test_queue_dispatch(data_path, monkeypatch):
+    started = []
+    gate = threading.Event()
+
+    def fake_start_execution(execution):
+        gate.wait()
+        if execution.metadata["step"] == "broken":
+            raise RuntimeError("Nope")
+        started.append(execution.id)
+        execution.update_metadata({"container_id": f"c-{execution.id}"})
+
+    monkeypatch.setattr(queue, "start_execution", fake_start_execution)
+    monkeypatch.setattr(queue, "has_host_headroom", lambda: True)
+    monkeypatch.setattr(conf.settings, "max_concurrent_executions", 2)
+    broken = create_execution(step="broken")
+    executions = [create_execution() for x in range(3)]
+    info = queue.get_queue_info(Execution.load(executions[2].id))
+    assert info["queue_position"] == 4
+
+    execution_queue = queue.ExecutionQueue()
+    # Executions count against the limit while they're booting...
+    assert execution_queue.dispatch() == 2
+    gate.set()
+    execution_queue.wait_for_boots()
+    assert started == [executions[0].id]
+    # ... but failing to boot frees up the slot.
+    assert execution_queue.dispatch() == 1
+    execution_queue.wait_for_boots()
+    assert started == [executions[0].id, executions[1].id]
+    broken = Execution.load(broken.id)
+    assert broken.status == "error"
+    assert broken.metadata["error_message"] == "Nope"
+
+    # At capacity, nothing gets dispatched...
+    assert execution_queue.dispatch() == 0
+    info = queue.get_queue_info(Execution.load(executions[2].id))
+    assert info["queue_position"] == 1
+
+    # ... until something finishes.
+    Execution.load(executions[0].id).update_metadata({"container_exit_code": 0})
+    assert execution_queue.dispatch() == 1
+    execution_queue.wait_for_boots()
+    assert started[-1] == executions[2].id
+    info = queue.get_queue_info(Execution.load(executions[2].id))
+    assert info["queue_position"] is None
+    assert info["queue_wait_seconds"] >= 0
+
+    # Executions never dequeued (e.g. from before the queue) have no known wait.
+    legacy = create_execution()
+    legacy.update_metadata({"container_id": "c-legacy", "container_exit_code": 0})
+    info = queue.get_queue_info(Execution.load(legacy.id))
+    assert info == {"queue_position": None, "queue_wait_seconds": None}
+
+
+def test_create_execution_returns_queued(data_path, client, monkeypatch):
+    from minihai.models.commit import Commit
+
+    Commit.create_with_metadata(id="~foo", data={})
+    (Commit(id="~foo").tarball_path).write_bytes(b"")
+    resp = client.post(
+        "/api/v0/executions/",
+        json={
+            "commit": "~foo",
+            "project": str(consts.PROJECT_ID),
+            "environment": str(consts.ENVIRONMENT_ID),
+            "inputs": {},
+            "parameters": {},
+            "environment_variables": {},
+            "step": "train",
+            "image": "busybox",
+        },
+    )
+    assert resp.status_code == 201
+    assert resp.json()["status"] == "queued"
+    assert resp.json()["queue_position"] == 1
+
+
+def test_boot_records_progress(data_path, monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setitem(vars(conf), "docker_client", docker_client)
+    create_commit(
+        {"valohai.yaml": b"- step: {name: train, image: busybox, command: 'true'}"}
+    )
+    execution = create_execution()
+    seen = {}
+
+    def start(container):
+        # Whatever happens from here on, the container has been recorded.
+        stored = Execution.load(execution.id)
+        seen.update(status=stored.status, metadata=stored.metadata)
+        container.attrs["State"] = {"Status": "exited", "ExitCode": 0}
+
+    monkeypatch.setattr(FakeContainer, "start", start)
+    monkeypatch.setattr(queue.output_watcher, "watch", lambda execution: None)
+    queue.boot_execution(execution)
+    assert seen["status"] == "started"
+    assert seen["metadata"][queue.DEQUEUED_AT_METADATA_KEY]
+    assert seen["metadata"]["container_id"] == "c0"
+
+
+def test_boot_recovers_from_interruptions(data_path, monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setitem(vars(conf), "docker_client", docker_client)
+    monkeypatch.setattr(queue.output_watcher, "watch", lambda execution: None)
+    create_commit(
+        {"valohai.yaml": b"- step: {name: train, image: busybox, command: 'true'}"}
+    )
+    # Interrupted after the container was created and recorded, but before it started...
+    recorded, running = create_execution(), create_execution()
+    for execution, status in [(recorded, "created"), (running, "running")]:
+        container = docker_client.containers.add(
+            FakeContainer(
+                f"old-{execution.id}",
+                state={"Status": status},
+                name=f"minihai-{execution.id}",
+            )
+        )
+        execution.update_metadata({"container_id": container.id})
+    assert queue.recover_interrupted_boots() == 1
+    assert Execution.load(recorded.id).status == "queued"
+    assert docker_client.containers.get(f"old-{running.id}")
+    assert docker_client.containers.containers[f"old-{recorded.id}"].removed
+    assert Execution.load(running.id).status == "started"
+    # ... or before it was even recorded.
+    unrecorded = create_execution()
+    stale = docker_client.containers.add(
+        FakeContainer(
+            "stale", state={"Status": "created"}, name=f"minihai-{unrecorded.id}"
+        )
+    )
+    for execution in (recorded, unrecorded):
+        queue.boot_execution(Execution.load(execution.id))
+        execution = Execution.load(execution.id)
+        assert execution.status == "started"
+        assert execution.container.attrs["State"]["Status"] == "running"
+    assert stale.removed
+
+
+def test_failed_boot_removes_container(data_path, monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setitem(vars(conf), "docker_client", docker_client)
+    monkeypatch.setattr(queue.output_watcher, "watch", lambda execution: None)
+    create_commit(
+        {"valohai.yaml": b"- step: {name: train, image: busybox, command: 'true'}"}
+    )
+
+    def start(container):
+        raise RuntimeError("Could not start")
+
+    monkeypatch.setattr(FakeContainer, "start", start)
+    execution = create_execution()
+    queue.boot_execution(execution)
+    execution = Execution.load(execution.id)
+    assert execution.status == "error"
+    assert docker_client.containers.containers["c0"].removed
+
+
+def test_lost_containers_free_their_slots(data_path, monkeypatch):
+    monkeypatch.setitem(vars(conf), "docker_client", FakeDockerClient())
+    monkeypatch.setattr(conf.settings, "max_concurrent_executions", 1)
+    lost = create_execution()
+    lost.update_metadata({"container_id": "gone"})
+    create_execution()
+    execution_queue = queue.ExecutionQueue()
+    assert not execution_queue.can_admit()
+    rescan_executions()
+    assert Execution.load(lost.id).status == "error"
+    assert execution_queue.can_admit()
@@ -0,0 +1,90 @@
+from minihai import conf
+from minihai.models.execution import Execution
+from minihai.services.docker import get_container_logs
+from minihai.services.reconciler import (
+    reconcile_execution,
+    reconciler,
+    rescan_executions,
+)
+from minihai_tests.utils import (
+    FakeContainer,
+    FakeDockerClient,
+    create_execution,
+    find_log_path,
+    open_decompressed,
+)
+
+
+def test_reconcile(data_path, monkeypatch):
+    client = FakeDockerClient()
+    monkeypatch.setitem(vars(conf), "docker_client", client)
+    executions = [create_execution(step="train") for x in range(2)]
+    for n, execution in enumerate(executions):
+        client.containers.add(FakeContainer(id=f"c{n}", state={"Status": "running"}))
+        execution.update_metadata({"container_id": f"c{n}"})
+    assert rescan_executions() == 2
+    assert {e.status for e in executions} == {"started"}
+
+    client.containers.containers["c0"].attrs["State"] = {
+        "Status": "exited",
+        "ExitCode": 0,
+    }
+    reconciler.handle_event(
+        {
+            "Type": "container",
+            "Action": "die",
+            "Actor": {
+                "ID": "c0",
+                "Attributes": {"name": f"minihai-{executions[0].id}"},
+            },
+        }
+    )
+    execution = Execution.load(executions[0].id)
+    assert execution.metadata["container_exit_code"] == 0
+    assert execution.status == "complete"
+    assert execution.get_logs().events[0]["message"] == "hello"
+    assert Execution.load(executions[1].id).status == "started"
+    assert rescan_executions() == 1
+
+
+def test_archive_logs(data_path):
+    container = FakeContainer(
+        id="c0",
+        state={"Status": "exited", "ExitCode": 1},
+        output={
+            "stdout": (
+                b"2020-01-01T00:00:01.000000000Z one\n"
+                b"2020-01-01T00:00:03.000000000Z three\n"
+            ),
+            "stderr": (
+                b"2020-01-01T00:00:02.000000000Z two\n"
+                b"2020-01-01T00:00:04.000000000Z four\n"
+            ),
+        },
+    )
+    messages = [event["message"] for event in get_container_logs(container)]
+    assert messages == ["one", "two", "three", "four"]
+    since = "2020-01-01T00:00:02.000000000"
+    assert [e["message"] for e in get_container_logs(container, since=since)] == [
+        "three",
+        "four",
+    ]
+
+    execution = create_execution(step="train")
+    execution.archive_container(container)
+    for stream in ("stdout", "stderr"):
+        with open_decompressed(find_log_path(execution, stream)) as fp:
+            assert fp.read() == container.output[stream]
+    assert [e["message"] for e in execution.get_logs().events] == messages
+    assert execution.metadata["container_exit_code"] == 1
+
+
+def test_reconcile_missing_container(data_path, monkeypatch):
+    monkeypatch.setitem(vars(conf), "docker_client", FakeDockerClient())
+    execution = create_execution()
+    execution.update_metadata({"container_id": "gone"})
+    reconcile_execution(execution.id)
+    execution = Execution.load(execution.id)
+    assert execution.status == "error"
+    assert "disappeared" in execution.get_logs().events[0]["message"]
+    assert rescan_executions() == 0
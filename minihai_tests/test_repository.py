@@ -0,0 +1,65 @@
+from minihai import conf
+from minihai.services import repository
+from minihai.services.execution import REPOSITORY_ROOT, start_execution
+from minihai_tests.utils import FakeDockerClient, create_commit, create_execution
+
+
+def test_repository_cache(data_path, monkeypatch):
+    commit = create_commit({"valohai.yaml": b"---", "src/train.py": b"print(1)"})
+    path = repository.get_cached_repository(commit)
+    assert (path / "src" / "train.py").read_bytes() == b"print(1)"
+    (path / "marker").write_text("not re-extracted")
+    assert repository.get_cached_repository(commit) == path
+    assert (path / "marker").exists()
+
+
+def test_repository_cache_eviction(data_path, monkeypatch):
+    monkeypatch.setattr(conf.settings, "repository_cache_max_size_mb", 1)
+    big = b"x" * 700_000
+    commits = [create_commit({"big": big}, id=f"~c{n}") for n in range(3)]
+    create_execution(commit="~c0")  # in use, so never evicted
+    paths = [repository.get_cached_repository(commit).parent for commit in commits]
+    # Extracting the third commit evicted the least recently used one not in use.
+    assert [path.exists() for path in paths] == [True, False, True]
+    # Still too big, but the in-use commit is never evicted.
+    assert repository.evict_repositories() == 1
+    assert [path.exists() for path in paths] == [True, False, False]
+
+
+def test_repository_overlay_volume(data_path, monkeypatch):
+    docker_client = FakeDockerClient()
+    monkeypatch.setitem(vars(conf), "docker_client", docker_client)
+    monkeypatch.setattr(conf.settings, "repository_cache", True)
+    commit = create_commit(
+        {"valohai.yaml": b"- step: {name: train, image: busybox, command: 'true'}"}
+    )
+    execution = create_execution()
+    container = start_execution(execution)
+    (mount,) = [
+        m for m in container.options["mounts"] if m["Target"] == REPOSITORY_ROOT
+    ]
+    assert mount["Type"] == "volume"
+    options = docker_client.volumes.volumes[mount["Source"]].options
+    assert options["driver_opts"]["type"] == "overlay"
+    lower_path = repository.get_cached_repository(commit).absolute()
+    overlay_path = execution.path.absolute() / repository.OVERLAY_DIRNAME
+    assert options["driver_opts"]["o"] == (
+        f"lowerdir={lower_path},"
+        f"upperdir={overlay_path / 'upper'},"
+        f"workdir={overlay_path / 'work'}"
+    )
+    assert (overlay_path / "upper").is_dir()
+
+
+def test_repository_copy_fallback(data_path, monkeypatch):
+    monkeypatch.setitem(vars(conf), "docker_client", FakeDockerClient())
+    monkeypatch.setattr(conf.settings, "repository_cache", False)
+    create_commit(
+        {"valohai.yaml": b"- step: {name: train, image: busybox, command: 'true'}"}
+    )
+    container = start_execution(create_execution())
+    mounts = container.options["mounts"]
+    # The repository is injected into a plain volume instead.
+    assert [m["Source"] for m in mounts if m["Target"] == REPOSITORY_ROOT] == [
+        f"{container.name}-root"
+    ]
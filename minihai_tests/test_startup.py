@@ -0,0 +1,25 @@
+import pytest
+
+from minihai_tests.utils import measure_startup
+
+
+@pytest.mark.slow
+def test_cli_help_is_light():
+    duration, modules, resources = measure_startup(
+        """
+        from minihai.cli import main
+        try:
+            main(["--help"])
+        except SystemExit:
+            pass
+        """
+    )
+    assert not modules, f"--help imported {modules} ({duration:.3f} s)"
+    assert not resources
+
+
+@pytest.mark.slow
+def test_app_import_initializes_nothing():
+    duration, modules, resources = measure_startup("import minihai.app")
+    assert "docker" not in modules, f"imported docker ({duration:.3f} s)"
+    assert not resources
@@ -0,0 +1,77 @@
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from minihai import conf
+from minihai.models.commit import Commit
+from minihai.services.leadership import LeaderElection
+
+
+def test_concurrent_metadata_updates_are_not_lost(data_path):
+    Commit.create_with_metadata(id="~abc", data={})
+
+    def update(n):
+        # Separate instances, like separate worker processes would have.
+        commit = Commit(id="~abc")
+        for i in range(10):
+            commit.update_metadata({f"{n}-{i}": i})
+
+    threads = [threading.Thread(target=update, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metadata = Commit(id="~abc").metadata
+    assert all(f"{n}-{i}" in metadata for n in range(8) for i in range(10))
+
+
+def test_batched_updates_merge_with_concurrent_updates(data_path):
+    commit = Commit.create_with_metadata(id="~abc", data={})
+    with commit.batch_metadata():
+        commit.update_metadata({"a": 1})
+        Commit(id="~abc").update_metadata({"b": 2})
+    assert Commit(id="~abc").metadata["a"] == 1
+    assert Commit(id="~abc").metadata["b"] == 2
+
+
+def test_concurrent_commit_creations_are_deduplicated(data_path):
+    def create(n):
+        # Bypassing the in-process deduplication, like separate worker processes would.
+        fd, tarball_temp_path = tempfile.mkstemp(dir=conf.settings.data_path)
+        with open(fd, "wb") as fp:
+            fp.write(b"tarball")
+        return Commit._create_from_upload(
+            commit_identifier="~abc",
+            tarball_temp_path=tarball_temp_path,
+            manifest=[],
+            valohai_yaml=b"[]",
+            size=7,
+            description=f"Upload {n}",
+        )
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        commits = list(executor.map(create, range(8)))
+    assert {commit.id for commit in commits} == {"~abc"}
+    assert Commit.load("~abc").metadata["size"] == 7
+
+
+def test_leader_election(data_path):
+    elected = []
+    first = LeaderElection(retry_interval=0.05)
+    second = LeaderElection(retry_interval=0.05)
+    first.start(on_elected=lambda: elected.append("first"))
+    second.start(on_elected=lambda: elected.append("second"))
+    try:
+        assert first.is_leader and second.is_follower
+        assert elected == ["first"]
+        first.stop()
+        for x in range(100):
+            if second.is_leader:
+                break
+            time.sleep(0.05)
+        assert second.is_leader
+        assert elected == ["first", "second"]
+    finally:
+        first.stop()
+        second.stop()
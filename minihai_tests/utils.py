@@ -0,0 +1,242 @@
+import contextlib
+import io
+import json
+import pathlib
+import subprocess
+import sys
+import tarfile
+import textwrap
+import threading
+import time
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+from docker.errors import ImageNotFound, NotFound
+
+from minihai import consts
+from minihai.lib.compression import CODECS
+from minihai.models.commit import Commit
+from minihai.models.execution import Execution, ExecutionCreationData
+
+
+def create_execution(step: str = "train", commit: str = "~foo") -> Execution:
+    return Execution.create(
+        ExecutionCreationData(
+            commit=commit,
+            project=consts.PROJECT_ID,
+            inputs={},
+            parameters={},
+            environment_variables={},
+            step=step,
+            image="busybox",
+            environment=consts.ENVIRONMENT_ID,
+        )
+    )
+
+
+def find_log_path(execution: Execution, stream: str) -> Optional[pathlib.Path]:
+    """
+    Find the raw log file for `stream`, however it's been compressed.
+    """
+    for codec in (None, *CODECS.values()):
+        path = execution.get_log_path(stream, codec)
+        if path.exists():
+            return path
+    return None
+
+
+@contextlib.contextmanager
+def open_decompressed(path: pathlib.Path) -> Iterator[BinaryIO]:
+    """
+    Open a file for reading, decompressing it on the fly according to its suffix.
+    """
+    codec = next((c for c in CODECS.values() if path.name.endswith(c.suffix)), None)
+    with path.open("rb") as fp:
+        if not codec:
+            yield fp
+            return
+        with codec.open_reader(fp) as reader:
+            yield reader
+
+
+def make_tarball(files: Dict[str, bytes], mode: str = "w") -> bytes:
+    bio = io.BytesIO()
+    with tarfile.open(fileobj=bio, mode=mode) as tf:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+    return bio.getvalue()
+
+
+def create_commit(files: Dict[str, bytes], id: str = "~foo") -> Commit:
+    commit = Commit.create_with_metadata(id=id, data={})
+    commit.tarball_path.write_bytes(make_tarball(files))
+    if "valohai.yaml" in files:
+        commit.valohai_yaml_path.write_bytes(files["valohai.yaml"])
+    return commit
+
+
+class FakeContainer:
+    """
+    A stand-in for a docker-py `Container` with canned (timestamped) output.
+    """
+
+    def __init__(
+        self,
+        id: str,
+        state: Optional[dict] = None,
+        output: Optional[Dict[str, bytes]] = None,
+        *,
+        name: Optional[str] = None,
+        chunk_size: int = 7,
+    ):
+        self.id = id
+        self.name = name or id
+        self.attrs = {"State": state or {"Status": "running", "Running": True}}
+        self.output = output or {"stdout": b"2020-01-01T00:00:00.000000000Z hello\n"}
+        # Streamed output is split at awkward places, like a real stream might be.
+        self.chunk_size = chunk_size
+        self.removed = False
+
+    def logs(
+        self,
+        *,
+        stdout: bool = True,
+        stderr: bool = True,
+        timestamps: bool = False,
+        stream: bool = False,
+        **kwargs,
+    ):
+        data = self.output.get("stdout" if stdout else "stderr", b"")
+        if stream:
+            size = self.chunk_size
+            return iter([data[i : i + size] for i in range(0, len(data), size)])
+        return data
+
+    def put_archive(self, path: str, data) -> bool:
+        return True
+
+    def start(self) -> None:
+        self.attrs["State"] = {"Status": "running", "Running": True}
+
+    def reload(self) -> None:
+        pass
+
+    def remove(self, *, force: bool = False) -> None:
+        self.removed = True
+
+
+class FakeContainers:
+    def __init__(self):
+        self.containers: Dict[str, FakeContainer] = {}
+
+    def add(self, container: FakeContainer) -> FakeContainer:
+        self.containers[container.id] = container
+        return container
+
+    def create(self, *, name: str, **kwargs) -> FakeContainer:
+        container = FakeContainer(
+            id=f"c{len(self.containers)}", state={"Status": "created"}, name=name
+        )
+        container.options = kwargs
+        return self.add(container)
+
+    def get(self, container_id: str) -> FakeContainer:
+        # Like Docker, find containers by either ID or name.
+        for container in self.containers.values():
+            if container_id in (container.id, container.name) and not container.removed:
+                return container
+        raise NotFound(container_id)
+
+
+class FakeImage:
+    def __init__(self, id: str):
+        self.id = id
+
+
+class FakeImages:
+    """
+    Images are only available after being pulled (which takes `pull_delay` seconds).
+    """
+
+    def __init__(self, pull_delay: float = 0):
+        self.pull_delay = pull_delay
+        self.images: Dict[str, FakeImage] = {}
+        self.pulls = []
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> FakeImage:
+        try:
+            return self.images[name]
+        except KeyError:
+            raise ImageNotFound(name) from None
+
+    def pull(self, name: str) -> FakeImage:
+        with self.lock:
+            self.pulls.append(name)
+        time.sleep(self.pull_delay)
+        return self.images.setdefault(name, FakeImage(id=f"sha256:{name}"))
+
+
+class FakeVolume:
+    def __init__(self, name: str, **options):
+        self.name = name
+        self.options = options
+
+
+class FakeVolumes:
+    def __init__(self):
+        self.volumes: Dict[str, FakeVolume] = {}
+
+    def create(self, *, name: str, **options) -> FakeVolume:
+        return self.volumes.setdefault(name, FakeVolume(name, **options))
+
+
+class FakeDockerClient:
+    """
+    An in-process stand-in for `conf.docker_client`, so tests need no Docker daemon.
+    """
+
+    def __init__(self):
+        self.containers = FakeContainers()
+        self.images = FakeImages()
+        self.volumes = FakeVolumes()
+
+    def events(self, **kwargs) -> list:
+        return []
+
+
+HEAVY_MODULES = ("docker", "fastapi", "pydantic", "uvicorn")
+LAZY_RESOURCES = ("settings", "docker_client", "cache_db", "index_db")
+
+MEASURE_TEMPLATE = """
+import json, sys, time
+start = time.perf_counter()
+{code}
+duration = time.perf_counter() - start
+conf = sys.modules.get("minihai.conf")
+print(json.dumps({{
+    "duration": duration,
+    "modules": sorted(name for name in sys.modules if name.split(".")[0] in {heavy!r}),
+    "resources": [name for name in {resources!r} if conf and name in vars(conf)],
+}}))
+"""
+
+
+def measure_startup(code: str) -> Tuple[float, set, set]:
+    """
+    Run `code` in a fresh interpreter; return its duration, the heavy modules it imported
+    and the lazily-created resources it initialized.
+    """
+    script = MEASURE_TEMPLATE.format(
+        code=textwrap.dedent(code), heavy=HEAVY_MODULES, resources=LAZY_RESOURCES
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], check=True, stdout=subprocess.PIPE
+    ).stdout
+    result = json.loads(output.decode().splitlines()[-1])
+    return (
+        result["duration"],
+        {name.split(".")[0] for name in result["modules"]},
+        set(result["resources"]),
+    )